@@ -1,4 +1,150 @@
+import math
+import multiprocessing
+import os
 import random
+import time
+from concurrent.futures import ProcessPoolExecutor, TimeoutError
+
+from ChessBook import OpeningBook
+from ChessEngine import Move
+from ChessTablebase import Tablebase, WIN_SCORE, score as tablebase_score
+from ChessEvaluation import (PIECE_SCORES, PAWN_SCORES, KNIGHT_SCORES, BISHOP_SCORES, ROOK_SCORES, QUEEN_SCORES,
+                             KING_SCORES_MIDDLE_GAME, KING_SCORES_END_GAME, MAX_PHASE)
+from ChessTranspositionTable import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+
+MAX_DEPTH = 64  # deepest iteration a time or node budget can reach
+
+# State of a parallel search worker process, set up by init_search_worker
+worker_ai = None
+worker_snapshot = None
+worker_state = None
+
+
+def mate_moves(score, depth):
+    """
+    Find how many moves a search score says it is to mate. The search does not track the distance to mate, so for
+    a mate it found itself this is the most it can be at the depth searched. Tablebase wins carry their distance.
+
+    Args:
+        score: Search score from the side to move's point of view.
+        depth: Depth the score was searched to.
+
+    Returns:
+        The moves to mate, negative if the side to move is mated, or None if the score is not a mate.
+    """
+    if abs(score) == float('inf'):
+        moves = max(math.ceil(depth / 2), 1)
+    elif abs(score) > WIN_SCORE - 256:  # a tablebase result, less the half moves to mate
+        moves = math.ceil((WIN_SCORE - abs(score)) / 2)
+    else:
+        return None
+    return moves if score > 0 else -moves
+
+
+def captured_piece(board, code):
+    """
+    Find the type of piece a packed move captures, before the move is made.
+
+    Args:
+        board: The board the move is played on.
+        code: The packed move.
+
+    Returns:
+        The captured piece type, such as 'P', or '' if the move captures nothing.
+    """
+    if code & Move.ENPASSANT_FLAG:
+        return 'P'
+    piece = board[(code >> 9) & 7][(code >> 6) & 7]
+    return '' if piece == '--' else piece[1]
+
+
+def position_snapshot(game_state):
+    """
+    Make a compact, picklable description of a position to send to a search worker or thread.
+
+    Args:
+        game_state: The position to describe.
+
+    Returns:
+        (game state class, the position's snapshot bytes from GameState.snapshot).
+    """
+    return type(game_state), game_state.snapshot()
+
+
+def restore_position(snapshot):
+    """
+    Rebuild a position from a snapshot made by position_snapshot.
+
+    Args:
+        snapshot: The snapshot to rebuild.
+
+    Returns:
+        A new game state for the position, with an empty move log.
+    """
+    state_class, data = snapshot
+    return state_class.restore(data)
+
+
+def init_search_worker(settings, shared_alpha, stop_flag):
+    """
+    Set up a parallel search worker process with its own AI and transposition table.
+
+    Args:
+        settings: Keyword arguments for the worker's ChessAI.
+        shared_alpha: Shared value holding the best root score found so far by any process.
+        stop_flag: Shared flag that tells every worker to stop searching.
+    """
+    global worker_ai
+    worker_ai = ChessAI(**settings)
+    worker_ai.shared_alpha = shared_alpha
+    worker_ai.stop_flag = stop_flag
+
+
+def search_root_move(snapshot, code, depth, alpha, time_limit, node_limit, completed_depth):
+    """
+    Search a single root move in a worker process.
+
+    Args:
+        snapshot: Snapshot of the root position from position_snapshot.
+        code: Packed move to search.
+        depth: Depth of the current iteration.
+        alpha: Best root score known when the move was handed out. A better one found since by another process is
+               read from the shared value.
+        time_limit: Seconds left for the search, None for no limit.
+        node_limit: Nodes this move may search, None for no limit.
+        completed_depth: Depth of the last finished iteration. In the first iteration the move is always finished.
+
+    Returns:
+        (score, nodes searched, whether the search was stopped, (cutoffs, first move cutoffs, transposition table
+        cutoffs)). A score no better than alpha is only an upper bound.
+    """
+    global worker_snapshot, worker_state
+    ai = worker_ai
+    if snapshot != worker_snapshot:
+        worker_state = restore_position(snapshot)
+        worker_snapshot = snapshot
+        if ai.tt is not None:
+            ai.tt.new_search()
+        ai.root_ply = len(worker_state.moveLog)
+        ai.killers = [[0, 0] for _ in range(MAX_DEPTH + 1)]
+        ai.history = [score // 2 for score in ai.history]
+    ai.counter = 0
+    ai.cutoffs = ai.first_move_cutoffs = ai.tt_cutoffs = 0
+    ai.deadline = time.perf_counter() + time_limit if time_limit is not None else None
+    ai.max_nodes = node_limit
+    ai.search_stopped = False
+    ai.completed_depth = completed_depth
+
+    alpha = max(alpha, ai.shared_alpha.value)
+    game_state = worker_state
+    game_state.makeMoveCode(code)
+    score = -ai.negamax(game_state, depth - 1, -float('inf'), -alpha)
+    game_state.undoMove()
+    if not ai.search_stopped and score > alpha:
+        with ai.shared_alpha.get_lock():
+            if score > ai.shared_alpha.value:
+                ai.shared_alpha.value = score
+    return score, ai.counter, ai.search_stopped, (ai.cutoffs, ai.first_move_cutoffs, ai.tt_cutoffs)
 
 
 class ChessAI:
@@ -8,121 +154,271 @@ class ChessAI:
     position control, and other chess heuristics.
     """
 
-    def __init__(self, depth=3):
+    def __init__(self, depth=3, hash_size_mb=16, time_limit=None, node_limit=None, quiescence=True,
+                 delta_pruning=True, mobility_weight=0.1, mobility_pieces='NBRQ', workers=1, shuffle=True,
+                 seed=None, book=None, tablebase=None):
         """
         Initialize the chess AI.
 
         Args:
-            depth (int): The search depth for the Negamax algorithm.
+            depth (int): The search depth for the Negamax algorithm, used when no time or node budget is set.
+            hash_size_mb (float): Memory for the transposition table in megabytes, 0 to search without one.
+            time_limit (float): Default seconds to spend per move. The search deepens until it runs out.
+            node_limit (int): Default number of nodes to search per move. The search deepens until it runs out.
+            quiescence (bool): Keep searching captures and promotions past the depth limit before evaluating.
+            delta_pruning (bool): Skip captures in the quiescence search that cannot raise the score to alpha.
+            mobility_weight (float): Score per square of mobility advantage, 0 to leave mobility out of the evaluation.
+            mobility_pieces (str): Piece types whose mobility is counted, e.g. 'NBRQ', or 'Q' to only sample the
+                                   queens when the full count is too slow.
+            workers (int): Number of processes searching the root moves, None for one per CPU core. With one worker
+                           (the default) the search runs serially in this process. Workers only pay off with
+                           spare cores and deeper searches, each one costs a process and its own table.
+            shuffle (bool): Shuffle the root moves before ordering them, so equally good moves vary from game to game.
+            seed (int): Seed for the shuffle and for a book opened from a path, so the moves chosen and nodes searched
+                        can be reproduced.
+            book (str or OpeningBook): Opening book file, or an open book, to play from before searching. It is
+                                       only read once a position is looked up. None to always search.
+            tablebase (str or Tablebase): Directory of endgame tablebase files, or an open tablebase, giving exact
+                                          results once few enough pieces are left. None to always search.
         """
         self.depth = depth
+        self.tt = TranspositionTable(hash_size_mb) if hash_size_mb > 0 else None
+        self.time_limit = time_limit
+        self.node_limit = node_limit
+        self.quiescence = quiescence
+        self.delta_pruning = delta_pruning
+        # a capture has to be able to bring the score this close to alpha to be searched in the quiescence search
+        self.delta_margin = 20
+        self.mobility_weight = mobility_weight
+        self.mobility_pieces = mobility_pieces
+        self.workers = workers if workers is not None else os.cpu_count() or 1
+        self.shuffle = shuffle
+        self.rng = random.Random(seed) if seed is not None else random
+        self.book = OpeningBook(book, seed=seed) if isinstance(book, str) else book
+        self.tablebase = Tablebase(tablebase) if isinstance(tablebase, str) else tablebase
+        self.executor = None  # the worker pool is started by the first parallel search
+        self.shared_alpha = None
+        self.stop_flag = None
+        self.stop_event = None
+        self.best_move = None  # best move of the last finished iteration, for progress reports
+        # Search statistics for the last find_best_move: nodes searched when each iteration finished, beta cutoffs,
+        # cutoffs by the first move searched (a measure of move ordering), cutoffs by a transposition table score and
+        # positions scored by the tablebase
+        self.iteration_nodes = []
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.tt_cutoffs = 0
+        self.tablebase_hits = 0
+        self.ponder_result = None  # (zobrist key, depth, move ID, score) of the last position searched while pondering
+        self.counter = 0
+        self.deadline = None
+        self.max_nodes = None
+        self.search_stopped = False
+        self.completed_depth = 0
+        self.best_score = 0
+        # Move ordering: two killer moves per ply (quiet moves that caused a cutoff at that ply) and a butterfly
+        # history table indexed by the from and to squares of quiet moves that caused cutoffs
+        self.killers = [[0, 0] for _ in range(MAX_DEPTH + 1)]
+        self.history = [0] * 4096
+        self.root_ply = 0
         # Piece scores: pawn=1, knight=3, bishop=3, rook=5, queen=9, king=0 (infinite value but not used in eval)
-        self.piece_scores = {"P": 10, "N": 30, "B": 30, "R": 50, "Q": 90, "K": 900}
+        self.piece_scores = dict(PIECE_SCORES)
 
         # Position tables to encourage good piece placement
-        self.pawn_scores = [
-            [0, 0, 0, 0, 0, 0, 0, 0],
-            [50, 50, 50, 50, 50, 50, 50, 50],
-            [10, 10, 20, 30, 30, 20, 10, 10],
-            [5, 5, 10, 25, 25, 10, 5, 5],
-            [0, 0, 0, 20, 20, 0, 0, 0],
-            [5, -5, -10, 0, 0, -10, -5, 5],
-            [5, 10, 10, -20, -20, 10, 10, 5],
-            [0, 0, 0, 0, 0, 0, 0, 0]
-        ]
-
-        self.knight_scores = [
-            [-50, -40, -30, -30, -30, -30, -40, -50],
-            [-40, -20, 0, 0, 0, 0, -20, -40],
-            [-30, 0, 10, 15, 15, 10, 0, -30],
-            [-30, 5, 15, 20, 20, 15, 5, -30],
-            [-30, 0, 15, 20, 20, 15, 0, -30],
-            [-30, 5, 10, 15, 15, 10, 5, -30],
-            [-40, -20, 0, 5, 5, 0, -20, -40],
-            [-50, -40, -30, -30, -30, -30, -40, -50]
-        ]
-
-        self.bishop_scores = [
-            [-20, -10, -10, -10, -10, -10, -10, -20],
-            [-10, 0, 0, 0, 0, 0, 0, -10],
-            [-10, 0, 10, 10, 10, 10, 0, -10],
-            [-10, 5, 5, 10, 10, 5, 5, -10],
-            [-10, 0, 5, 10, 10, 5, 0, -10],
-            [-10, 10, 10, 10, 10, 10, 10, -10],
-            [-10, 5, 0, 0, 0, 0, 5, -10],
-            [-20, -10, -10, -10, -10, -10, -10, -20]
-        ]
-
-        self.rook_scores = [
-            [0, 0, 0, 0, 0, 0, 0, 0],
-            [5, 10, 10, 10, 10, 10, 10, 5],
-            [-5, 0, 0, 0, 0, 0, 0, -5],
-            [-5, 0, 0, 0, 0, 0, 0, -5],
-            [-5, 0, 0, 0, 0, 0, 0, -5],
-            [-5, 0, 0, 0, 0, 0, 0, -5],
-            [-5, 0, 0, 0, 0, 0, 0, -5],
-            [0, 0, 0, 5, 5, 0, 0, 0]
-        ]
-
-        self.queen_scores = [
-            [-20, -10, -10, -5, -5, -10, -10, -20],
-            [-10, 0, 0, 0, 0, 0, 0, -10],
-            [-10, 0, 5, 5, 5, 5, 0, -10],
-            [-5, 0, 5, 5, 5, 5, 0, -5],
-            [0, 0, 5, 5, 5, 5, 0, -5],
-            [-10, 5, 5, 5, 5, 5, 0, -10],
-            [-10, 0, 5, 0, 0, 0, 0, -10],
-            [-20, -10, -10, -5, -5, -10, -10, -20]
-        ]
-
-        self.king_scores_middle_game = [
-            [-30, -40, -40, -50, -50, -40, -40, -30],
-            [-30, -40, -40, -50, -50, -40, -40, -30],
-            [-30, -40, -40, -50, -50, -40, -40, -30],
-            [-30, -40, -40, -50, -50, -40, -40, -30],
-            [-20, -30, -30, -40, -40, -30, -30, -20],
-            [-10, -20, -20, -20, -20, -20, -20, -10],
-            [20, 20, 0, 0, 0, 0, 20, 20],
-            [20, 30, 10, 0, 0, 10, 30, 20]
-        ]
-
-        self.king_scores_end_game = [
-            [-50, -40, -30, -20, -20, -30, -40, -50],
-            [-30, -20, -10, 0, 0, -10, -20, -30],
-            [-30, -10, 20, 30, 30, 20, -10, -30],
-            [-30, -10, 30, 40, 40, 30, -10, -30],
-            [-30, -10, 30, 40, 40, 30, -10, -30],
-            [-30, -10, 20, 30, 30, 20, -10, -30],
-            [-30, -30, 0, 0, 0, 0, -30, -30],
-            [-50, -30, -30, -30, -30, -30, -30, -50]
-        ]
-
-    def find_best_move(self, game_state, valid_moves):
+        self.pawn_scores = PAWN_SCORES
+        self.knight_scores = KNIGHT_SCORES
+        self.bishop_scores = BISHOP_SCORES
+        self.rook_scores = ROOK_SCORES
+        self.queen_scores = QUEEN_SCORES
+        self.king_scores_middle_game = KING_SCORES_MIDDLE_GAME
+        self.king_scores_end_game = KING_SCORES_END_GAME
+
+    def find_best_move(self, game_state, valid_moves, time_limit=None, node_limit=None, stop_event=None,
+                       infinite=False):
         """
         Find the best move for the current position using Negamax with Alpha-Beta pruning.
+        The search deepens one ply at a time, searching the previous iteration's best move first. Without a budget
+        it stops at self.depth; with a time or node budget it keeps deepening and returns the best move of the last
+        iteration that finished in time.
 
         Args:
             game_state: The current state of the chess game.
             valid_moves: List of valid moves for the current player.
+            time_limit: Seconds to spend on this move, defaults to self.time_limit.
+            node_limit: Nodes to search for this move, defaults to self.node_limit.
+            stop_event: threading.Event another thread can set to stop the search straight away, even in the first
+                        iteration.
+            infinite: Keep deepening until stop_event is set, whatever the depth and budget.
 
         Returns:
-            The best move according to the evaluation.
+            The best move according to the evaluation. If the search was stopped before any iteration finished, the
+            first move in the search order (the hash move or the best capture) is given instead.
         """
         self.counter = 0  # For tracking nodes evaluated (useful for debugging)
+        if time_limit is None:
+            time_limit = self.time_limit
+        if node_limit is None:
+            node_limit = self.node_limit
+        self.deadline = time.perf_counter() + time_limit if time_limit is not None else None
+        self.max_nodes = node_limit
+        budgeted = time_limit is not None or node_limit is not None or infinite
+        self.search_stopped = False
+        self.stop_event = stop_event
+        self.best_move = None
+        self.iteration_nodes = []
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.tt_cutoffs = 0
+        self.tablebase_hits = 0
+        parallel = self.workers > 1 and len(valid_moves) > 1
+        if parallel:
+            self.start_workers()
+        if self.stop_flag is not None:
+            self.stop_flag.value = False  # a stop left over from the last parallel search would end this one at once
+        self.completed_depth = 0
+        self.best_score = 0
+        if self.tt is not None:
+            self.tt.new_search()
+        self.root_ply = len(game_state.moveLog)
+        self.killers = [[0, 0] for _ in range(MAX_DEPTH + 1)]
+        self.history = [score // 2 for score in self.history]  # Older cutoffs count for less
+
+        # A book move is played straight away, the book only holds moves known to be good
+        if self.book is not None:
+            book_move = self.book.choose(game_state, valid_moves)
+            if book_move is not None:
+                self.best_move = book_move
+                return book_move
+
+        # A position in the tablebase is played perfectly without searching
+        if self.tablebase is not None:
+            found = self.tablebase.best_move(game_state, valid_moves)
+            if found is not None:
+                self.best_move = found[0]
+                self.best_score = tablebase_score(found[1])
+                return self.best_move
+
+        # If this position was already searched deep enough while pondering, its move can be played straight away
+        ponder_move = self.take_ponder_move(game_state, valid_moves, budgeted)
+        if ponder_move is not None:
+            return ponder_move
+
+        # Randomize the order of moves that ordering can't tell apart, then put the hash move and captures first
+        if self.shuffle:
+            self.rng.shuffle(valid_moves)
+        hash_move = self.probe_hash_move(game_state)
+        board = game_state.board
+        valid_moves.sort(key=lambda move: (move.moveID == hash_move, self.mvv_lva_score(board, move.encode()),
+                                           self.history[move.moveID & 4095]), reverse=True)
+
+        best_move = None
+        for depth in range(1, (MAX_DEPTH if budgeted else self.depth) + 1):
+            if parallel:
+                move, score = self.search_root_parallel(game_state, valid_moves, depth)
+            else:
+                move, score = self.search_root(game_state, valid_moves, depth)
+            if self.search_stopped:
+                break  # the unfinished iteration is thrown away
+            best_move = move
+            self.best_move = move
+            self.best_score = score
+            self.completed_depth = depth
+            self.iteration_nodes.append(self.counter)
+            if abs(score) == float('inf'):
+                break  # every move loses or a mate was found, deeper searches cannot change that
+            # Search this iteration's best move first in the next one
+            valid_moves.remove(move)
+            valid_moves.insert(0, move)
+
+        if best_move is None:
+            # Stopped before the first iteration finished, there still has to be a move to play
+            best_move = valid_moves[0]
+            self.best_move = best_move
+        return best_move
+
+    def ponder(self, game_state, stop_event):
+        """
+        Search on the opponent's time until stop_event is set. The opponent's most likely reply is taken from the
+        transposition table and the position after it is searched, so if the reply is played its result can be
+        used straight away. Without a likely reply the opponent's own position is searched, which fills the table
+        for every reply.
+
+        Args:
+            game_state: The position with the opponent to move. It is left as it was.
+            stop_event: threading.Event that ends the pondering.
+
+        Returns:
+            The reply that was pondered, None if the opponent's position itself was searched.
+        """
+        hash_move = self.probe_hash_move(game_state)
+        predicted = None
+        for move in game_state.getValidMoves():
+            if move.moveID == hash_move:
+                predicted = move
+                break
+        if predicted is not None:
+            game_state.makeMove(predicted)
+        valid_moves = game_state.getValidMoves()
+        if valid_moves:
+            best_move = self.find_best_move(game_state, valid_moves, stop_event=stop_event, infinite=True)
+            if predicted is not None and best_move is not None:
+                self.ponder_result = (game_state.zobristKey, self.completed_depth, best_move.moveID,
+                                      self.best_score)
+        if predicted is not None:
+            game_state.undoMove()
+        return predicted
 
-        # Randomize move order for better alpha-beta pruning
-        random.shuffle(valid_moves)
+    def take_ponder_move(self, game_state, valid_moves, budgeted):
+        """
+        Use the result of pondering if the position it was found for came up. The result is only used once.
+
+        Args:
+            game_state: The current state of the chess game.
+            valid_moves: List of valid moves for the current player.
+            budgeted: Whether the search has a time or node budget, in which case it runs anyway and just starts
+                      from the pondered transposition table entries.
+
+        Returns:
+            The pondered move if it was searched at least to self.depth in this position, otherwise None.
+        """
+        result = self.ponder_result
+        self.ponder_result = None
+        if result is None or budgeted:
+            return None
+        key, depth, move_id, score = result
+        if key != game_state.zobristKey or depth < self.depth:
+            return None
+        for move in valid_moves:
+            if move.moveID == move_id:
+                self.best_move = move
+                self.completed_depth = depth
+                self.best_score = score
+                return move
+        return None
+
+    def search_root(self, game_state, valid_moves, depth):
+        """
+        Search every root move to the given depth.
 
-        # Find best move with negamax
+        Args:
+            game_state: The current state of the chess game.
+            valid_moves: List of valid moves for the current player, in the order to search them.
+            depth: Depth to search to.
+
+        Returns:
+            (best move, best score). Meaningless if the search was stopped part way through.
+        """
         best_score = -float('inf')
-        best_move = None
+        best_move = valid_moves[0]  # kept if every move is mated, so there is always a move to play
         alpha = -float('inf')
         beta = float('inf')
 
         for move in valid_moves:
             game_state.makeMove(move)
-            score = -self.negamax(game_state, self.depth - 1, -beta, -alpha, -1)
+            score = -self.negamax(game_state, depth - 1, -beta, -alpha)
             game_state.undoMove()
+            if self.search_stopped:
+                return best_move, best_score
 
             if score > best_score:
                 best_score = score
@@ -130,54 +426,355 @@ class ChessAI:
 
             alpha = max(alpha, best_score)
 
-        return best_move
+        if self.tt is not None:
+            self.tt.store(game_state.zobristKey, depth, best_score, EXACT, best_move.moveID)
+        return best_move, best_score
 
-    def negamax(self, game_state, depth, alpha, beta, color):
+    def search_root_parallel(self, game_state, valid_moves, depth):
         """
-        Negamax algorithm with Alpha-Beta pruning.
+        Search the root moves to the given depth across the worker processes. The first move, usually the best one
+        from the last iteration, is searched here to set alpha. The rest are handed to the workers, which share the
+        best score found so far so later moves are searched with the tightest alpha available.
+
+        Args:
+            game_state: The current state of the chess game.
+            valid_moves: List of valid moves for the current player, in the order to search them.
+            depth: Depth to search to.
+
+        Returns:
+            (best move, best score). Meaningless if the search was stopped part way through.
+        """
+        best_move = valid_moves[0]
+        game_state.makeMove(best_move)
+        best_score = -self.negamax(game_state, depth - 1, -float('inf'), float('inf'))
+        game_state.undoMove()
+        if self.search_stopped:
+            return best_move, best_score
+
+        if best_score != float('inf'):
+            self.shared_alpha.value = best_score
+            snapshot = position_snapshot(game_state)
+            time_left = max(self.deadline - time.perf_counter(), 0) if self.deadline is not None else None
+            nodes_left = None
+            if self.max_nodes is not None:
+                nodes_left = max(self.max_nodes - self.counter, 0) // (len(valid_moves) - 1) + 1
+            futures = [self.executor.submit(search_root_move, snapshot, move.encode(), depth, best_score, time_left,
+                                            nodes_left, self.completed_depth) for move in valid_moves[1:]]
+            for move, future in zip(valid_moves[1:], futures):
+                while True:
+                    try:
+                        score, nodes, stopped, cutoffs = future.result(timeout=0.05)
+                        break
+                    except TimeoutError:
+                        if self.stop_event is not None and self.stop_event.is_set():
+                            self.stop_flag.value = True  # pass a stop from outside on to the workers
+                self.counter += nodes
+                self.cutoffs += cutoffs[0]
+                self.first_move_cutoffs += cutoffs[1]
+                self.tt_cutoffs += cutoffs[2]
+                if stopped:
+                    # The iteration can't finish, so tell the other workers to give up on it too
+                    self.search_stopped = True
+                    self.stop_flag.value = True
+                elif score > best_score:
+                    best_score = score
+                    best_move = move
+            if self.search_stopped:
+                return best_move, best_score
+
+        if self.tt is not None:
+            self.tt.store(game_state.zobristKey, depth, best_score, EXACT, best_move.moveID)
+        return best_move, best_score
+
+    def start_workers(self):
+        """
+        Start the worker processes for the parallel search, if they are not running already.
+        """
+        if self.executor is not None:
+            return
+        self.shared_alpha = multiprocessing.Value('d', 0.0)
+        self.stop_flag = multiprocessing.Value('b', False)
+        settings = dict(depth=self.depth, hash_size_mb=self.tt.size * self.tt.ENTRY_BYTES / (1024 * 1024)
+                        if self.tt is not None else 0, quiescence=self.quiescence, delta_pruning=self.delta_pruning,
+                        mobility_weight=self.mobility_weight, mobility_pieces=self.mobility_pieces,
+                        tablebase=self.tablebase.directory if self.tablebase is not None else None)
+        self.executor = ProcessPoolExecutor(self.workers, initializer=init_search_worker,
+                                            initargs=(settings, self.shared_alpha, self.stop_flag))
+
+    def close(self):
+        """
+        Shut down the worker processes of the parallel search.
+        """
+        if self.executor is not None:
+            self.executor.shutdown(cancel_futures=True)
+            self.executor = None
+
+    def out_of_budget(self):
+        """
+        Check whether the time or node budget for this move is used up. The first iteration always finishes, so
+        there is always a move to play, unless the search is stopped from outside.
+
+        Returns:
+            True if the search should stop.
+        """
+        if self.stop_event is not None and self.stop_event.is_set():
+            return True
+        if self.stop_flag is not None and self.stop_flag.value:
+            return True
+        if self.completed_depth == 0:
+            return False
+        if self.max_nodes is not None and self.counter >= self.max_nodes:
+            return True
+        return self.deadline is not None and time.perf_counter() >= self.deadline
+
+    def probe_hash_move(self, game_state):
+        """
+        Get the best move stored in the transposition table for the current position.
+
+        Args:
+            game_state: Current state of the chess game.
+
+        Returns:
+            The packed move ID of the stored best move, or 0 if there is none.
+        """
+        if self.tt is None:
+            return 0
+        entry = self.tt.probe(game_state.zobristKey)
+        return entry[3] if entry is not None else 0
+
+    def negamax(self, game_state, depth, alpha, beta):
+        """
+        Negamax algorithm with Alpha-Beta pruning and a transposition table.
 
         Args:
             game_state: Current state of the chess game.
             depth: Remaining search depth.
             alpha: Alpha value for pruning.
             beta: Beta value for pruning.
-            color: 1 for white, -1 for black.
 
         Returns:
-            The best score according to the evaluation.
+            The best score from the perspective of the side to move.
         """
         self.counter += 1
+        if self.counter & 63 == 0 and self.out_of_budget():
+            self.search_stopped = True
+        if self.search_stopped:
+            return 0
+
+        # A position that has come up before is a draw: if repeating it is best for both sides, it will be repeated
+        # again. The same goes once the fifty move rule can be claimed
+        if game_state.halfmoveClock >= 100 or game_state.isRepetition():
+            return 0
+
+        # Few enough pieces are left for the tablebase to give the exact result
+        if self.tablebase is not None and game_state.pieceCount <= self.tablebase.max_pieces:
+            result = self.tablebase.probe(game_state)
+            if result is not None:
+                self.tablebase_hits += 1
+                return tablebase_score(result)
+
+        # A stored result that is deep enough can cut off the search, otherwise its move is searched first
+        key = game_state.zobristKey
+        alpha_orig = alpha
+        hash_move = 0
+        if self.tt is not None:
+            entry = self.tt.probe(key)
+            if entry is not None:
+                tt_depth, tt_score, tt_bound, hash_move = entry
+                if tt_depth >= depth:
+                    if tt_bound == EXACT:
+                        self.tt_cutoffs += 1
+                        return tt_score
+                    elif tt_bound == LOWER_BOUND:
+                        alpha = max(alpha, tt_score)
+                    else:
+                        beta = min(beta, tt_score)
+                    if alpha >= beta:
+                        self.tt_cutoffs += 1
+                        return tt_score
 
         if depth == 0:
-            return color * self.evaluate_board(game_state)
+            if self.quiescence:
+                return self.quiescence_search(game_state, alpha, beta)
+            # evaluate_board already scores the position for the side to move
+            return self.evaluate_board(game_state)
 
-        valid_moves = game_state.getValidMoves()
+        # The moves are packed ints from here down, a Move is only built for each move that is made
+        ply = len(game_state.moveLog) - self.root_ply
+        max_score = -float('inf')
+        best_move = None
+        for moves_searched, (code, quiet) in enumerate(self.ordered_moves(game_state, hash_move, ply)):
+            game_state.makeMoveCode(code)
+            score = -self.negamax(game_state, depth - 1, -beta, -alpha)
+            game_state.undoMove()
+            if self.search_stopped:
+                return 0  # the score is incomplete, so it is not stored
+
+            if score > max_score or best_move is None:
+                max_score = score
+                best_move = code
+            alpha = max(alpha, max_score)
+
+            if alpha >= beta:
+                self.cutoffs += 1
+                if moves_searched == 0:
+                    self.first_move_cutoffs += 1
+                if quiet:
+                    self.record_cutoff(code, ply, depth)
+                break  # Alpha-Beta pruning
 
         # Check for checkmate or stalemate
-        if len(valid_moves) == 0:
+        if best_move is None:
             if game_state.inCheck():
                 return -float('inf')  # Checkmate
             else:
                 return 0  # Stalemate
 
-        # Sort moves to improve alpha-beta pruning efficiency
-        # This is a simple ordering heuristic - capturing moves first
-        valid_moves.sort(key=lambda move: 1 if move.pieceCaptured != '--' else 0, reverse=True)
+        if self.tt is not None:
+            if max_score <= alpha_orig:
+                bound = UPPER_BOUND
+            elif max_score >= beta:
+                bound = LOWER_BOUND
+            else:
+                bound = EXACT
+            self.tt.store(key, depth, max_score, bound, best_move & Move.ID_MASK)
+        return max_score
 
-        max_score = -float('inf')
-        for move in valid_moves:
-            game_state.makeMove(move)
-            score = -self.negamax(game_state, depth - 1, -beta, -alpha, -color)
+    def ordered_moves(self, game_state, hash_move, ply):
+        """
+        Generate the legal moves in the order to search them: the hash move, then captures and promotions by
+        MVV-LVA, then quiet moves with the killer moves first and the rest by history score.
+        Quiet moves are only generated once the captures have been searched without a cutoff.
+
+        Args:
+            game_state: Current state of the chess game.
+            hash_move: Packed move ID of the transposition table move, 0 if none.
+            ply: Distance from the root, used to look up the killer moves.
+
+        Yields:
+            (packed move, whether it is a quiet move) in search order.
+        """
+        board = game_state.board
+        captures = game_state.getCaptureMoveCodes()
+        quiets = None
+        if hash_move and not any(code & Move.ID_MASK == hash_move for code in captures):
+            # A quiet hash move is still searched first, so the quiet moves are needed straight away
+            quiets = game_state.getQuietMoveCodes()
+            for i in range(len(quiets)):
+                if quiets[i] & Move.ID_MASK == hash_move:
+                    yield quiets.pop(i), True
+                    break
+
+        captures.sort(key=lambda code: (code & Move.ID_MASK == hash_move, self.mvv_lva_score(board, code)),
+                      reverse=True)
+        for code in captures:
+            yield code, False
+
+        if quiets is None:
+            quiets = game_state.getQuietMoveCodes()
+        killers = self.killers[ply]
+        history = self.history
+        quiets.sort(key=lambda code: (code & Move.ID_MASK == killers[0], code & Move.ID_MASK == killers[1],
+                                      history[code & 4095]), reverse=True)
+        for code in quiets:
+            yield code, True
+
+    def record_cutoff(self, code, ply, depth):
+        """
+        Remember a quiet move that caused a beta cutoff, as a killer move for this ply and in the history table.
+
+        Args:
+            code: The packed quiet move that caused the cutoff.
+            ply: Distance from the root.
+            depth: Remaining depth, deeper cutoffs count for more.
+        """
+        killers = self.killers[ply]
+        move_id = code & Move.ID_MASK
+        if killers[0] != move_id:
+            killers[1] = killers[0]
+            killers[0] = move_id
+        self.history[code & 4095] += depth * depth
+
+    def quiescence_search(self, game_state, alpha, beta):
+        """
+        Search only captures and promotions until the position is quiet, so the evaluation is never taken in the
+        middle of an exchange.
+
+        Args:
+            game_state: Current state of the chess game.
+            alpha: Alpha value for pruning.
+            beta: Beta value for pruning.
+
+        Returns:
+            The best score from the perspective of the side to move.
+        """
+        self.counter += 1
+        if self.counter & 63 == 0 and self.out_of_budget():
+            self.search_stopped = True
+        if self.search_stopped:
+            return 0
+
+        board = game_state.board
+        if game_state.inCheck():
+            # There is no standing pat in check, every evasion has to be searched
+            moves = game_state.getValidMoveCodes()
+            if len(moves) == 0:
+                return -float('inf')  # Checkmate
+            max_score = -float('inf')
+            stand_pat = None
+        else:
+            # The side to move can usually do at least as well as the static evaluation by not capturing
+            stand_pat = self.evaluate_board(game_state)
+            if stand_pat >= beta:
+                return stand_pat
+            # Even winning a queen would not reach alpha
+            if self.delta_pruning and stand_pat + self.piece_scores['Q'] + self.delta_margin < alpha:
+                return stand_pat
+            alpha = max(alpha, stand_pat)
+            max_score = stand_pat
+            moves = game_state.getCaptureMoveCodes()
+
+        # Most valuable victim first, least valuable attacker breaking ties
+        moves.sort(key=lambda code: self.mvv_lva_score(board, code), reverse=True)
+        for code in moves:
+            if (self.delta_pruning and stand_pat is not None and not code & Move.PROMOTION_MASK and
+                    stand_pat + self.piece_scores[captured_piece(board, code)] + self.delta_margin < alpha):
+                continue
+            game_state.makeMoveCode(code)
+            score = -self.quiescence_search(game_state, -beta, -alpha)
             game_state.undoMove()
+            if self.search_stopped:
+                return 0
 
             max_score = max(max_score, score)
             alpha = max(alpha, max_score)
-
             if alpha >= beta:
-                break  # Alpha-Beta pruning
+                break
 
         return max_score
 
+    def mvv_lva_score(self, board, code):
+        """
+        Score a move for MVV-LVA ordering: the value of the piece captured, less a fraction of the value of the
+        piece capturing it. Promotions count the piece promoted to.
+
+        Args:
+            board: The board the move is played on.
+            code: The packed move to score.
+
+        Returns:
+            A higher number for moves that should be searched first.
+        """
+        score = 0
+        captured = 'P' if code & Move.ENPASSANT_FLAG else board[(code >> 9) & 7][(code >> 6) & 7][1]
+        if captured != '-':  # an empty square is '--'
+            moved = board[(code & 63) >> 3][code & 7][1]
+            score = self.piece_scores[captured] * 10 - self.piece_scores[moved] // 10
+        promotion = (code & Move.PROMOTION_MASK) >> 12
+        if promotion:
+            score += self.piece_scores[Move.promotionPieces[promotion - 1]] * 10
+        return score
+
     def evaluate_board(self, game_state):
         """
         Evaluate the chess board from the perspective of the current player.
@@ -188,71 +785,22 @@ class ChessAI:
         Returns:
             A score representing how good the position is for the current player.
         """
-        if game_state.checkMate:
-            # If current player is in checkmate, return worst possible score
-            return -float('inf')
-        if game_state.staleMate:
-            # Stalemate is a draw (0)
-            return 0
-
-        score = 0
-
-        # Count material and apply piece-square tables
-        for row in range(8):
-            for col in range(8):
-                piece = game_state.board[row][col]
-                if piece != '--':
-                    # Determine if piece is white or black
-                    is_white = piece[0] == 'w'
-                    multiplier = 1 if is_white else -1
-                    piece_type = piece[1]
-
-                    # Add material value
-                    score += multiplier * self.piece_scores[piece_type]
-
-                    # Apply piece-square tables (adjusting indices for black perspective)
-                    position_score = 0
-                    if piece_type == 'P':
-                        position_score = self.pawn_scores[row][col]
-                    elif piece_type == 'N':
-                        position_score = self.knight_scores[row][col]
-                    elif piece_type == 'B':
-                        position_score = self.bishop_scores[row][col]
-                    elif piece_type == 'R':
-                        position_score = self.rook_scores[row][col]
-                    elif piece_type == 'Q':
-                        position_score = self.queen_scores[row][col]
-                    elif piece_type == 'K':
-                        # Simplified detection of endgame
-                        is_endgame = self.is_endgame(game_state)
-                        if is_endgame:
-                            position_score = self.king_scores_end_game[row][col]
-                        else:
-                            position_score = self.king_scores_middle_game[row][col]
-
-                    # Adjust position score for black pieces (flip board perspective)
-                    if not is_white:
-                        position_score = self.pawn_scores[7 - row][col] if piece_type == 'P' else position_score
-                        position_score = self.knight_scores[7 - row][col] if piece_type == 'N' else position_score
-                        position_score = self.bishop_scores[7 - row][col] if piece_type == 'B' else position_score
-                        position_score = self.rook_scores[7 - row][col] if piece_type == 'R' else position_score
-                        position_score = self.queen_scores[7 - row][col] if piece_type == 'Q' else position_score
-                        position_score = (self.king_scores_end_game[7 - row][col] if self.is_endgame(game_state)
-                                          else self.king_scores_middle_game[7 - row][
-                            col]) if piece_type == 'K' else position_score
-
-                    score += multiplier * position_score * 0.1  # Scale down the position influence
-
-        # Add bonus for mobility (number of legal moves)
-        current_valid_moves = len(game_state.getValidMoves())
-
-        # Temporarily switch sides to count opponent's moves
-        game_state.whiteToMove = not game_state.whiteToMove
-        opponent_valid_moves = len(game_state.getValidMoves())
-        game_state.whiteToMove = not game_state.whiteToMove
-
-        mobility_score = (current_valid_moves - opponent_valid_moves) * 0.1
-        score += mobility_score
+        # Checkmate and stalemate are found by the search when a position has no moves. The game state flags are
+        # only refreshed by getValidMoves, so they can belong to another position here and are not read
+
+        # Material and piece-square values are kept up to date by the game state as moves are made, so this is
+        # O(1). The middle game and end game tables are blended by how much material is left
+        phase = min(game_state.phase, MAX_PHASE)
+        position_score = (game_state.pieceSquareMiddleGame * phase +
+                          game_state.pieceSquareEndGame * (MAX_PHASE - phase)) / MAX_PHASE
+        score = game_state.materialScore + position_score * 0.1  # Scale down the position influence
+
+        # Add bonus for mobility (squares attacked or reachable by each side's pieces). The count is pseudo-legal
+        # and builds no moves, so it is cheap enough to run at every leaf and does not touch the game state
+        if self.mobility_weight:
+            mobility_score = (game_state.getMobility('w', self.mobility_pieces) -
+                              game_state.getMobility('b', self.mobility_pieces)) * self.mobility_weight
+            score += mobility_score
 
         # Adjust score perspective based on whose turn it is
         # If it's black's turn, negate the score to maintain consistent perspective
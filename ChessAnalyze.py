@@ -0,0 +1,262 @@
+# This module analyses positions in bulk from the command line, without the GUI. Positions are read as FEN or EPD
+# lines or as PGN games (the final position of each game) from files or stdin, searched with ChessAI across a pool
+# of worker processes, and the results are written as JSON lines:
+#   python ChessAnalyze.py positions.epd --depth 4 --workers 8 > results.jsonl
+#   cat games.pgn | python ChessAnalyze.py --format pgn --time 2 --unordered
+
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import ChessPGN
+from ChessAI import ChessAI, mate_moves
+from ChessEngine import START_FEN
+from ChessBitboard import BACKENDS, new_game_state
+
+# State of an analysis worker process, set up by init_worker
+worker_ai = None
+
+
+def read_text_positions(lines, source_name):
+    """
+    Read positions from FEN or EPD lines. An EPD line is the first four FEN fields followed by operations such as
+    'bm Qg6; id "WAC.001";'. Blank lines and lines starting with '#' are skipped.
+
+    Args:
+        lines: Iterable of lines.
+        source_name: Name of the input, used in position ids.
+
+    Yields:
+        (id, position, extra fields for the result) for each position.
+    """
+    for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        fields = line.split(None, 4)
+        extra = {}
+        if len(fields) > 4 and not (fields[4].split()[0].isdigit()):
+            # EPD: everything after the fourth field is operations
+            fen = ' '.join(fields[:4])
+            for operation in fields[4].split(';'):
+                parts = operation.strip().split(None, 1)
+                if len(parts) == 2:
+                    extra[parts[0]] = parts[1].strip().strip('"')
+        else:
+            fen = line
+        position_id = extra.pop('id', source_name + ':' + str(number))
+        yield position_id, ('fen', fen), extra
+
+
+def read_pgn_positions(source, source_name):
+    """
+    Read the final position of each game in a PGN source. Games are only split into SAN moves here; they are
+    replayed by the workers, so replaying is spread across the pool and a bad game only fails its own position.
+
+    Args:
+        source: A file path or an open file, see ChessPGN.read_games.
+        source_name: Name of the input, used in position ids.
+
+    Yields:
+        (id, position, extra fields for the result) for each game.
+    """
+    for number, game in enumerate(ChessPGN.read_games(source, replay=False), 1):
+        extra = {tag: game.headers[tag] for tag in ('White', 'Black', 'Result') if tag in game.headers}
+        fen = game.headers.get('FEN') if game.headers.get('SetUp', '1') == '1' else None
+        yield source_name + ':' + str(number), ('pgn', fen, game.sans), extra
+
+
+def read_positions(paths, input_format):
+    """
+    Read the positions of every input in turn.
+
+    Args:
+        paths: File paths, '-' for stdin.
+        input_format: 'fen', 'epd', 'pgn' or 'auto' to go by the file extension (stdin is read as FEN/EPD).
+
+    Yields:
+        (id, position, extra fields) for each position. The position is ('fen', FEN) or ('pgn', starting FEN or
+        None, SAN moves).
+    """
+    for path in paths:
+        is_pgn = input_format == 'pgn' or (input_format == 'auto' and path.lower().endswith('.pgn'))
+        if path == '-':
+            source = sys.stdin
+            positions = read_pgn_positions(source, 'stdin') if is_pgn else read_text_positions(source, 'stdin')
+            yield from positions
+        elif is_pgn:
+            yield from read_pgn_positions(path, path)
+        else:
+            with open(path) as file:
+                yield from read_text_positions(file, path)
+
+
+def init_worker(settings):
+    """
+    Set up an analysis worker process with its own AI.
+
+    Args:
+        settings: Keyword arguments for the worker's ChessAI.
+    """
+    global worker_ai
+    worker_ai = ChessAI(**settings)
+
+
+def set_up_position(position, backend='legal'):
+    """
+    Build the game state for a position read by read_positions.
+
+    Args:
+        position: ('fen', FEN) or ('pgn', starting FEN or None, SAN moves).
+        backend: Game state backend, see ChessBitboard.new_game_state.
+
+    Returns:
+        The game state, with a PGN game's moves in its moveLog.
+
+    Raises:
+        ValueError: If the FEN or a move can't be read.
+    """
+    if position[0] == 'fen':
+        return new_game_state(backend, position[1])
+    _, fen, sans = position
+    game_state = new_game_state(backend, fen or START_FEN)
+    for san in sans:
+        game_state.makeMove(ChessPGN.parse_san(game_state, san))
+    return game_state
+
+
+def analyse_position(index, position_id, position, extra, time_limit, node_limit, backend='legal'):
+    """
+    Search one position with the worker's AI.
+
+    Args:
+        index: Position of the input in the stream, so results can be put back in order.
+        position_id: Id written with the result.
+        position: The position, see set_up_position.
+        extra: Fields copied into the result, e.g. the EPD operations.
+        time_limit: Seconds to search, None to search to the AI's depth.
+        node_limit: Nodes to search, None for no limit.
+        backend: Game state backend, see ChessBitboard.new_game_state.
+
+    Returns:
+        The result as a dict. A position that can't be set up or searched gets an 'error' field instead, and a
+        search that gives no move gets a null best_move.
+    """
+    result = {'index': index, 'id': position_id}
+    try:
+        game_state = set_up_position(position, backend)
+        result['fen'] = game_state.to_fen()
+        valid_moves = game_state.getValidMoves()
+        if not valid_moves:
+            result['best_move'] = None
+            result['result'] = 'checkmate' if game_state.inCheck() else 'stalemate'
+            result.update(extra)
+            return result
+        start = time.perf_counter()
+        move = worker_ai.find_best_move(game_state, valid_moves, time_limit=time_limit, node_limit=node_limit)
+        seconds = time.perf_counter() - start
+        score = worker_ai.best_score
+        result['best_move'] = move.getChessNotation() if move is not None else None
+        result['san'] = ChessPGN.move_to_san(game_state, move, valid_moves) if move is not None else None
+        # scores are in pawns for the side to move (the evaluation counts a pawn as 10). A forced mate, from the
+        # search or the tablebase, is reported as the moves to mate instead, as UCI does
+        mate = mate_moves(score, worker_ai.completed_depth)
+        result['score'] = None if mate is not None else round(score / 10, 2)
+        result['mate'] = mate or 0
+        result['depth'] = worker_ai.completed_depth
+        result['nodes'] = worker_ai.counter
+        result['seconds'] = round(seconds, 4)
+        if 'bm' in extra:
+            result['solved'] = result['san'] is not None and \
+                result['san'].rstrip('+#') in [bm.rstrip('+#') for bm in extra['bm'].split()]
+        result.update(extra)
+    except ValueError as error:  # a bad FEN or PGN move
+        result['error'] = str(error)
+    except Exception as error:  # anything else only fails this position, the rest of the batch still runs
+        result['error'] = '{}: {}'.format(type(error).__name__, error)
+    return result
+
+
+def analyse(positions, settings, workers=1, time_limit=None, node_limit=None, ordered=True, backend='legal'):
+    """
+    Analyse a stream of positions, searching several at once in worker processes. Only a few positions more than
+    there are workers are read ahead, so the input can be of any length.
+
+    Args:
+        positions: Iterable of (id, position, extra fields), see read_positions.
+        settings: Keyword arguments for each worker's ChessAI.
+        workers: Number of worker processes, 1 to search in this process.
+        time_limit: Seconds per position, None to search to the AI's depth.
+        node_limit: Nodes per position, None for no limit.
+        ordered: Give the results in input order. Otherwise each is given as soon as it is finished.
+        backend: Game state backend, see ChessBitboard.new_game_state.
+
+    Yields:
+        The result dict for each position.
+    """
+    if workers <= 1:
+        init_worker(settings)
+        for index, (position_id, position, extra) in enumerate(positions):
+            yield analyse_position(index, position_id, position, extra, time_limit, node_limit, backend)
+        return
+
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(settings,)) as executor:
+        pending = set()
+        finished = {}  # results waiting for an earlier position to finish, when ordered
+        next_index = 0
+        jobs = enumerate(positions)
+        exhausted = False
+        while pending or not exhausted:
+            # results held back for an earlier position count towards the read-ahead too, so one slow position
+            # can't make the others pile up in memory
+            while not exhausted and len(pending) + len(finished) < workers * 2:
+                job = next(jobs, None)
+                if job is None:
+                    exhausted = True
+                    break
+                index, (position_id, position, extra) = job
+                pending.add(executor.submit(analyse_position, index, position_id, position, extra, time_limit,
+                                            node_limit, backend))
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                result = future.result()
+                if not ordered:
+                    yield result
+                    continue
+                finished[result['index']] = result
+            while next_index in finished:
+                yield finished.pop(next_index)
+                next_index += 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Analyse FEN, EPD or PGN positions in bulk and write JSON lines.')
+    parser.add_argument('inputs', nargs='*', default=['-'], help="files to read, '-' or nothing for stdin")
+    parser.add_argument('--format', choices=['auto', 'fen', 'epd', 'pgn'], default='auto',
+                        help='input format, auto goes by file extension (default)')
+    parser.add_argument('--depth', type=int, default=3, help='search depth when no time is given (default 3)')
+    parser.add_argument('--time', type=float, help='seconds per position, deepening until it runs out')
+    parser.add_argument('--nodes', type=int, help='nodes per position')
+    parser.add_argument('--workers', type=int, default=1, help='positions searched at once (default 1)')
+    parser.add_argument('--hash', type=float, default=16, help='transposition table size per worker in MB')
+    parser.add_argument('--unordered', action='store_true', help='write each result as soon as it is ready')
+    parser.add_argument('--seed', type=int, help='seed for the root move shuffle, for reproducible results')
+    parser.add_argument('--backend', choices=BACKENDS, default='legal', help='game state backend to search on')
+    args = parser.parse_args(argv)
+
+    settings = dict(depth=args.depth, hash_size_mb=args.hash, seed=args.seed)
+    failed = False
+    for result in analyse(read_positions(args.inputs, args.format), settings, args.workers, args.time, args.nodes,
+                          not args.unordered, args.backend):
+        failed = failed or 'error' in result
+        sys.stdout.write(json.dumps(result) + '\n')
+        sys.stdout.flush()
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
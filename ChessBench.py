@@ -0,0 +1,202 @@
+# This module benchmarks the AI search. It runs find_best_move over a fixed suite of middle game, end game and tactical
+# positions at a set depth and reports the nodes searched, time, nodes per second, effective branching factor,
+# transposition table hit rate and cutoff statistics. The move shuffle is seeded, so runs are reproducible and a new
+# version can be checked against a saved baseline:
+#   python ChessBench.py --depth 3 --json > baseline.json
+#   python ChessBench.py --depth 3 --baseline baseline.json
+
+import argparse
+import json
+import platform
+import sys
+import time
+
+from ChessAI import ChessAI
+from ChessBitboard import BACKENDS, new_game_state
+
+# name, category, FEN and the accepted best moves for the tactical positions (None where any move will do)
+BENCH_POSITIONS = [
+    ('italian', 'middlegame', 'r1bqk2r/pppp1ppp/2n2n2/2b1p3/2B1P3/3P1N2/PPP2PPP/RNBQK2R w KQkq - 1 5', None),
+    ('queens-gambit', 'middlegame', 'rnbqkb1r/ppp2ppp/4pn2/3p2B1/2PP4/2N5/PP2PPPP/R2QKBNR b KQkq - 3 4', None),
+    ('kiwipete', 'middlegame', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1', None),
+    ('closed-center', 'middlegame', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+     None),
+    ('rook-pawns', 'endgame', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1', None),
+    ('king-pawn', 'endgame', '8/8/8/4k3/8/8/4P3/4K3 w - - 0 1', None),
+    ('lucena', 'endgame', '1K1k4/1P6/8/8/8/8/r7/2R5 w - - 0 1', None),
+    ('fine-70', 'endgame', '8/k7/3p4/p2P1p2/P2P1P2/8/8/K7 w - - 0 1', None),
+    ('wac-001', 'tactical', '2rr3k/pp3pp1/1nnqbN1p/3pN3/2pP4/2P3Q1/PPB4P/R4RK1 w - - 0 1', ['g3g6']),
+    ('wac-002', 'tactical', '8/7p/5k2/5p2/p1p2P2/Pr1pPK2/1P1R3P/8 b - - 0 1', ['b3b2']),
+    ('wac-003', 'tactical', '5rk1/1ppb3p/p1pb4/6q1/3P1p1r/2P1R2P/PP1BQ1P1/5RKN w - - 0 1', ['e3g3']),
+    ('scholars-mate', 'tactical', 'r1bqkb1r/pppp1ppp/2n2n2/4p2Q/2B1P3/8/PPPP1PPP/RNB1K1NR w KQkq - 4 4', ['h5f7']),
+    # every move loses to mate here, the search must still give its only move
+    ('mated-in-one', 'tactical', 'k7/8/1K6/8/8/8/8/7R b - - 0 1', ['a8b8']),
+]
+
+
+def effective_branching_factor(iteration_nodes):
+    """
+    Work out how many times more nodes the last iteration searched than the one before it.
+
+    Args:
+        iteration_nodes: Total nodes searched when each iteration finished.
+
+    Returns:
+        The effective branching factor, None if fewer than two iterations finished.
+    """
+    if len(iteration_nodes) < 2:
+        return None
+    last = iteration_nodes[-1] - iteration_nodes[-2]
+    previous = iteration_nodes[-2] - (iteration_nodes[-3] if len(iteration_nodes) > 2 else 0)
+    return round(last / previous, 2) if previous else None
+
+
+def run_position(name, category, fen, best_moves, depth, backend, ai_settings):
+    """
+    Search one position with a fresh AI and collect its statistics.
+
+    Args:
+        name: Name of the position.
+        category: 'middlegame', 'endgame' or 'tactical'.
+        fen: The position in FEN.
+        best_moves: Accepted best moves in coordinate notation, None if not checked.
+        depth: Depth to search to.
+        backend: Game state backend, see ChessBitboard.new_game_state.
+        ai_settings: Extra keyword arguments for ChessAI.
+
+    Returns:
+        Dict with the results for the position.
+    """
+    game_state = new_game_state(backend, fen)
+    ai = ChessAI(depth=depth, **ai_settings)
+    start = time.perf_counter()
+    move = ai.find_best_move(game_state, game_state.getValidMoves())
+    seconds = time.perf_counter() - start
+    ai.close()
+    best_move = move.getChessNotation() if move is not None else None
+    return {
+        'name': name,
+        'category': category,
+        'fen': fen,
+        'best_move': best_move,
+        'solved': best_move in best_moves if best_moves is not None else None,
+        'score': ai.best_score,
+        'depth': ai.completed_depth,
+        'nodes': ai.counter,
+        'iteration_nodes': ai.iteration_nodes,
+        'seconds': round(seconds, 4),
+        'nps': round(ai.counter / seconds) if seconds else 0,
+        'ebf': effective_branching_factor(ai.iteration_nodes),
+        'tt_hit_rate': round(ai.tt.hit_rate(), 4) if ai.tt is not None else None,
+        'cutoffs': ai.cutoffs,
+        'first_move_cutoff_rate': round(ai.first_move_cutoffs / ai.cutoffs, 4) if ai.cutoffs else None,
+        'tt_cutoffs': ai.tt_cutoffs,
+    }
+
+
+def run_suite(depth=3, backend='legal', categories=None, seed=0, shuffle=True, hash_size_mb=16, workers=1):
+    """
+    Run the search over the benchmark positions.
+
+    Args:
+        depth: Depth to search to.
+        backend: Game state backend, see ChessBitboard.new_game_state.
+        categories: Categories of positions to run, None for all of them.
+        seed: Seed for the root move shuffle.
+        shuffle: Shuffle the root moves at all.
+        hash_size_mb: Transposition table size, 0 for none.
+        workers: Search processes per position.
+
+    Returns:
+        Dict with the settings, the per-position results and the totals.
+    """
+    ai_settings = dict(seed=seed, shuffle=shuffle, hash_size_mb=hash_size_mb, workers=workers)
+    results = [run_position(name, category, fen, best_moves, depth, backend, ai_settings)
+               for name, category, fen, best_moves in BENCH_POSITIONS
+               if categories is None or category in categories]
+    nodes = sum(result['nodes'] for result in results)
+    seconds = sum(result['seconds'] for result in results)
+    return {
+        'backend': backend,
+        'depth': depth,
+        'seed': seed if shuffle else None,
+        'hash_size_mb': hash_size_mb,
+        'workers': workers,
+        'python': platform.python_version(),
+        'positions': results,
+        'nodes': nodes,
+        'seconds': round(seconds, 4),
+        'nps': round(nodes / seconds) if seconds else 0,
+        'solved': sum(1 for result in results if result['solved']),
+        'tactical': sum(1 for result in results if result['solved'] is not None),
+    }
+
+
+def compare_to_baseline(report, baseline):
+    """
+    Compare a run against a saved one. The run passes if every position found the same best move.
+
+    Args:
+        report: Results of this run from run_suite.
+        baseline: Results of an earlier run from run_suite.
+
+    Returns:
+        (passed, list of lines describing the differences).
+    """
+    previous = {result['name']: result for result in baseline['positions']}
+    passed = True
+    lines = []
+    for result in report['positions']:
+        old = previous.get(result['name'])
+        if old is None:
+            continue
+        if result['best_move'] != old['best_move']:
+            passed = False
+            lines.append('{}: best move {} was {}'.format(result['name'], result['best_move'], old['best_move']))
+        lines.append('{}: nodes {:+d}, nps {:+d}'.format(result['name'], result['nodes'] - old['nodes'],
+                                                        result['nps'] - old['nps']))
+    lines.append('total: nodes {:+d}, nps {:+d}'.format(report['nodes'] - baseline['nodes'],
+                                                       report['nps'] - baseline['nps']))
+    return passed, lines
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark the AI search on a fixed set of positions.')
+    parser.add_argument('--depth', type=int, default=3, help='depth to search to (default 3)')
+    parser.add_argument('--backend', choices=BACKENDS, default='legal', help='game state backend to run')
+    parser.add_argument('--category', action='append', dest='categories', choices=['middlegame', 'endgame', 'tactical'],
+                        help='category of positions to run, may be repeated')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the root move shuffle (default 0)')
+    parser.add_argument('--no-shuffle', action='store_true', help="don't shuffle the root moves")
+    parser.add_argument('--hash', type=float, default=16, help='transposition table size in MB, 0 for none')
+    parser.add_argument('--workers', type=int, default=1, help='search processes per position (default 1)')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    parser.add_argument('--baseline', help='JSON results of an earlier run; fail if a best move changed')
+    args = parser.parse_args(argv)
+
+    report = run_suite(args.depth, args.backend, args.categories, args.seed, not args.no_shuffle, args.hash,
+                       args.workers)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for result in report['positions']:
+            result = dict(result, best_move=result['best_move'] or '-')  # no move if the search gave none
+            print('{name:<14} {best_move:<6} depth {depth} nodes {nodes:>8} {seconds:>8.3f}s {nps:>7} nps '
+                  'ebf {ebf} tt hits {tt_hit_rate} first move cutoffs {first_move_cutoff_rate}'.format(**result))
+        print('total          nodes {nodes:>8} {seconds:>8.3f}s {nps:>7} nps, solved {solved}/{tactical}'.format(
+            **report))
+
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        passed, lines = compare_to_baseline(report, baseline)
+        # keep stdout clean JSON when it is being saved as the next baseline
+        out = sys.stderr if args.json else sys.stdout
+        for line in lines:
+            print(line, file=out)
+        return 0 if passed else 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
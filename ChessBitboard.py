@@ -0,0 +1,450 @@
+# This module is an alternative backend for GameState that also keeps the position as 64-bit integer bitboards.
+# It keeps the same getValidMoves() / makeMove() / undoMove() interface so ChessAI and ChessMain run unchanged, and is
+# picked with the backend options of the front ends (see new_game_state below).
+# The bitboards are kept next to the board list, not instead of it: move generation and attack tests get faster, but
+# makeMove and undoMove do the board list work and then update the bitboards too, so they cost more than on GameState.
+# Squares are numbered row * 8 + col, so square 0 is a8 and square 63 is h1, matching the board list indices.
+
+from ChessEngine import GameState, Move, START_FEN
+
+FULL_BOARD = (1 << 64) - 1
+FILE_A = sum(1 << (r * 8) for r in range(8))
+FILE_H = FILE_A << 7
+ROWS = [0xFF << (r * 8) for r in range(8)]
+
+# directions as (row step, col step); the first four increase the square index, the last four decrease it
+DIRECTIONS = ((1, 0), (0, 1), (1, 1), (1, -1), (-1, 0), (0, -1), (-1, -1), (-1, 1))
+ROOK_DIRECTIONS = (0, 1, 4, 5)
+BISHOP_DIRECTIONS = (2, 3, 6, 7)
+
+
+'''
+Method to build a table of single-step attacks (knight or king) for every square
+'''
+def buildStepAttacks(steps):
+    table = []
+    for sq in range(64):
+        r, c = divmod(sq, 8)
+        attacks = 0
+        for dr, dc in steps:
+            endRow, endCol = r + dr, c + dc
+            if 0 <= endRow < 8 and 0 <= endCol < 8:
+                attacks |= 1 << (endRow * 8 + endCol)
+        table.append(attacks)
+    return table
+
+
+'''
+Method to build the empty-board ray in every direction from every square
+'''
+def buildRays():
+    rays = []
+    for dr, dc in DIRECTIONS:
+        table = []
+        for sq in range(64):
+            r, c = divmod(sq, 8)
+            ray = 0
+            endRow, endCol = r + dr, c + dc
+            while 0 <= endRow < 8 and 0 <= endCol < 8:
+                ray |= 1 << (endRow * 8 + endCol)
+                endRow, endCol = endRow + dr, endCol + dc
+            table.append(ray)
+        rays.append(table)
+    return rays
+
+
+KNIGHT_ATTACKS = buildStepAttacks(((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1)))
+KING_ATTACKS = buildStepAttacks(((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1)))
+# squares attacked by a pawn of the given colour standing on each square
+PAWN_ATTACKS = {'w': buildStepAttacks(((-1, -1), (-1, 1))), 'b': buildStepAttacks(((1, -1), (1, 1)))}
+RAYS = buildRays()
+
+
+'''
+Method to get the attacks of a sliding piece along the given directions, stopping at the first blocker
+'''
+def slidingAttacks(sq, occupied, directions):
+    attacks = 0
+    for d in directions:
+        ray = RAYS[d][sq]
+        blockers = ray & occupied
+        if blockers:
+            if d < 4: # ray runs towards higher squares, nearest blocker is the lowest bit
+                blocker = (blockers & -blockers).bit_length() - 1
+            else: # ray runs towards lower squares, nearest blocker is the highest bit
+                blocker = blockers.bit_length() - 1
+            ray ^= RAYS[d][blocker]
+        attacks |= ray
+    return attacks
+
+
+def rookAttacks(sq, occupied):
+    return slidingAttacks(sq, occupied, ROOK_DIRECTIONS)
+
+
+def bishopAttacks(sq, occupied):
+    return slidingAttacks(sq, occupied, BISHOP_DIRECTIONS)
+
+
+class BitboardGameState(GameState):
+    def __init__(self):
+        super().__init__()
+        # one bitboard per piece ("wP", "bK", ...) and one occupancy bitboard per colour
+        self.pieceBitboards = {}
+        self.colorBitboards = {}
+        self.syncBitboards()
+
+    '''
+    Method to create a game state at a position given in Forsyth-Edwards Notation, with its bitboards built
+    '''
+    @classmethod
+    def from_fen(cls, fen):
+        gs = super().from_fen(fen)
+        gs.syncBitboards()
+        return gs
+
+    '''
+    Method to create a game state from a snapshot, with its bitboards built
+    '''
+    @classmethod
+    def restore(cls, snapshot):
+        gs = super().restore(snapshot)
+        gs.syncBitboards()
+        return gs
+
+    '''
+    Method to rebuild every bitboard from the board list
+    '''
+    def syncBitboards(self):
+        self.pieceBitboards = {color + piece: 0 for color in 'wb' for piece in 'PNBRQK'}
+        self.colorBitboards = {'w': 0, 'b': 0}
+        for r in range(8):
+            for c in range(8):
+                piece = self.board[r][c]
+                if piece != '--':
+                    bit = 1 << (r * 8 + c)
+                    self.pieceBitboards[piece] |= bit
+                    self.colorBitboards[piece[0]] |= bit
+
+    '''
+    Method to execute a move, keeping the bitboards in step with the board list
+    '''
+    def makeMove(self, move):
+        super().makeMove(move)
+        self.updateBitboards(move, self.board[move.endRow][move.endCol])
+
+    '''
+    Method to undo the last move, keeping the bitboards in step with the board list
+    '''
+    def undoMove(self):
+        if len(self.moveLog) != 0:
+            move = self.moveLog[-1]
+            placed = self.board[move.endRow][move.endCol]
+            super().undoMove()
+            self.updateBitboards(move, placed)
+
+    '''
+    Method to xor a move's pieces in or out of the bitboards. placed is the piece standing on the end square after
+    the move, which differs from the piece moved on a promotion. Xoring is its own inverse, so the same call makes
+    and undoes the move
+    '''
+    def updateBitboards(self, move, placed):
+        pieces = self.pieceBitboards
+        colors = self.colorBitboards
+        end = move.endRow * 8 + move.endCol
+        startBit = 1 << (move.startRow * 8 + move.startCol)
+        endBit = 1 << end
+        color = move.pieceMoved[0]
+        pieces[move.pieceMoved] ^= startBit
+        pieces[placed] ^= endBit
+        colors[color] ^= startBit | endBit
+        captured = move.pieceCaptured
+        if captured != '--':
+            capturedBit = 1 << (move.startRow * 8 + move.endCol) if move.isEnpassantMove else endBit
+            pieces[captured] ^= capturedBit
+            colors[captured[0]] ^= capturedBit
+        if move.isCastleMove:
+            if move.endCol - move.startCol == 2: # kingside rook squares
+                rookBits = (1 << (end + 1)) | (1 << (end - 1))
+            else: # queenside rook squares
+                rookBits = (1 << (end - 2)) | (1 << (end + 1))
+            pieces[color + 'R'] ^= rookBits
+            colors[color] ^= rookBits
+
+    '''
+    Method to get a bitboard of all pieces of the given colour that attack square sq.
+    occupied and captured let the caller ask about a position that differs from the current one
+    '''
+    def attackersTo(self, sq, byColor, occupied, captured=0):
+        pieces = self.pieceBitboards
+        keep = ~captured
+        rooks = (pieces[byColor + 'R'] | pieces[byColor + 'Q']) & keep
+        bishops = (pieces[byColor + 'B'] | pieces[byColor + 'Q']) & keep
+        otherColor = 'b' if byColor == 'w' else 'w'
+        attackers = KNIGHT_ATTACKS[sq] & pieces[byColor + 'N']
+        attackers |= PAWN_ATTACKS[otherColor][sq] & pieces[byColor + 'P']
+        attackers |= KING_ATTACKS[sq] & pieces[byColor + 'K']
+        if rooks:
+            attackers |= rookAttacks(sq, occupied) & rooks
+        if bishops:
+            attackers |= bishopAttacks(sq, occupied) & bishops
+        return attackers & keep
+
+    '''
+    Method to determine if any piece of byColor attacks square (row, col), defaulting to the side not to move
+    '''
+    def isSquareAttacked(self, square, byColor=None):
+        if byColor is None:
+            byColor = 'b' if self.whiteToMove else 'w'
+        occupied = self.colorBitboards['w'] | self.colorBitboards['b']
+        return self.attackersTo(square[0] * 8 + square[1], byColor, occupied) != 0
+
+    '''
+    Method to list the (row, col) of every piece of byColor attacking square (row, col), defaulting to the side
+    not to move
+    '''
+    def attackersOf(self, square, byColor=None):
+        if byColor is None:
+            byColor = 'b' if self.whiteToMove else 'w'
+        occupied = self.colorBitboards['w'] | self.colorBitboards['b']
+        attackers = self.attackersTo(square[0] * 8 + square[1], byColor, occupied)
+        squares = []
+        while attackers:
+            bit = attackers & -attackers
+            attackers ^= bit
+            squares.append(divmod(bit.bit_length() - 1, 8))
+        return squares
+
+    '''
+    Method to count the squares the pieces of the given colour and types attack or can move to, not counting squares
+    held by their own pieces. It is pseudo-legal, builds no moves and leaves the game state untouched
+    '''
+    def getMobility(self, color, pieceTypes='NBRQ'):
+        occupied = self.colorBitboards['w'] | self.colorBitboards['b']
+        notAlly = ~self.colorBitboards[color] & FULL_BOARD
+        mobility = 0
+        for pieceType in pieceTypes:
+            board = self.pieceBitboards[color + pieceType]
+            if pieceType == 'P': # pawn captures to each side can be worked out for all the pawns at once
+                if color == 'w':
+                    left, right = (board & ~FILE_A) >> 9, (board & ~FILE_H) >> 7
+                else:
+                    left, right = (board & ~FILE_A) << 7, (board & ~FILE_H) << 9
+                mobility += (left & notAlly).bit_count() + (right & notAlly).bit_count()
+                continue
+            while board:
+                bit = board & -board
+                board ^= bit
+                sq = bit.bit_length() - 1
+                if pieceType == 'N':
+                    attacks = KNIGHT_ATTACKS[sq]
+                elif pieceType == 'B':
+                    attacks = bishopAttacks(sq, occupied)
+                elif pieceType == 'R':
+                    attacks = rookAttacks(sq, occupied)
+                elif pieceType == 'Q':
+                    attacks = rookAttacks(sq, occupied) | bishopAttacks(sq, occupied)
+                else:
+                    attacks = KING_ATTACKS[sq]
+                mobility += (attacks & notAlly).bit_count()
+        return mobility
+
+    '''
+    Method to generate the packed int encoding of every legal move, only legal moves are ever turned into Move objects.
+    With capturesOnly or quietsOnly, only those moves are generated and checkmate and stalemate are left alone
+    '''
+    def getLegalMoveCodes(self, capturesOnly=False, quietsOnly=False):
+        allyColor = 'w' if self.whiteToMove else 'b'
+        enemyColor = 'b' if self.whiteToMove else 'w'
+        occupied = self.colorBitboards['w'] | self.colorBitboards['b']
+        kingSq = self.pieceBitboards[allyColor + 'K'].bit_length() - 1
+        kingBit = 1 << kingSq
+        checkers = self.attackersTo(kingSq, enemyColor, occupied)
+        inCheck = checkers != 0
+        doubleCheck = inCheck and checkers & (checkers - 1) != 0
+        pinned = self.pinnedPieces(kingSq, allyColor, enemyColor, occupied)
+        # out of a single check a piece has to capture the checker or, against a slider, step in between
+        evasions = FULL_BOARD
+        if inCheck and not doubleCheck:
+            evasions = checkers
+            checkerSq = checkers.bit_length() - 1
+            for d in range(8):
+                if RAYS[d][kingSq] & checkers:
+                    if self.board[checkerSq >> 3][checkerSq & 7][1] in 'RBQ':
+                        evasions = RAYS[d][kingSq] ^ RAYS[d][checkerSq]
+                    break
+
+        codes = []
+        for code in self.getPseudoLegalMoves(allyColor, enemyColor, occupied, capturesOnly, quietsOnly):
+            start = code & 63
+            endBit = 1 << ((code >> 6) & 63)
+            if start == kingSq:
+                # the king must not step onto an attacked square, looking through its old square
+                if self.attackersTo((code >> 6) & 63, enemyColor, occupied ^ kingBit, endBit):
+                    continue
+            elif doubleCheck:
+                continue # only the king can get out of a double check
+            elif code & Move.ENPASSANT_FLAG:
+                # en passant takes two pieces off a line at once, so it is checked on the position after it
+                captured = 1 << (start - (start % 8) + ((code >> 6) & 7)) # captured pawn sits beside the start square
+                newOccupied = (occupied ^ (1 << start) ^ captured) | endBit
+                if self.attackersTo(kingSq, enemyColor, newOccupied, captured):
+                    continue
+            elif not endBit & evasions or (start in pinned and not endBit & pinned[start]):
+                continue
+            codes.append(code)
+
+        if not inCheck and not capturesOnly: # castling is a quiet move
+            self.getBitboardCastleMoves(kingSq, allyColor, enemyColor, occupied, codes)
+        if capturesOnly or quietsOnly:
+            return codes
+
+        if len(codes) == 0: # either checkmate or stalemate
+            if inCheck:
+                self.checkMate = True
+            else:
+                self.staleMate = True
+        else:
+            self.checkMate = False
+            self.staleMate = False
+        return codes
+
+    '''
+    Method to find the ally pieces pinned to the king, mapped to the bitboard of squares each may still move to: the
+    line between the king and the pinning piece, the pinner included
+    '''
+    def pinnedPieces(self, kingSq, allyColor, enemyColor, occupied):
+        pieces = self.pieceBitboards
+        rooks = pieces[enemyColor + 'R'] | pieces[enemyColor + 'Q']
+        bishops = pieces[enemyColor + 'B'] | pieces[enemyColor + 'Q']
+        allies = self.colorBitboards[allyColor]
+        pinned = {}
+        for d in range(8):
+            ray = RAYS[d][kingSq]
+            sliders = rooks if d in ROOK_DIRECTIONS else bishops
+            if not ray & sliders:
+                continue
+            blockers = ray & occupied
+            # the nearest piece along the ray has to be an ally and the next one an enemy slider
+            first = (blockers & -blockers).bit_length() - 1 if d < 4 else blockers.bit_length() - 1
+            if not allies & (1 << first):
+                continue
+            blockers ^= 1 << first
+            if not blockers:
+                continue
+            second = (blockers & -blockers).bit_length() - 1 if d < 4 else blockers.bit_length() - 1
+            if sliders & (1 << second):
+                pinned[first] = ray ^ RAYS[d][second]
+        return pinned
+
+    '''
+    Method to generate the packed int encoding of every move not considering checks, or with capturesOnly just the
+    captures and promotions, or with quietsOnly just the rest
+    '''
+    def getPseudoLegalMoves(self, allyColor, enemyColor, occupied, capturesOnly=False, quietsOnly=False):
+        pieces = self.pieceBitboards
+        enemies = self.colorBitboards[enemyColor]
+        empty = ~occupied & FULL_BOARD
+        if capturesOnly:
+            targetSquares = enemies
+        elif quietsOnly:
+            targetSquares = empty
+        else:
+            targetSquares = ~self.colorBitboards[allyColor] & FULL_BOARD
+
+        # pawns are generated set-wise, one shift per kind of move
+        pawns = pieces[allyColor + 'P']
+        if allyColor == 'w':
+            singles = (pawns >> 8) & empty
+            doubles = ((singles & ROWS[5]) >> 8) & empty
+            promotionRow = ROWS[0]
+        else:
+            singles = (pawns << 8) & empty
+            doubles = ((singles & ROWS[2]) << 8) & empty
+            promotionRow = ROWS[7]
+        if capturesOnly: # pushes are only forcing when they promote
+            singles &= promotionRow
+            doubles = 0
+        elif quietsOnly: # pawn captures and promotions are not quiet
+            singles &= ~promotionRow
+            enemies = 0
+        if allyColor == 'w':
+            pawnTargets = ((singles, 8), (doubles, 16), (((pawns & ~FILE_A) >> 9) & enemies, 9),
+                           (((pawns & ~FILE_H) >> 7) & enemies, 7))
+        else:
+            pawnTargets = ((singles, -8), (doubles, -16), (((pawns & ~FILE_A) << 7) & enemies, -7),
+                           (((pawns & ~FILE_H) << 9) & enemies, -9))
+        for targets, offset in pawnTargets:
+            while targets:
+                bit = targets & -targets
+                targets ^= bit
+                end = bit.bit_length() - 1
+                code = (end + offset) | (end << 6)
+                if bit & promotionRow: # one move for each promotion piece
+                    for promotion in range(1, len(Move.promotionPieces) + 1):
+                        yield code | (promotion << 12)
+                else:
+                    yield code
+        if self.enpassantPossible != () and not quietsOnly:
+            epSq = self.enpassantPossible[0] * 8 + self.enpassantPossible[1]
+            capturers = PAWN_ATTACKS[enemyColor][epSq] & pawns
+            while capturers:
+                bit = capturers & -capturers
+                capturers ^= bit
+                yield (bit.bit_length() - 1) | (epSq << 6) | Move.ENPASSANT_FLAG
+
+        # pieces are generated from their attack sets
+        for piece in 'NBRQK':
+            board = pieces[allyColor + piece]
+            while board:
+                bit = board & -board
+                board ^= bit
+                start = bit.bit_length() - 1
+                if piece == 'N':
+                    targets = KNIGHT_ATTACKS[start]
+                elif piece == 'B':
+                    targets = bishopAttacks(start, occupied)
+                elif piece == 'R':
+                    targets = rookAttacks(start, occupied)
+                elif piece == 'Q':
+                    targets = rookAttacks(start, occupied) | bishopAttacks(start, occupied)
+                else:
+                    targets = KING_ATTACKS[start]
+                targets &= targetSquares
+                while targets:
+                    targetBit = targets & -targets
+                    targets ^= targetBit
+                    yield start | ((targetBit.bit_length() - 1) << 6)
+
+    '''
+    Method to generate the packed castling moves for a king that is not in check
+    '''
+    def getBitboardCastleMoves(self, kingSq, allyColor, enemyColor, occupied, codes):
+        if allyColor == 'w':
+            kingside, queenside = self.currentCastlingRights.wks, self.currentCastlingRights.wqs
+        else:
+            kingside, queenside = self.currentCastlingRights.bks, self.currentCastlingRights.bqs
+        if kingside and not occupied & ((1 << (kingSq + 1)) | (1 << (kingSq + 2))):
+            if (not self.attackersTo(kingSq + 1, enemyColor, occupied) and
+                    not self.attackersTo(kingSq + 2, enemyColor, occupied)):
+                codes.append(kingSq | ((kingSq + 2) << 6) | Move.CASTLE_FLAG)
+        if queenside and not occupied & ((1 << (kingSq - 1)) | (1 << (kingSq - 2)) | (1 << (kingSq - 3))):
+            if (not self.attackersTo(kingSq - 1, enemyColor, occupied) and
+                    not self.attackersTo(kingSq - 2, enemyColor, occupied)):
+                codes.append(kingSq | ((kingSq - 2) << 6) | Move.CASTLE_FLAG)
+
+
+# names of the game state backends the front ends can pick from
+BACKENDS = ('legal', 'filter', 'bitboard')
+
+
+'''
+Method to create a game state at the given position for one of the BACKENDS: 'legal' for the list board with
+pin-aware generation, 'filter' for the list board with make/test/unmake filtering, or 'bitboard'
+'''
+def new_game_state(backend, fen=START_FEN):
+    if backend == 'bitboard':
+        return BitboardGameState.from_fen(fen)
+    gs = GameState.from_fen(fen)
+    gs.legalMoveGeneration = backend != 'filter'
+    return gs
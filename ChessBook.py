@@ -0,0 +1,200 @@
+# This module builds and reads opening books, so the AI can play known openings without searching. A book file is a
+# sorted array of 16-byte entries laid out like a Polyglot book: the 64-bit zobrist key of a position (the engine's
+# own keys, so Polyglot books themselves can't be read), the move ID of a move played there, the move's weight and
+# 32 unused bits, all big-endian. A book is memory mapped on first use and searched with a binary search, so opening
+# it costs nothing until a position is looked up and even a large book is not read into memory:
+#   python ChessBook.py build games.pgn --plies 16 --output book.bin
+#   python ChessBook.py probe book.bin "rnbqkbnr/pppppppp/8/8/4P3/8/PPPP1PPP/RNBQKBNR b KQkq - 0 1"
+
+import argparse
+import mmap
+import random
+import struct
+import sys
+
+import ChessPGN
+from ChessEngine import GameState
+
+ENTRY = struct.Struct('>QHHI')  # zobrist key, move ID, weight, unused
+KEY = struct.Struct('>Q')
+MAX_WEIGHT = 65535
+
+
+class OpeningBook:
+    """
+    An opening book file, read through a memory map.
+    """
+
+    def __init__(self, path, selection='weighted', seed=None):
+        """
+        Set up the book. The file isn't opened until the first lookup.
+
+        Args:
+            path: The book file.
+            selection: 'weighted' to pick moves at random in proportion to their weights, 'best' to always pick the
+                       move with the highest weight.
+            seed: Seed for the weighted choice, so the moves chosen can be reproduced.
+        """
+        if selection not in ('weighted', 'best'):
+            raise ValueError('selection must be weighted or best, not ' + repr(selection))
+        self.path = path
+        self.selection = selection
+        self.rng = random.Random(seed) if seed is not None else random
+        self.data = None
+        self.size = 0
+        self.loaded = False
+
+    def load(self):
+        """
+        Map the book file into memory. A missing or empty file gives an empty book.
+        """
+        self.loaded = True
+        try:
+            with open(self.path, 'rb') as file:
+                self.data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):  # no file, or an empty one, which can't be mapped
+            self.data = None
+            return
+        self.size = len(self.data) // ENTRY.size
+
+    def close(self):
+        """
+        Unmap the book file. It is mapped again by the next lookup.
+        """
+        if self.data is not None:
+            self.data.close()
+        self.data = None
+        self.size = 0
+        self.loaded = False
+
+    def entries(self, key):
+        """
+        Find the book moves for a position.
+
+        Args:
+            key: The position's zobrist key.
+
+        Returns:
+            List of (move ID, weight) for the position, empty if it is not in the book.
+        """
+        if not self.loaded:
+            self.load()
+        if self.data is None:
+            return []
+        data = self.data
+        low, high = 0, self.size
+        while low < high:  # the first entry with a key of at least key
+            middle = (low + high) // 2
+            if KEY.unpack_from(data, middle * ENTRY.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        moves = []
+        for index in range(low, self.size):
+            entry_key, move_id, weight, _ = ENTRY.unpack_from(data, index * ENTRY.size)
+            if entry_key != key:
+                break
+            moves.append((move_id, weight))
+        return moves
+
+    def choose(self, game_state, valid_moves):
+        """
+        Pick a book move for the current position.
+
+        Args:
+            game_state: The current state of the chess game.
+            valid_moves: List of valid moves for the current player.
+
+        Returns:
+            A move from valid_moves, None if the position is not in the book.
+        """
+        by_id = {move.moveID: move for move in valid_moves}
+        # a book move that isn't legal can only come from a key collision, so it is left out
+        candidates = [(by_id[move_id], weight) for move_id, weight in self.entries(game_state.zobristKey)
+                      if move_id in by_id and weight > 0]
+        if not candidates:
+            return None
+        if self.selection == 'best':
+            return max(candidates, key=lambda candidate: candidate[1])[0]
+        moves, weights = zip(*candidates)
+        return self.rng.choices(moves, weights)[0]
+
+
+def build_book(sources, output, plies=16, min_count=1):
+    """
+    Build a book from PGN games. Each move is weighted by how well it scored for the side that played it: two
+    points for a win, one for a draw.
+
+    Args:
+        sources: PGN file paths or open files.
+        output: The book file to write.
+        plies: Number of half moves of each game to take.
+        min_count: Leave out moves played fewer times than this.
+
+    Returns:
+        The number of entries written.
+    """
+    counts = {}  # (key, move ID) -> [times played, points]
+    for source in sources:
+        for game in ChessPGN.read_games(source, replay=False):
+            if game.headers.get('SetUp', '0') == '1':
+                continue  # only games from the normal start position
+            game_state = GameState()
+            try:
+                for san in game.sans[:plies]:
+                    move = ChessPGN.parse_san(game_state, san)
+                    if game.result == '1/2-1/2':
+                        points = 1
+                    elif game.result in ('1-0', '0-1'):
+                        points = 2 if (game.result == '1-0') == game_state.whiteToMove else 0
+                    else:
+                        points = 1  # unknown result
+                    count = counts.setdefault((game_state.zobristKey, move.moveID), [0, 0])
+                    count[0] += 1
+                    count[1] += points
+                    game_state.makeMove(move)
+            except ChessPGN.PGNError:
+                continue  # the moves before the bad one are kept
+
+    entries = sorted((key, move_id, points) for (key, move_id), (played, points) in counts.items()
+                     if played >= min_count)
+    scale = max((points for _, _, points in entries), default=0) / MAX_WEIGHT
+    with open(output, 'wb') as file:
+        for key, move_id, points in entries:
+            # weights are scaled to fit 16 bits, but a move that was played keeps at least weight 1
+            weight = max(round(points / scale), 1) if scale > 1 else max(points, 1)
+            file.write(ENTRY.pack(key, move_id, weight, 0))
+    return len(entries)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build or look up an opening book.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help='build a book from PGN games')
+    build.add_argument('inputs', nargs='+', help='PGN files to read')
+    build.add_argument('--output', '-o', default='book.bin', help='book file to write (default book.bin)')
+    build.add_argument('--plies', type=int, default=16, help='half moves of each game to take (default 16)')
+    build.add_argument('--min-count', type=int, default=1, help='leave out moves played fewer times than this')
+    probe = commands.add_parser('probe', help='list the book moves for a position')
+    probe.add_argument('book', help='the book file')
+    probe.add_argument('fen', nargs='?', help='the position in FEN, the start position if not given')
+    args = parser.parse_args(argv)
+
+    if args.command == 'build':
+        print('{} entries written to {}'.format(build_book(args.inputs, args.output, args.plies, args.min_count),
+                                                args.output))
+        return 0
+    game_state = GameState.from_fen(args.fen) if args.fen else GameState()
+    book = OpeningBook(args.book)
+    moves = {move.moveID: move for move in game_state.getValidMoves()}
+    entries = book.entries(game_state.zobristKey)
+    total = sum(weight for _, weight in entries)
+    for move_id, weight in sorted(entries, key=lambda entry: -entry[1]):
+        if move_id in moves:
+            print('{:<8} {:>6} {:6.1%}'.format(ChessPGN.move_to_san(game_state, moves[move_id]), weight,
+                                              weight / total if total else 0))
+    return 0 if entries else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
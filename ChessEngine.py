@@ -1,6 +1,33 @@
 # This class is responible for storing all the information about the current state of the chess game.
 # It is also resposible for determining the valid moves at the current state. It will also keep a move log.
 
+import random
+import struct
+
+from ChessEvaluation import PIECE_VALUES, PIECE_SQUARE_MIDDLE_GAME, PIECE_SQUARE_END_GAME, PIECE_PHASES
+
+# zobrist keys: one random 64-bit number per piece on each square, for black to move, for each combination of
+# castle rights and for each en passant file. A position's key is the xor of the numbers for everything in it.
+# The generator is seeded so keys are the same in every process and can be stored on disk
+zobristRandom = random.Random(20240917)
+ZOBRIST_PIECES = {color + piece: [zobristRandom.getrandbits(64) for sq in range(64)]
+                  for color in 'wb' for piece in 'PNBRQK'}
+ZOBRIST_BLACK_TO_MOVE = zobristRandom.getrandbits(64)
+ZOBRIST_CASTLING = [zobristRandom.getrandbits(64) for rights in range(16)]
+ZOBRIST_ENPASSANT = [zobristRandom.getrandbits(64) for col in range(8)]
+
+# the starting position in Forsyth-Edwards Notation
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+# a position snapshot is bytes: one byte per square holding the piece's index in SNAPSHOT_PIECES, a byte with the side
+# to move and castle rights, the en passant square (255 for none), the halfmove clock and fullmove number, then the
+# zobrist keys of the positions since the last capture or pawn move so repetitions can still be seen
+SNAPSHOT_PIECES = ('--',) + tuple(color + piece for color in 'wb' for piece in 'PNBRQK')
+SNAPSHOT_CODES = {piece: code for code, piece in enumerate(SNAPSHOT_PIECES)}
+SNAPSHOT_HEADER = struct.Struct('<64sBBHH')
+NO_ENPASSANT = 255
+
+
 class GameState():
     def __init__(self):
         # board is 8x8 2d list, each element of the list has 2 characters.
@@ -28,16 +55,193 @@ class GameState():
         self.blackKingLocation = (0, 4)
         self.checkMate = False
         self.staleMate = False
+        # pin- and check-aware generation emits only legal moves; False falls back to make/test/unmake filtering
+        self.legalMoveGeneration = True
+        self.pins = {} # pinned ally pieces mapped to the direction of the pin, only set while generating moves
+        self.capturesOnly = False # set while generating only captures and promotions
+        self.quietsOnly = False # set while generating only the moves that are neither captures nor promotions
         self.enpassantPossible = () # coordinates where an en passant capture is possible
         self.currentCastlingRights = CastleRights(True, True, True, True) # castle rights start true
         # store in log to keep track of changes
         self.castleRightsLog = [CastleRights(self.currentCastlingRights.wks, self.currentCastlingRights.bks,
                                              self.currentCastlingRights.wqs, self.currentCastlingRights.bqs)]
-    
+        self.enpassantPossibleLog = [self.enpassantPossible]
+        # moves since the last capture or pawn move, for the fifty move rule, and the number of the current move
+        self.halfmoveClock = 0
+        self.halfmoveClockLog = [self.halfmoveClock]
+        self.fullmoveNumber = 1
+        self.startFen = START_FEN # position the move log starts from
+        # 64-bit zobrist key of the position, updated with xors in makeMove and restored from the log in undoMove
+        self.zobristKey = self.computeZobristKey()
+        self.zobristKeyLog = [self.zobristKey]
+        # when set, every makeMove and undoMove checks the key against one computed from scratch
+        self.zobristDebug = False
+        # running totals for the evaluation, as white's advantage: material, piece-square values for the middle game
+        # and the end game, and the game phase used to blend the two. Updated in makeMove and undoMove
+        self.materialScore, self.pieceSquareMiddleGame, self.pieceSquareEndGame, self.phase = \
+            self.computeEvaluationTotals()
+        self.evaluationLog = [] # totals from before each move, for undoMove
+        self.pieceCount = 32 # pieces on the board, kings included, kept up to date as pieces are captured
+
+    '''
+    Method to create a game state at a position given in Forsyth-Edwards Notation, raises ValueError if the FEN
+    can't be read. The halfmove clock and fullmove number are optional and default to 0 and 1
+    '''
+    @classmethod
+    def from_fen(cls, fen):
+        fields = fen.split()
+        if len(fields) < 4 or len(fields) > 6:
+            raise ValueError('FEN needs 4 to 6 fields: ' + fen)
+        ranks = fields[0].split('/')
+        if len(ranks) != 8:
+            raise ValueError('FEN board needs 8 ranks: ' + fields[0])
+        gs = cls()
+        for r, rank in enumerate(ranks):
+            row = []
+            for char in rank:
+                if char in '12345678':
+                    row.extend(['--'] * int(char))
+                elif char.upper() in 'PNBRQK':
+                    row.append(('w' if char.isupper() else 'b') + char.upper())
+                else:
+                    raise ValueError('unknown piece in FEN: ' + char)
+            if len(row) != 8:
+                raise ValueError('FEN rank needs 8 squares: ' + rank)
+            gs.board[r] = row
+            for c in range(8):
+                if row[c] == 'wK':
+                    gs.whiteKingLocation = (r, c)
+                elif row[c] == 'bK':
+                    gs.blackKingLocation = (r, c)
+        if sum(row.count('wK') for row in gs.board) != 1 or sum(row.count('bK') for row in gs.board) != 1:
+            raise ValueError('FEN needs one king of each colour: ' + fields[0])
+        if fields[1] not in ('w', 'b'):
+            raise ValueError('FEN side to move must be w or b: ' + fields[1])
+        gs.whiteToMove = fields[1] == 'w'
+        castling = fields[2]
+        if castling != '-' and (not castling or any(char not in 'KQkq' for char in castling)):
+            raise ValueError('bad FEN castling rights: ' + castling)
+        gs.currentCastlingRights = CastleRights('K' in castling, 'k' in castling, 'Q' in castling, 'q' in castling)
+        gs.castleRightsLog = [CastleRights(gs.currentCastlingRights.wks, gs.currentCastlingRights.bks,
+                                           gs.currentCastlingRights.wqs, gs.currentCastlingRights.bqs)]
+        enpassant = fields[3]
+        if enpassant == '-':
+            gs.enpassantPossible = ()
+        elif len(enpassant) == 2 and enpassant[0] in Move.filesToCols and enpassant[1] in '36':
+            gs.enpassantPossible = (Move.ranksToRows[enpassant[1]], Move.filesToCols[enpassant[0]])
+        else:
+            raise ValueError('bad FEN en passant square: ' + enpassant)
+        gs.enpassantPossibleLog = [gs.enpassantPossible]
+        try:
+            gs.halfmoveClock = int(fields[4]) if len(fields) > 4 else 0
+            gs.fullmoveNumber = int(fields[5]) if len(fields) > 5 else 1
+        except ValueError:
+            raise ValueError('bad FEN move counters: ' + ' '.join(fields[4:]))
+        gs.halfmoveClockLog = [gs.halfmoveClock]
+        gs.startFen = fen
+        # the key and evaluation totals were worked out for the starting position by __init__
+        gs.zobristKey = gs.computeZobristKey()
+        gs.zobristKeyLog = [gs.zobristKey]
+        gs.materialScore, gs.pieceSquareMiddleGame, gs.pieceSquareEndGame, gs.phase = gs.computeEvaluationTotals()
+        gs.pieceCount = sum(1 for row in gs.board for square in row if square != '--')
+        return gs
+
+    '''
+    Method to write the current position in Forsyth-Edwards Notation
+    '''
+    def to_fen(self):
+        ranks = []
+        for row in self.board:
+            rank = ''
+            empty = 0
+            for piece in row:
+                if piece == '--':
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                rank += piece[1] if piece[0] == 'w' else piece[1].lower()
+            if empty:
+                rank += str(empty)
+            ranks.append(rank)
+        rights = self.currentCastlingRights
+        castling = ('K' if rights.wks else '') + ('Q' if rights.wqs else '') + ('k' if rights.bks else '') + \
+                   ('q' if rights.bqs else '')
+        enpassant = '-'
+        if self.enpassantPossible:
+            enpassant = Move.colsToFiles[self.enpassantPossible[1]] + Move.rowstoRanks[self.enpassantPossible[0]]
+        return ' '.join(['/'.join(ranks), 'w' if self.whiteToMove else 'b', castling or '-', enpassant,
+                         str(self.halfmoveClock), str(self.fullmoveNumber)])
+
+    '''
+    Method to make a compact snapshot of the position, see SNAPSHOT_HEADER. It is immutable bytes, so it pickles
+    cheaply for other processes and can be compared or used as a key. The move log is left out, so the snapshot
+    stays the same size however long the game
+    '''
+    def snapshot(self):
+        codes = SNAPSHOT_CODES
+        board = bytes([codes[piece] for row in self.board for piece in row])
+        rights = self.currentCastlingRights
+        flags = self.whiteToMove | (rights.wks << 1) | (rights.wqs << 2) | (rights.bks << 3) | (rights.bqs << 4)
+        enpassant = NO_ENPASSANT
+        if self.enpassantPossible:
+            enpassant = self.enpassantPossible[0] * 8 + self.enpassantPossible[1]
+        keys = self.zobristKeyLog[-min(self.halfmoveClock + 1, len(self.zobristKeyLog)):]
+        return SNAPSHOT_HEADER.pack(board, flags, enpassant, self.halfmoveClock, self.fullmoveNumber) + \
+            struct.pack('<%dQ' % len(keys), *keys)
+
+    '''
+    Method to create a game state from a snapshot made by snapshot(). The new state's move log is empty and starts
+    from the snapshot's position
+    '''
+    @classmethod
+    def restore(cls, snapshot):
+        board, flags, enpassant, halfmoveClock, fullmoveNumber = SNAPSHOT_HEADER.unpack_from(snapshot)
+        # __init__ would set up the starting position only for all of it to be replaced, so every field it sets is
+        # filled in here straight from the snapshot instead
+        gs = cls.__new__(cls)
+        gs.moveFunctions = {'P': gs.getPawnMoves, 'R': gs.getRookMoves, 'N': gs.getKnightMoves,
+                            'B': gs.getBishopMoves, 'Q': gs.getQueenMoves, 'K': gs.getKingMoves}
+        gs.moveLog = []
+        gs.checkMate = False
+        gs.staleMate = False
+        gs.legalMoveGeneration = True
+        gs.pins = {}
+        gs.capturesOnly = False
+        gs.quietsOnly = False
+        gs.zobristDebug = False
+        gs.evaluationLog = []
+        pieces = SNAPSHOT_PIECES
+        gs.board = [[pieces[code] for code in board[r * 8:r * 8 + 8]] for r in range(8)]
+        king = board.index(SNAPSHOT_CODES['wK'])
+        gs.whiteKingLocation = (king // 8, king % 8)
+        king = board.index(SNAPSHOT_CODES['bK'])
+        gs.blackKingLocation = (king // 8, king % 8)
+        gs.whiteToMove = bool(flags & 1)
+        gs.currentCastlingRights = CastleRights(bool(flags & 2), bool(flags & 8), bool(flags & 4), bool(flags & 16))
+        gs.castleRightsLog = [CastleRights(gs.currentCastlingRights.wks, gs.currentCastlingRights.bks,
+                                           gs.currentCastlingRights.wqs, gs.currentCastlingRights.bqs)]
+        gs.enpassantPossible = divmod(enpassant, 8) if enpassant != NO_ENPASSANT else ()
+        gs.enpassantPossibleLog = [gs.enpassantPossible]
+        gs.halfmoveClock = halfmoveClock
+        gs.halfmoveClockLog = [halfmoveClock]
+        gs.fullmoveNumber = fullmoveNumber
+        # the last key is the position's own, the ones before it are only there for repetitions
+        gs.zobristKeyLog = list(struct.unpack_from('<%dQ' % ((len(snapshot) - SNAPSHOT_HEADER.size) // 8), snapshot,
+                                                   SNAPSHOT_HEADER.size))
+        gs.zobristKey = gs.zobristKeyLog[-1]
+        gs.startFen = gs.to_fen()
+        gs.materialScore, gs.pieceSquareMiddleGame, gs.pieceSquareEndGame, gs.phase = gs.computeEvaluationTotals()
+        gs.pieceCount = 64 - board.count(0)
+        return gs
+
     '''
     Method to execute a move, doesn't work for enpassant, castling, or pawn promotion
     '''
     def makeMove(self, move):
+        # take the castle rights and en passant file of the old position out of the key
+        key = self.zobristKey ^ ZOBRIST_CASTLING[self.castleRightsIndex()] ^ self.enpassantKey()
         # update the with the piece moved and the destination square
         self.board[move.startRow][move.startCol] = "--"
         self.board[move.endRow][move.endCol] = move.pieceMoved
@@ -51,7 +255,7 @@ class GameState():
 
         # pawn promotion
         if move.isPawnPromotion:
-            self.board[move.endRow][move.endCol] = move.pieceMoved[0] + 'Q'
+            self.board[move.endRow][move.endCol] = move.pieceMoved[0] + move.promotionPiece
 
         # enpassant
         if move.isEnpassantMove:
@@ -81,6 +285,70 @@ class GameState():
         # to allow us to undo the move
         self.castleRightsLog.append(CastleRights(self.currentCastlingRights.wks, self.currentCastlingRights.bks,
                                                  self.currentCastlingRights.wqs, self.currentCastlingRights.bqs))
+        self.enpassantPossibleLog.append(self.enpassantPossible)
+        # the halfmove clock starts again after a capture or pawn move, the move number goes up after black moves
+        if move.pieceMoved[1] == 'P' or move.pieceCaptured != '--':
+            self.halfmoveClock = 0
+        else:
+            self.halfmoveClock += 1
+        self.halfmoveClockLog.append(self.halfmoveClock)
+        if move.pieceMoved[0] == 'b':
+            self.fullmoveNumber += 1
+
+        # move the pieces in the key and put the new castle rights, en passant file and side to move in
+        startSq = move.startRow * 8 + move.startCol
+        endSq = move.endRow * 8 + move.endCol
+        key ^= ZOBRIST_PIECES[move.pieceMoved][startSq]
+        key ^= ZOBRIST_PIECES[self.board[move.endRow][move.endCol]][endSq] # the promoted piece if promoting
+        if move.isEnpassantMove:
+            key ^= ZOBRIST_PIECES[move.pieceCaptured][move.startRow * 8 + move.endCol]
+        elif move.pieceCaptured != '--':
+            key ^= ZOBRIST_PIECES[move.pieceCaptured][endSq]
+        if move.isCastleMove:
+            rook = move.pieceMoved[0] + 'R'
+            if move.endCol - move.startCol == 2: # kingside rook moves from the corner to the left of the king
+                key ^= ZOBRIST_PIECES[rook][endSq + 1] ^ ZOBRIST_PIECES[rook][endSq - 1]
+            else: # queenside rook moves from the corner to the right of the king
+                key ^= ZOBRIST_PIECES[rook][endSq - 2] ^ ZOBRIST_PIECES[rook][endSq + 1]
+        key ^= ZOBRIST_CASTLING[self.castleRightsIndex()] ^ self.enpassantKey() ^ ZOBRIST_BLACK_TO_MOVE
+        self.zobristKey = key
+        self.zobristKeyLog.append(key)
+        if self.zobristDebug:
+            self.checkZobristKey()
+
+        # take the moved and captured pieces out of the evaluation totals and put the pieces that landed in
+        self.evaluationLog.append((self.materialScore, self.pieceSquareMiddleGame, self.pieceSquareEndGame,
+                                   self.phase))
+        placed = self.board[move.endRow][move.endCol]
+        self.pieceSquareMiddleGame += (PIECE_SQUARE_MIDDLE_GAME[placed][endSq] -
+                                       PIECE_SQUARE_MIDDLE_GAME[move.pieceMoved][startSq])
+        self.pieceSquareEndGame += PIECE_SQUARE_END_GAME[placed][endSq] - PIECE_SQUARE_END_GAME[move.pieceMoved][startSq]
+        if move.isPawnPromotion:
+            self.materialScore += PIECE_VALUES[placed] - PIECE_VALUES[move.pieceMoved]
+            self.phase += PIECE_PHASES[placed]
+        if move.pieceCaptured != '--':
+            self.pieceCount -= 1
+            capturedSq = move.startRow * 8 + move.endCol if move.isEnpassantMove else endSq
+            self.materialScore -= PIECE_VALUES[move.pieceCaptured]
+            self.pieceSquareMiddleGame -= PIECE_SQUARE_MIDDLE_GAME[move.pieceCaptured][capturedSq]
+            self.pieceSquareEndGame -= PIECE_SQUARE_END_GAME[move.pieceCaptured][capturedSq]
+            self.phase -= PIECE_PHASES[move.pieceCaptured]
+        if move.isCastleMove:
+            rook = move.pieceMoved[0] + 'R'
+            if move.endCol - move.startCol == 2:
+                rookStart, rookEnd = endSq + 1, endSq - 1
+            else:
+                rookStart, rookEnd = endSq - 2, endSq + 1
+            self.pieceSquareMiddleGame += (PIECE_SQUARE_MIDDLE_GAME[rook][rookEnd] -
+                                           PIECE_SQUARE_MIDDLE_GAME[rook][rookStart])
+            self.pieceSquareEndGame += PIECE_SQUARE_END_GAME[rook][rookEnd] - PIECE_SQUARE_END_GAME[rook][rookStart]
+
+    '''
+    Method to execute a move from its packed int encoding, for searches that generate and order codes. The move log
+    keeps Move objects because undo, notation and the GUI read them, so one is built here for the move being made
+    '''
+    def makeMoveCode(self, code):
+        self.makeMove(Move.fromCode(code, self.board))
 
     '''
     Method to undo the last move
@@ -102,10 +370,14 @@ class GameState():
             if move.isEnpassantMove:
                 self.board[move.endRow][move.endCol] = '--' # leave landing square blank
                 self.board[move.startRow][move.endCol] = move.pieceCaptured
-                self.enpassantPossible = (move.endRow, move.endCol)
-            # undo a 2 square pawn advance
-            if move.pieceMoved[1] == 'P' and abs(move.startRow - move.endRow) == 2:
-                self.enpassantPossible = ()
+            # restore the en passant square of the previous position
+            self.enpassantPossibleLog.pop()
+            self.enpassantPossible = self.enpassantPossibleLog[-1]
+            # restore the move counters
+            self.halfmoveClockLog.pop()
+            self.halfmoveClock = self.halfmoveClockLog[-1]
+            if move.pieceMoved[0] == 'b':
+                self.fullmoveNumber -= 1
             # undo castling rights
             self.castleRightsLog.pop() # get rid of the castle rights from the move we are undoing
             # set the current castle rights to the previous
@@ -123,6 +395,15 @@ class GameState():
                     self.board[move.endRow][move.endCol-2] = self.board[move.endRow][move.endCol+1]
                     # delete the new rook
                     self.board[move.endRow][move.endCol+1] = '--'
+            # the previous position's key and evaluation totals are still in the logs
+            self.zobristKeyLog.pop()
+            self.zobristKey = self.zobristKeyLog[-1]
+            self.materialScore, self.pieceSquareMiddleGame, self.pieceSquareEndGame, self.phase = \
+                self.evaluationLog.pop()
+            if move.pieceCaptured != '--':
+                self.pieceCount += 1
+            if self.zobristDebug:
+                self.checkZobristKey()
 
     '''
     Method to update castle rights given the move
@@ -151,22 +432,356 @@ class GameState():
                     self.currentCastlingRights.bqs = False
                 elif move.startCol == 7: # right rook
                     self.currentCastlingRights.bks = False
+        # if a rook is captured on its starting square, its side can no longer castle with it
+        if move.pieceCaptured == 'wR':
+            if move.endRow == 7:
+                if move.endCol == 0:
+                    self.currentCastlingRights.wqs = False
+                elif move.endCol == 7:
+                    self.currentCastlingRights.wks = False
+        elif move.pieceCaptured == 'bR':
+            if move.endRow == 0:
+                if move.endCol == 0:
+                    self.currentCastlingRights.bqs = False
+                elif move.endCol == 7:
+                    self.currentCastlingRights.bks = False
+
+    '''
+    Method to number the current castle rights 0-15 for the zobrist castling keys
+    '''
+    def castleRightsIndex(self):
+        rights = self.currentCastlingRights
+        return rights.wks | (rights.wqs << 1) | (rights.bks << 2) | (rights.bqs << 3)
+
+    '''
+    Method to get the zobrist key for the en passant file, which only counts when a pawn could capture there
+    '''
+    def enpassantKey(self):
+        if self.enpassantPossible == ():
+            return 0
+        r, c = self.enpassantPossible
+        # the capturing pawn stands beside the pawn that just moved two squares
+        pawnRow, capturer = (r + 1, 'wP') if self.whiteToMove else (r - 1, 'bP')
+        if (c > 0 and self.board[pawnRow][c-1] == capturer) or (c < 7 and self.board[pawnRow][c+1] == capturer):
+            return ZOBRIST_ENPASSANT[c]
+        return 0
+
+    '''
+    Method to compute the zobrist key of the position from scratch
+    '''
+    def computeZobristKey(self):
+        key = 0
+        for r in range(8):
+            for c in range(8):
+                piece = self.board[r][c]
+                if piece != '--':
+                    key ^= ZOBRIST_PIECES[piece][r * 8 + c]
+        if not self.whiteToMove:
+            key ^= ZOBRIST_BLACK_TO_MOVE
+        return key ^ ZOBRIST_CASTLING[self.castleRightsIndex()] ^ self.enpassantKey()
+
+    '''
+    Method to compute the evaluation totals from scratch: (material, middle game piece-square, end game
+    piece-square, phase)
+    '''
+    def computeEvaluationTotals(self):
+        material = middleGame = endGame = phase = 0
+        for r in range(8):
+            for c in range(8):
+                piece = self.board[r][c]
+                if piece != '--':
+                    material += PIECE_VALUES[piece]
+                    middleGame += PIECE_SQUARE_MIDDLE_GAME[piece][r * 8 + c]
+                    endGame += PIECE_SQUARE_END_GAME[piece][r * 8 + c]
+                    phase += PIECE_PHASES[piece]
+        return material, middleGame, endGame, phase
+
+    '''
+    Method to count how many times the current position has come up, with the same side to move, castle rights and
+    en passant square, stopping once stopAt is reached. A capture or pawn move can't be undone, so only the positions
+    since the last one are looked at: the scan goes back halfmoveClock plies at most, two at a time
+    '''
+    def repetitionCount(self, stopAt=3):
+        log = self.zobristKeyLog
+        key = self.zobristKey
+        count = 1
+        last = len(log) - 1
+        for i in range(last - 2, max(last - self.halfmoveClock, 0) - 1, -2):
+            if log[i] == key:
+                count += 1
+                if count >= stopAt:
+                    break
+        return count
+
+    '''
+    Method to check whether the current position has come up before, which the search scores as a draw
+    '''
+    def isRepetition(self):
+        return self.repetitionCount(2) >= 2
+
+    '''
+    Method to check whether the current position has come up three times, which ends the game in a draw
+    '''
+    def isThreefoldRepetition(self):
+        return self.repetitionCount(3) >= 3
+
+    '''
+    Method to check whether fifty moves each have passed without a capture or pawn move, which ends the game in a
+    draw
+    '''
+    def isFiftyMoveDraw(self):
+        return self.halfmoveClock >= 100
+
+    '''
+    Method used by the zobrist debug mode to make sure the incremental key matches the position
+    '''
+    def checkZobristKey(self):
+        expected = self.computeZobristKey()
+        if self.zobristKey != expected:
+            raise RuntimeError("zobrist key %016x does not match the position (expected %016x)" %
+                               (self.zobristKey, expected))
+
+    '''
+    Method to count the leaf nodes of the legal move tree to the given depth, for checking and timing move generation
+    against known counts. The last ply is counted without making the moves, or building Move objects for them
+    '''
+    def perft(self, depth):
+        if depth == 0:
+            return 1
+        codes = self.getValidMoveCodes()
+        if depth == 1:
+            return len(codes)
+        nodes = 0
+        for code in codes:
+            self.makeMoveCode(code)
+            nodes += self.perft(depth - 1)
+            self.undoMove()
+        return nodes
+
+    '''
+    Method to split the perft count by root move, to find which move a wrong count comes from
+    '''
+    def divide(self, depth):
+        counts = {}
+        for move in self.getValidMoves():
+            self.makeMove(move)
+            counts[move.getChessNotation()] = self.perft(depth - 1)
+            self.undoMove()
+        return counts
 
     '''
     Method to generate all moves considering checks
     '''
     def getValidMoves(self):
+        if self.legalMoveGeneration:
+            return self.getLegalMoves()
+        return self.getFilteredMoves()
+
+    '''
+    Method to generate the packed int encoding of every valid move, for callers such as perft that only need to count
+    the moves or make a few of them
+    '''
+    def getValidMoveCodes(self):
+        if self.legalMoveGeneration:
+            return self.getLegalMoveCodes()
+        return [move.encode() for move in self.getFilteredMoves()]
+
+    '''
+    Method to generate all moves considering checks by computing the checks and pins once for the position
+    '''
+    def getLegalMoves(self):
+        board = self.board
+        return [Move.fromCode(code, board) for code in self.getLegalMoveCodes()]
+
+    '''
+    Method to generate the packed int encoding of every legal move by computing the checks and pins once for the
+    position. Moves are generated as ints and only the legal ones are ever turned into Move objects. With capturesOnly
+    or quietsOnly, only those moves are generated and checkmate and stalemate are left alone
+    '''
+    def getLegalMoveCodes(self, capturesOnly=False, quietsOnly=False):
+        self.capturesOnly = capturesOnly
+        self.quietsOnly = quietsOnly
+        allyColor = 'w' if self.whiteToMove else 'b'
+        kingRow, kingCol = self.whiteKingLocation if self.whiteToMove else self.blackKingLocation
+        kingSq = kingRow * 8 + kingCol
+        inCheck, self.pins, checks = self.checkForPinsAndChecks(kingRow, kingCol, allyColor)
+        moves = []
+        if len(checks) > 1: # double check, only the king can move
+            self.getKingMoves(kingRow, kingCol, moves)
+        else:
+            moves = self.getAllPossibleMoves()
+            if inCheck:
+                # a single check must be captured or blocked, a knight check can only be captured
+                checkRow, checkCol, dr, dc = checks[0]
+                checkSq = checkRow * 8 + checkCol
+                validSquares = {checkSq}
+                if self.board[checkRow][checkCol][1] != 'N':
+                    for i in range(1, 8):
+                        square = (kingRow + dr * i) * 8 + kingCol + dc * i
+                        if square == checkSq:
+                            break
+                        validSquares.add(square)
+                # king and en passant moves are checked below by looking at the position after the move
+                moves = [code for code in moves if code & 63 == kingSq or code & Move.ENPASSANT_FLAG or
+                         (code >> 6) & 63 in validSquares]
+            elif not capturesOnly: # castling is a quiet move
+                self.getCastleMoves(kingRow, kingCol, moves)
+        self.pins = {}
+        self.capturesOnly = False
+        self.quietsOnly = False
+
+        # the king must not step onto an attacked square, and en passant can uncover a check along the rank
+        codes = []
+        for code in moves:
+            if (code & 63 == kingSq and not code & Move.CASTLE_FLAG) or code & Move.ENPASSANT_FLAG:
+                if not self.isKingSafeAfter(code, allyColor):
+                    continue
+            codes.append(code)
+
+        if capturesOnly or quietsOnly: # part of the moves says nothing about checkmate or stalemate
+            return codes
+        if len(codes) == 0: # either checkmate or stalemate
+            if inCheck:
+                self.checkMate = True
+            else:
+                self.staleMate = True
+        else:
+            self.checkMate = False
+            self.staleMate = False
+        return codes
+
+    '''
+    Method to generate only the legal captures and promotions, for searches that only look at forcing moves
+    '''
+    def getCaptureMoves(self):
+        board = self.board
+        return [Move.fromCode(code, board) for code in self.getCaptureMoveCodes()]
+
+    '''
+    Method to generate the packed int encoding of only the legal captures and promotions
+    '''
+    def getCaptureMoveCodes(self):
+        if not self.legalMoveGeneration:
+            return [move.encode() for move in self.getFilteredMoves()
+                    if move.pieceCaptured != '--' or move.isPawnPromotion]
+        return self.getLegalMoveCodes(capturesOnly=True)
+
+    '''
+    Method to generate only the legal moves that are neither captures nor promotions, so a search can generate them
+    after the captures have been tried
+    '''
+    def getQuietMoves(self):
+        board = self.board
+        return [Move.fromCode(code, board) for code in self.getQuietMoveCodes()]
+
+    '''
+    Method to generate the packed int encoding of only the legal moves that are neither captures nor promotions
+    '''
+    def getQuietMoveCodes(self):
+        if not self.legalMoveGeneration:
+            return [move.encode() for move in self.getFilteredMoves()
+                    if move.pieceCaptured == '--' and not move.isPawnPromotion]
+        return self.getLegalMoveCodes(quietsOnly=True)
+
+    '''
+    Method to look outward from the square r, c and find the enemy pieces giving check and the ally pieces pinned
+    to it. Returns (inCheck, pins, checks) where pins maps (row, col) to the pin direction and checks holds
+    (row, col, dr, dc) for every checking piece
+    '''
+    def checkForPinsAndChecks(self, r, c, allyColor):
+        pins = {}
+        checks = []
+        enemyColor = 'b' if allyColor == 'w' else 'w'
+        directions = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
+        for j in range(len(directions)):
+            d = directions[j]
+            possiblePin = () # reset possible pins
+            for i in range(1, 8):
+                endRow = r + d[0] * i
+                endCol = c + d[1] * i
+                if not (0 <= endRow < 8 and 0 <= endCol < 8): # off board
+                    break
+                endPiece = self.board[endRow][endCol]
+                if endPiece[0] == allyColor:
+                    if possiblePin == (): # first ally piece could be pinned
+                        possiblePin = (endRow, endCol)
+                    else: # second ally piece, so no pin or check in this direction
+                        break
+                elif endPiece[0] == enemyColor:
+                    pieceType = endPiece[1]
+                    # rooks attack orthogonally, bishops diagonally, queens both, kings and pawns only from one square
+                    # away, and pawns only from the squares in front of them
+                    if ((0 <= j <= 3 and pieceType == 'R') or (4 <= j <= 7 and pieceType == 'B') or
+                            pieceType == 'Q' or (i == 1 and pieceType == 'K') or
+                            (i == 1 and pieceType == 'P' and ((enemyColor == 'w' and 6 <= j <= 7) or
+                                                              (enemyColor == 'b' and 4 <= j <= 5)))):
+                        if possiblePin == (): # no piece in the way, so check
+                            checks.append((endRow, endCol, d[0], d[1]))
+                        else: # ally piece in the way, so pin
+                            pins[possiblePin] = d
+                    break # any enemy piece blocks the rest of this direction
+        # knights jump, so they can only check
+        knightMoves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+        for m in knightMoves:
+            endRow = r + m[0]
+            endCol = c + m[1]
+            if 0 <= endRow < 8 and 0 <= endCol < 8:
+                if self.board[endRow][endCol] == enemyColor + 'N':
+                    checks.append((endRow, endCol, m[0], m[1]))
+        return len(checks) > 0, pins, checks
+
+    '''
+    Method to check a packed king or en passant move by putting the pieces where the move leaves them and looking for
+    checks
+    '''
+    def isKingSafeAfter(self, code, allyColor):
+        board = self.board
+        startRow, startCol = (code & 63) >> 3, code & 7
+        endRow, endCol = (code >> 9) & 7, (code >> 6) & 7
+        pieceMoved = board[startRow][startCol]
+        pieceCaptured = board[endRow][endCol]
+        board[startRow][startCol] = '--'
+        board[endRow][endCol] = pieceMoved
+        if code & Move.ENPASSANT_FLAG: # the captured pawn is beside the start square
+            pieceCaptured = board[startRow][endCol]
+            board[startRow][endCol] = '--'
+        if pieceMoved[1] == 'K':
+            kingRow, kingCol = endRow, endCol
+        else:
+            kingRow, kingCol = self.whiteKingLocation if allyColor == 'w' else self.blackKingLocation
+        inCheck = self.isSquareAttacked((kingRow, kingCol), 'b' if allyColor == 'w' else 'w')
+        # put the pieces back
+        board[startRow][startCol] = pieceMoved
+        if code & Move.ENPASSANT_FLAG:
+            board[endRow][endCol] = '--'
+            board[startRow][endCol] = pieceCaptured
+        else:
+            board[endRow][endCol] = pieceCaptured
+        return not inCheck
+
+    '''
+    Method to determine if a piece pinned in pinDirection may still move in the direction dr, dc
+    '''
+    def pinAllows(self, pinDirection, dr, dc):
+        return pinDirection is None or pinDirection == (dr, dc) or pinDirection == (-dr, -dc)
+
+    '''
+    Method to generate all moves considering checks by making every move and testing the king, kept as a reference
+    '''
+    def getFilteredMoves(self):
+        self.pins = {}
         # preserve original value of enpassantPossible before modification
         tempEnpassantPossible = self.enpassantPossible
         # preserve original value of CastleRights before modification
         tempCastleRights = CastleRights(self.currentCastlingRights.wks, self.currentCastlingRights.bks,
                                         self.currentCastlingRights.wqs, self.currentCastlingRights.bqs)
         # 1) generate all possible moves
-        moves = self.getAllPossibleMoves()
+        codes = self.getAllPossibleMoves()
         if self.whiteToMove:
-            self.getCastleMoves(self.whiteKingLocation[0], self.whiteKingLocation[1], moves)
+            self.getCastleMoves(self.whiteKingLocation[0], self.whiteKingLocation[1], codes)
         else:
-            self.getCastleMoves(self.blackKingLocation[0], self.blackKingLocation[1], moves)
+            self.getCastleMoves(self.blackKingLocation[0], self.blackKingLocation[1], codes)
+        moves = [Move.fromCode(code, self.board) for code in codes]
         # 2) for each move, make the move
         for i in range(len(moves)-1, -1, -1): # when removing from a list, go backwards
             self.makeMove(moves[i])
@@ -195,26 +810,114 @@ class GameState():
     Method to determine if the current player is in check
     '''
     def inCheck(self):
-        # check if it is white's turn and the square of the white king is under attack
+        # check if the king of the side to move is attacked by the other side
         if self.whiteToMove:
-            return self.squareUnderAttack(self.whiteKingLocation[0], self.whiteKingLocation[1])
+            return self.isSquareAttacked(self.whiteKingLocation, 'b')
         else: # blacks turn
-            return self.squareUnderAttack(self.blackKingLocation[0], self.blackKingLocation[1])
-        
+            return self.isSquareAttacked(self.blackKingLocation, 'w')
+
     '''
     Method determine if the enemy can attack the square r, c
     '''
     def squareUnderAttack(self, r, c):
-        self.whiteToMove = not self.whiteToMove # switch to opponent's turn
-        oppMoves = self.getAllPossibleMoves() # generate all opponent moves
-        self.whiteToMove = not self.whiteToMove # switch turns back
-        for move in oppMoves:
-            if move.endRow == r and move.endCol == c: # square is under attack
-                return True
-        return False
+        return self.isSquareAttacked((r, c), 'b' if self.whiteToMove else 'w')
+
+    '''
+    Method to determine if any piece of byColor attacks square (row, col), defaulting to the side not to move
+    '''
+    def isSquareAttacked(self, square, byColor=None):
+        if byColor is None:
+            byColor = 'b' if self.whiteToMove else 'w'
+        return len(self.findAttackers(square[0], square[1], byColor, True)) > 0
+
+    '''
+    Method to list the (row, col) of every piece of byColor attacking square (row, col), defaulting to the side
+    not to move
+    '''
+    def attackersOf(self, square, byColor=None):
+        if byColor is None:
+            byColor = 'b' if self.whiteToMove else 'w'
+        return self.findAttackers(square[0], square[1], byColor, False)
 
     '''
-    Method to get all moves not considering checks
+    Method to look outward from the square r, c along knight, pawn, king and sliding rays for pieces of byColor
+    that attack it, optionally stopping at the first one found
+    '''
+    def findAttackers(self, r, c, byColor, stopAtFirst):
+        attackers = []
+        # knights jump, so only the eight knight squares need looking at
+        knightMoves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+        for m in knightMoves:
+            endRow = r + m[0]
+            endCol = c + m[1]
+            if 0 <= endRow < 8 and 0 <= endCol < 8 and self.board[endRow][endCol] == byColor + 'N':
+                attackers.append((endRow, endCol))
+                if stopAtFirst:
+                    return attackers
+        # a white pawn attacks from the row below the square, a black pawn from the row above
+        pawnRow = r + 1 if byColor == 'w' else r - 1
+        if 0 <= pawnRow < 8:
+            for endCol in (c - 1, c + 1):
+                if 0 <= endCol < 8 and self.board[pawnRow][endCol] == byColor + 'P':
+                    attackers.append((pawnRow, endCol))
+                    if stopAtFirst:
+                        return attackers
+        # walk each ray to the first piece and see if it can attack back along that ray
+        directions = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
+        for j in range(len(directions)):
+            d = directions[j]
+            slider = 'R' if j <= 3 else 'B' # rooks attack orthogonally, bishops diagonally
+            for i in range(1, 8):
+                endRow = r + d[0] * i
+                endCol = c + d[1] * i
+                if not (0 <= endRow < 8 and 0 <= endCol < 8): # off board
+                    break
+                endPiece = self.board[endRow][endCol]
+                if endPiece != '--':
+                    if endPiece[0] == byColor and (endPiece[1] == slider or endPiece[1] == 'Q' or
+                                                   (i == 1 and endPiece[1] == 'K')):
+                        attackers.append((endRow, endCol))
+                        if stopAtFirst:
+                            return attackers
+                    break # the first piece blocks the rest of this ray
+        return attackers
+
+    '''
+    Method to count the squares the pieces of the given colour and types attack or can move to, not counting squares
+    held by their own pieces. It is pseudo-legal, builds no moves and leaves the game state untouched
+    '''
+    def getMobility(self, color, pieceTypes='NBRQ'):
+        mobility = 0
+        directions = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
+        knightMoves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+        pawnCaptures = ((-1, -1), (-1, 1)) if color == 'w' else ((1, -1), (1, 1))
+        for r in range(8):
+            for c in range(8):
+                piece = self.board[r][c]
+                if piece[0] != color or piece[1] not in pieceTypes:
+                    continue
+                pieceType = piece[1]
+                if pieceType in 'RBQ': # sliders count every square up to and including the first piece
+                    for d in directions[:4] if pieceType == 'R' else directions[4:] if pieceType == 'B' else directions:
+                        endRow, endCol = r + d[0], c + d[1]
+                        while 0 <= endRow < 8 and 0 <= endCol < 8:
+                            endPiece = self.board[endRow][endCol]
+                            if endPiece[0] != color:
+                                mobility += 1
+                            if endPiece != '--':
+                                break
+                            endRow, endCol = endRow + d[0], endCol + d[1]
+                else:
+                    steps = knightMoves if pieceType == 'N' else directions if pieceType == 'K' else pawnCaptures
+                    for m in steps:
+                        endRow, endCol = r + m[0], c + m[1]
+                        if 0 <= endRow < 8 and 0 <= endCol < 8 and self.board[endRow][endCol][0] != color:
+                            mobility += 1
+        return mobility
+
+    '''
+    Method to get the packed int encoding of all moves not considering checks. The piece move functions below all add
+    packed moves, see Move, so generating a move never builds a Move object
     '''
     def getAllPossibleMoves(self):
         moves = []
@@ -231,38 +934,55 @@ class GameState():
     Method to get all pawn moves for the pawn located at row, col and add them to the list
     '''
     def getPawnMoves(self, r, c, moves):
+        pinDirection = self.pins.get((r, c))
+        start = r * 8 + c
         if self.whiteToMove: # white pawn moves
-            if self.board[r-1][c] == '--': # 1 square pawn advance
-                moves.append(Move((r, c), (r-1, c), self.board))
+            # 1 square pawn advance, which only counts as forcing if it promotes
+            if (self.board[r-1][c] == '--' and self.pinAllows(pinDirection, -1, 0) and
+                    (not self.capturesOnly or r == 1) and (not self.quietsOnly or r != 1)):
+                self.addPawnMoves(start, start - 8, moves)
                 if r == 6 and self.board[r-2][c] == '--': # 2 square advance
-                    moves.append(Move((r, c), (r-2, c), self.board))
-            if c-1 >= 0: # captures to the left
+                    moves.append(start | ((start - 16) << 6))
+            if c-1 >= 0 and self.pinAllows(pinDirection, -1, -1) and not self.quietsOnly: # captures to the left
                 if self.board[r-1][c-1][0] == 'b': # there is an enemy piece to capture
-                    moves.append(Move((r, c), (r-1, c-1), self.board))
+                    self.addPawnMoves(start, start - 9, moves)
                 elif (r-1, c-1) == self.enpassantPossible: # enpassant capture
-                    moves.append(Move((r, c), (r-1, c-1), self.board, isEnpassantMove=True))
-            if c+1 <= 7: # captures to the right
+                    moves.append(start | ((start - 9) << 6) | Move.ENPASSANT_FLAG)
+            if c+1 <= 7 and self.pinAllows(pinDirection, -1, 1) and not self.quietsOnly: # captures to the right
                 if self.board[r-1][c+1][0] == 'b':
-                    moves.append(Move((r, c), (r-1, c+1), self.board))
+                    self.addPawnMoves(start, start - 7, moves)
                 elif (r-1, c+1) == self.enpassantPossible: # enpassnt capture
-                    moves.append(Move((r, c), (r-1, c+1), self.board, isEnpassantMove=True))
+                    moves.append(start | ((start - 7) << 6) | Move.ENPASSANT_FLAG)
 
         else: #black pawn moves
-            if self.board[r+1][c] == '--': # 1 square pawn advance
-                moves.append(Move((r, c), (r+1, c), self.board))
+            # 1 square pawn advance, which only counts as forcing if it promotes
+            if (self.board[r+1][c] == '--' and self.pinAllows(pinDirection, 1, 0) and
+                    (not self.capturesOnly or r == 6) and (not self.quietsOnly or r != 6)):
+                self.addPawnMoves(start, start + 8, moves)
                 if r == 1 and self.board[r+2][c] == '--': # 2 square advance
-                    moves.append(Move((r, c), (r+2, c), self.board))
-            if c-1 >= 0: # captures to the left
+                    moves.append(start | ((start + 16) << 6))
+            if c-1 >= 0 and self.pinAllows(pinDirection, 1, -1) and not self.quietsOnly: # captures to the left
                 if self.board[r+1][c-1][0] == 'w': # there is an enemy piece to capture
-                    moves.append(Move((r, c), (r+1, c-1), self.board))
+                    self.addPawnMoves(start, start + 7, moves)
                 elif (r+1, c-1) == self.enpassantPossible: # enpassant capture
-                    moves.append(Move((r, c), (r+1, c-1), self.board, isEnpassantMove=True))
-            if c+1 <= 7: # captures to the right
+                    moves.append(start | ((start + 7) << 6) | Move.ENPASSANT_FLAG)
+            if c+1 <= 7 and self.pinAllows(pinDirection, 1, 1) and not self.quietsOnly: # captures to the right
                 if self.board[r+1][c+1][0] == 'w':
-                    moves.append(Move((r, c), (r+1, c+1), self.board))
+                    self.addPawnMoves(start, start + 9, moves)
                 elif (r+1, c+1) == self.enpassantPossible: # enpassant capture
-                    moves.append(Move((r, c), (r+1, c+1), self.board, isEnpassantMove=True))
-        # add pawn promotions later
+                    moves.append(start | ((start + 9) << 6) | Move.ENPASSANT_FLAG)
+
+    '''
+    Method to add a packed pawn move from square startSq to endSq that is not en passant, adding one move for each
+    promotion piece on the last rank
+    '''
+    def addPawnMoves(self, startSq, endSq, moves):
+        code = startSq | (endSq << 6)
+        if endSq < 8 or endSq >= 56: # pawn promotion
+            for promotion in range(1, len(Move.promotionPieces) + 1):
+                moves.append(code | (promotion << 12))
+        else:
+            moves.append(code)
 
     '''
     Method to get all rook moves for the rook located at row, col and add them to the list
@@ -270,16 +990,22 @@ class GameState():
     def getRookMoves(self, r, c, moves):
         directions = ((-1, 0), (0, -1), (1,0), (0, 1)) # define directions: up down left right
         enemyColor = 'b' if self.whiteToMove else 'w' # determine enemy colour based off current players turn
+        pinDirection = self.pins.get((r, c))
+        start = r * 8 + c
         for d in directions:
+            if not self.pinAllows(pinDirection, d[0], d[1]): # a pinned piece can only move along the pin
+                continue
             for i in range(1, 8):
                 endRow = r + d[0] * i
                 endCol = c + d[1] * i
                 if 0 <= endRow < 8 and 0 <= endCol < 8: # check if potential move is on board
                     endPiece = self.board[endRow][endCol]
                     if endPiece == "--": # empty space; valid
-                        moves.append(Move((r, c), (endRow, endCol), self.board))
+                        if not self.capturesOnly:
+                            moves.append(start | ((endRow * 8 + endCol) << 6))
                     elif endPiece[0] == enemyColor: # enemy piece; valid capture
-                        moves.append(Move((r, c), (endRow, endCol), self.board))
+                        if not self.quietsOnly:
+                            moves.append(start | ((endRow * 8 + endCol) << 6))
                         break
                     else: # friendly piece; invalid
                         break
@@ -292,13 +1018,17 @@ class GameState():
     def getKnightMoves(self, r, c, moves):
         knightMoves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2),(1, -2), (1, 2), (2, -1), (2, 1)) # define directions
         allyColor = 'w' if self.whiteToMove else 'b' # determine ally colour based off current players turn
+        if (r, c) in self.pins: # a pinned knight can never move
+            return
+        start = r * 8 + c
         for m in knightMoves:
             endRow = r + m[0]
             endCol = c + m[1]
             if 0 <= endRow < 8 and 0 <= endCol < 8:
                 endPiece = self.board[endRow][endCol]
-                if endPiece[0] != allyColor: # not an ally piece
-                    moves.append(Move((r, c), (endRow, endCol), self.board))
+                # not an ally piece, and the kind of move being generated
+                if endPiece[0] != allyColor and not (self.quietsOnly if endPiece != '--' else self.capturesOnly):
+                    moves.append(start | ((endRow * 8 + endCol) << 6))
 
     '''
     Method to get all bishop moves for the bishop located at row, col and add them to the list
@@ -306,16 +1036,22 @@ class GameState():
     def getBishopMoves(self, r, c, moves):
         directions = ((-1, -1), (-1, 1), (1,-1), (1, 1)) # define directions: 4 diagonals
         enemyColor = 'b' if self.whiteToMove else 'w' # determine enemy colour based off current players turn
+        pinDirection = self.pins.get((r, c))
+        start = r * 8 + c
         for d in directions:
+            if not self.pinAllows(pinDirection, d[0], d[1]): # a pinned piece can only move along the pin
+                continue
             for i in range(1, 8):
                 endRow = r + d[0] * i
                 endCol = c + d[1] * i
                 if 0 <= endRow < 8 and 0 <= endCol < 8: # check if potential move is on board
                     endPiece = self.board[endRow][endCol]
                     if endPiece == "--": # empty space; valid
-                        moves.append(Move((r, c), (endRow, endCol), self.board))
+                        if not self.capturesOnly:
+                            moves.append(start | ((endRow * 8 + endCol) << 6))
                     elif endPiece[0] == enemyColor: # enemy piece; valid capture
-                        moves.append(Move((r, c), (endRow, endCol), self.board))
+                        if not self.quietsOnly:
+                            moves.append(start | ((endRow * 8 + endCol) << 6))
                         break
                     else: # friendly piece; invalid
                         break
@@ -336,20 +1072,22 @@ class GameState():
     def getKingMoves(self, r, c, moves):
         kingMoves = ((-1, 0), (0, -1), (1,0), (0, 1), (-1, -1), (-1, 1), (1,-1), (1, 1)) #define directions: all 8
         allyColor = 'w' if self.whiteToMove else 'b'
+        start = r * 8 + c
         for i in range(8):
             endRow = r + kingMoves[i][0]
             endCol = c + kingMoves[i][1]
             if 0 <= endRow < 8 and 0 <= endCol < 8: # check if potential move is on board
                 endPiece = self.board[endRow][endCol]
-                if endPiece[0] != allyColor: # not an ally piece
-                    moves.append(Move((r, c), (endRow, endCol), self.board))
+                # not an ally piece, and the kind of move being generated
+                if endPiece[0] != allyColor and not (self.quietsOnly if endPiece != '--' else self.capturesOnly):
+                    moves.append(start | ((endRow * 8 + endCol) << 6))
 
     '''
     Method to generate the valid castling moves for the king at row, col and add them to the list of moves
     '''
     def getCastleMoves(self, r, c, moves):
         # 1) check if the king is in check
-        if self.squareUnderAttack(r, c):
+        if self.isSquareAttacked((r, c)):
             return # can't castle while in check
         # 2) check if the squares between the king and the rook are open
         # 3) check if those squares are under attack
@@ -365,16 +1103,16 @@ class GameState():
     '''
     def getKingsideCastleMoves(self, r, c, moves):
         if self.board[r][c+1] == '--' and self.board[r][c+2] == '--':
-            if not self.squareUnderAttack(r, c+1) and not self.squareUnderAttack(r, c+2):
-                moves.append(Move((r, c), (r, c+2), self.board, isCastleMove = True))
+            if not self.isSquareAttacked((r, c+1)) and not self.isSquareAttacked((r, c+2)):
+                moves.append((r * 8 + c) | ((r * 8 + c + 2) << 6) | Move.CASTLE_FLAG)
 
     '''
     Method to generate the possible queen-side castling moves
     '''
     def getQueensideCastleMoves(self, r, c, moves):
         if self.board[r][c-1] == '--' and self.board[r][c-2] == '--' and self.board[r][c-3] == '--':
-            if not self.squareUnderAttack(r, c-1) and not self.squareUnderAttack(r, c-2):
-                moves.append(Move((r, c), (r, c-2), self.board, isCastleMove = True))
+            if not self.isSquareAttacked((r, c-1)) and not self.isSquareAttacked((r, c-2)):
+                moves.append((r * 8 + c) | ((r * 8 + c - 2) << 6) | Move.CASTLE_FLAG)
 
     '''
     Method to get piece
@@ -391,6 +1129,10 @@ class CastleRights():
         self.bqs = bqs # black queen side
 
 class Move():
+    # only these attributes exist on a move, which keeps every move object small
+    __slots__ = ('startRow', 'startCol', 'endRow', 'endCol', 'pieceMoved', 'pieceCaptured', 'isPawnPromotion',
+                 'promotionPiece', 'isEnpassantMove', 'isCastleMove', 'moveID')
+
     # maps keys to values for chessboard rank and file conversions
     # key : value
     # used for converting chess notation to array indices and vice versa
@@ -401,8 +1143,18 @@ class Move():
                    "e": 4, "f": 5, "g": 6, "h": 7}
     colsToFiles = {v: k for k, v in filesToCols.items()} # reverse mapping for columns to files
 
+    # pieces a pawn can promote to, in the order they are numbered in the packed move encoding
+    promotionPieces = ('Q', 'R', 'B', 'N')
+    # a move packs into one int: start square (6 bits), end square (6 bits), promotion piece (3 bits, 0 for none)
+    # and the en passant and castle flags. Squares are numbered row * 8 + col
+    ENPASSANT_FLAG = 1 << 15
+    CASTLE_FLAG = 1 << 16
+    PROMOTION_MASK = 7 << 12
+    # the start, end and promotion bits of a packed move, which are its moveID
+    ID_MASK = (1 << 15) - 1
+
     # initializes a move object
-    def __init__(self, startSq, endsQ, board, isEnpassantMove=False, isCastleMove=False):
+    def __init__(self, startSq, endsQ, board, isEnpassantMove=False, isCastleMove=False, promotionPiece='Q'):
         # initialize move object with start and end square coordinates, the chessboard, and a flag for enpassant moves
         self.startRow = startSq[0]
         self.startCol = startSq[1]
@@ -415,6 +1167,7 @@ class Move():
         self.isPawnPromotion = False
         if (self.pieceMoved == 'wP' and self.endRow == 0) or (self.pieceMoved == 'bP' and self.endRow == 7):
             self.isPawnPromotion = True
+        self.promotionPiece = promotionPiece
         # en passant: check if the move is an en passant capture and update the captured piece accordingly
         self.isEnpassantMove = isEnpassantMove
         if self.isEnpassantMove:
@@ -422,8 +1175,47 @@ class Move():
             self.pieceCaptured = 'wP'if self.pieceMoved == 'bP' else 'bP'
         # castle move: check if the move is a castle
         self.isCastleMove = isCastleMove
-        # unique identifier for the move based on board coordinates (useful for move logging and identification)
-        self.moveID = self.startRow * 1000 + self.startCol * 100 + self.endRow * 10 + self.endCol
+        # unique identifier for the move: the packed start square, end square and promotion piece
+        self.moveID = (self.startRow * 8 + self.startCol) | ((self.endRow * 8 + self.endCol) << 6)
+        if self.isPawnPromotion:
+            self.moveID |= (self.promotionPieces.index(promotionPiece) + 1) << 12
+
+    '''
+    Method to build a move from its packed int encoding, reading the pieces from the board. Every legal move is built
+    this way, so it fills in the same fields as __init__ straight from the code rather than going through it
+    '''
+    @classmethod
+    def fromCode(cls, code, board):
+        move = cls.__new__(cls)
+        move.startRow = startRow = (code & 63) >> 3
+        move.startCol = startCol = code & 7
+        move.endRow = endRow = (code >> 9) & 7
+        move.endCol = endCol = (code >> 6) & 7
+        move.pieceMoved = pieceMoved = board[startRow][startCol]
+        move.isEnpassantMove = isEnpassantMove = code & cls.ENPASSANT_FLAG != 0
+        if isEnpassantMove:
+            move.pieceCaptured = 'wP' if pieceMoved == 'bP' else 'bP'
+        else:
+            move.pieceCaptured = board[endRow][endCol]
+        move.isCastleMove = code & cls.CASTLE_FLAG != 0
+        promotion = (code >> 12) & 7
+        move.promotionPiece = cls.promotionPieces[promotion - 1] if promotion else 'Q'
+        move.isPawnPromotion = (pieceMoved == 'wP' and endRow == 0) or (pieceMoved == 'bP' and endRow == 7)
+        move.moveID = code & 4095
+        if move.isPawnPromotion:
+            move.moveID |= (promotion or 1) << 12 # a promotion without a piece is to a queen, as in __init__
+        return move
+
+    '''
+    Method to get the packed int encoding of the move, including the en passant and castle flags
+    '''
+    def encode(self):
+        code = self.moveID
+        if self.isEnpassantMove:
+            code |= self.ENPASSANT_FLAG
+        if self.isCastleMove:
+            code |= self.CASTLE_FLAG
+        return code
 
     # override the equals method to compare move objects
     def __eq__(self, other):
@@ -433,15 +1225,22 @@ class Move():
             return self.moveID == other.moveID
         return False
 
+    # equal moves hash the same, so moves can be used as dict and set keys
+    def __hash__(self):
+        return self.moveID
+
     '''
     Method to get chess notation for a move
     '''
     def getChessNotation(self):
         # can add to make this like real chess notation
-        return self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
+        notation = self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
+        if self.isPawnPromotion:
+            notation += self.promotionPiece.lower()
+        return notation
 
     '''
     Method to convert row and column indices to chess notation
     '''
     def getRankFile(self, r, c):
-        return self.colsToFiles[c] + self.rowstoRanks[r]
\ No newline at end of file
+        return self.colsToFiles[c] + self.rowstoRanks[r]
@@ -0,0 +1,116 @@
+# Evaluation tables shared by the engine, which keeps running totals of them as moves are made, and the AI.
+# Tables are written from white's point of view: row 0 is the 8th rank. Black pieces use the table flipped.
+
+# Piece scores: pawn=1, knight=3, bishop=3, rook=5, queen=9, king=0 (infinite value but not used in eval)
+PIECE_SCORES = {"P": 10, "N": 30, "B": 30, "R": 50, "Q": 90, "K": 900}
+
+# Position tables to encourage good piece placement
+PAWN_SCORES = [
+    [0, 0, 0, 0, 0, 0, 0, 0],
+    [50, 50, 50, 50, 50, 50, 50, 50],
+    [10, 10, 20, 30, 30, 20, 10, 10],
+    [5, 5, 10, 25, 25, 10, 5, 5],
+    [0, 0, 0, 20, 20, 0, 0, 0],
+    [5, -5, -10, 0, 0, -10, -5, 5],
+    [5, 10, 10, -20, -20, 10, 10, 5],
+    [0, 0, 0, 0, 0, 0, 0, 0]
+]
+
+KNIGHT_SCORES = [
+    [-50, -40, -30, -30, -30, -30, -40, -50],
+    [-40, -20, 0, 0, 0, 0, -20, -40],
+    [-30, 0, 10, 15, 15, 10, 0, -30],
+    [-30, 5, 15, 20, 20, 15, 5, -30],
+    [-30, 0, 15, 20, 20, 15, 0, -30],
+    [-30, 5, 10, 15, 15, 10, 5, -30],
+    [-40, -20, 0, 5, 5, 0, -20, -40],
+    [-50, -40, -30, -30, -30, -30, -40, -50]
+]
+
+BISHOP_SCORES = [
+    [-20, -10, -10, -10, -10, -10, -10, -20],
+    [-10, 0, 0, 0, 0, 0, 0, -10],
+    [-10, 0, 10, 10, 10, 10, 0, -10],
+    [-10, 5, 5, 10, 10, 5, 5, -10],
+    [-10, 0, 5, 10, 10, 5, 0, -10],
+    [-10, 10, 10, 10, 10, 10, 10, -10],
+    [-10, 5, 0, 0, 0, 0, 5, -10],
+    [-20, -10, -10, -10, -10, -10, -10, -20]
+]
+
+ROOK_SCORES = [
+    [0, 0, 0, 0, 0, 0, 0, 0],
+    [5, 10, 10, 10, 10, 10, 10, 5],
+    [-5, 0, 0, 0, 0, 0, 0, -5],
+    [-5, 0, 0, 0, 0, 0, 0, -5],
+    [-5, 0, 0, 0, 0, 0, 0, -5],
+    [-5, 0, 0, 0, 0, 0, 0, -5],
+    [-5, 0, 0, 0, 0, 0, 0, -5],
+    [0, 0, 0, 5, 5, 0, 0, 0]
+]
+
+QUEEN_SCORES = [
+    [-20, -10, -10, -5, -5, -10, -10, -20],
+    [-10, 0, 0, 0, 0, 0, 0, -10],
+    [-10, 0, 5, 5, 5, 5, 0, -10],
+    [-5, 0, 5, 5, 5, 5, 0, -5],
+    [0, 0, 5, 5, 5, 5, 0, -5],
+    [-10, 5, 5, 5, 5, 5, 0, -10],
+    [-10, 0, 5, 0, 0, 0, 0, -10],
+    [-20, -10, -10, -5, -5, -10, -10, -20]
+]
+
+KING_SCORES_MIDDLE_GAME = [
+    [-30, -40, -40, -50, -50, -40, -40, -30],
+    [-30, -40, -40, -50, -50, -40, -40, -30],
+    [-30, -40, -40, -50, -50, -40, -40, -30],
+    [-30, -40, -40, -50, -50, -40, -40, -30],
+    [-20, -30, -30, -40, -40, -30, -30, -20],
+    [-10, -20, -20, -20, -20, -20, -20, -10],
+    [20, 20, 0, 0, 0, 0, 20, 20],
+    [20, 30, 10, 0, 0, 10, 30, 20]
+]
+
+KING_SCORES_END_GAME = [
+    [-50, -40, -30, -20, -20, -30, -40, -50],
+    [-30, -20, -10, 0, 0, -10, -20, -30],
+    [-30, -10, 20, 30, 30, 20, -10, -30],
+    [-30, -10, 30, 40, 40, 30, -10, -30],
+    [-30, -10, 30, 40, 40, 30, -10, -30],
+    [-30, -10, 20, 30, 30, 20, -10, -30],
+    [-30, -30, 0, 0, 0, 0, -30, -30],
+    [-50, -30, -30, -30, -30, -30, -30, -50]
+]
+
+
+# how much each piece counts towards the game phase, which runs from 24 with all pieces on the board down to 0
+PHASE_WEIGHTS = {"P": 0, "N": 1, "B": 1, "R": 2, "Q": 4, "K": 0}
+MAX_PHASE = 24
+
+
+def build_piece_square_tables(king_scores):
+    """
+    Build, for every coloured piece, the 64-square table of its signed position value.
+    White values are positive and black values negative, so a position's total is white's advantage.
+
+    Args:
+        king_scores: The king table to use, middle game or end game.
+
+    Returns:
+        A dict mapping pieces like "wN" to a list indexed by row * 8 + col.
+    """
+    tables = {"P": PAWN_SCORES, "N": KNIGHT_SCORES, "B": BISHOP_SCORES, "R": ROOK_SCORES, "Q": QUEEN_SCORES,
+              "K": king_scores}
+    piece_square = {}
+    for piece_type, table in tables.items():
+        piece_square["w" + piece_type] = [table[row][col] for row in range(8) for col in range(8)]
+        piece_square["b" + piece_type] = [-table[7 - row][col] for row in range(8) for col in range(8)]
+    return piece_square
+
+
+# signed material per piece and signed position value per piece and square, used for incremental evaluation
+PIECE_VALUES = {color + piece: (1 if color == "w" else -1) * score
+                for color in "wb" for piece, score in PIECE_SCORES.items()}
+PIECE_SQUARE_MIDDLE_GAME = build_piece_square_tables(KING_SCORES_MIDDLE_GAME)
+PIECE_SQUARE_END_GAME = build_piece_square_tables(KING_SCORES_END_GAME)
+PIECE_PHASES = {color + piece: weight for color in "wb" for piece, weight in PHASE_WEIGHTS.items()}
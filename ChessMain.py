@@ -1,19 +1,81 @@
 # This is the main driver file. It is responsible for handling user input and displaying the current GameState object
 
+import threading
 import pygame as p
 import ChessEngine
 import ChessAI
+import ChessBitboard
 
 WIDTH = HEIGHT = 512
 DIMENSION = 8  # dimensions 8x8
 SQ_SIZE = HEIGHT // DIMENSION
 MAX_FPS = 15  # for animations later on
+PONDER = True  # let the AI think on the human's time in Player vs AI mode
+BOOK_FILE = "book.bin"  # opening book built with ChessBook.py, the AI plays from it while the position is in it
+TABLEBASE_DIR = "tablebases"  # endgame tables generated with ChessTablebase.py, used once few pieces are left
+BACKEND = "legal"  # game state backend from ChessBitboard.BACKENDS, "bitboard" for the faster bitboard move generation
 IMAGES = {}
 
 # Game modes
 PLAYER_VS_PLAYER = "player_vs_player"
 PLAYER_VS_AI = "player_vs_ai"
 
+'''
+Runs the AI search in a background thread on a copy of the position, so the game loop keeps drawing and handling
+events while the AI thinks. A pondering search thinks on the human's time until it is cancelled
+'''
+
+
+class AISearch():
+    def __init__(self, ai, gs, ponder=False):
+        self.ai = ai
+        self.ponder = ponder
+        self.position = ChessAI.position_snapshot(gs)  # the thread works on its own copy of the board
+        self.stopEvent = threading.Event()
+        self.move = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def run(self):
+        gs = ChessAI.restore_position(self.position)
+        if self.ponder:
+            self.ai.ponder(gs, self.stopEvent)
+        else:
+            self.move = self.ai.find_best_move(gs, gs.getValidMoves(), stop_event=self.stopEvent)
+
+    '''
+    Check whether the search has finished
+    '''
+    def done(self):
+        return not self.thread.is_alive()
+
+    '''
+    Stop the search and wait for the thread to finish, the result is thrown away
+    '''
+    def cancel(self):
+        self.stopEvent.set()
+        self.thread.join()
+
+    '''
+    Get the move found, as the matching move from the valid moves of the real game state
+    '''
+    def bestMove(self, validMoves):
+        for move in validMoves:
+            if move == self.move:
+                return move
+        return None
+
+    '''
+    Describe how far the search has got, for display while the AI thinks
+    '''
+    def progressText(self):
+        text = "AI thinking... depth " + str(self.ai.completed_depth) + ", " + str(self.ai.counter) + " nodes"
+        bestMove = self.ai.best_move
+        if bestMove is not None:
+            text += ", best " + bestMove.getChessNotation()
+        return text
+
+
 '''
 Initialize a global dictionary of images
 '''
@@ -45,7 +107,7 @@ def main():
 
     clock = p.time.Clock()
     screen.fill(p.Color("white"))
-    gs = ChessEngine.GameState()
+    gs = ChessBitboard.new_game_state(BACKEND)
     validMoves = gs.getValidMoves()
     moveMade = False  # flag variable for when a move is made
     animate = False  # flag variable for when a move should be animated
@@ -55,6 +117,7 @@ def main():
     squareSelected = ()  # no square selected initially, keep track of the last click of the user (tuple: (row,col)
     playerClicks = []  # keep track of player clicks (two tuples: [(6,4), (4,4)])
     gameOver = False
+    aiSearch = None  # the AI search running in the background, if any
 
     # Set up AI if in Player vs AI mode
     playerOne = True  # True if human plays white, False if AI plays white
@@ -62,7 +125,7 @@ def main():
 
     if game_mode == PLAYER_VS_AI:
         playerTwo = False  # AI plays as black
-        ai = ChessAI.ChessAI(depth=3)  # Initialize AI with depth 3
+        ai = ChessAI.ChessAI(depth=3, book=BOOK_FILE, tablebase=TABLEBASE_DIR)  # Initialize AI with depth 3
 
     while running:  # game loop
         # Check if it's AI's turn
@@ -71,6 +134,9 @@ def main():
         for e in p.event.get():
             if e.type == p.QUIT:
                 running = False
+                if aiSearch is not None:
+                    aiSearch.cancel()
+                    aiSearch = None
             # mouse handler
             elif e.type == p.MOUSEBUTTONDOWN:
                 if not gameOver and humanTurn:
@@ -98,6 +164,9 @@ def main():
                             playerClicks = [squareSelected]
             # key handler
             elif e.type == p.KEYDOWN:
+                if e.key in (p.K_z, p.K_r, p.K_m) and aiSearch is not None:
+                    aiSearch.cancel()  # the position the AI is searching is about to change
+                    aiSearch = None
                 if e.key == p.K_z:  # undo when z is pressed
                     gs.undoMove()
                     # If in Player vs AI mode and undoing, undo twice to get back to human's turn
@@ -106,7 +175,7 @@ def main():
                     moveMade = True
                     animate = False
                 if e.key == p.K_r:  # reset board when 'r' is pressed
-                    gs = ChessEngine.GameState()
+                    gs = ChessBitboard.new_game_state(BACKEND)
                     validMoves = gs.getValidMoves()
                     squareSelected = ()
                     playerClicks = []
@@ -117,21 +186,27 @@ def main():
                     return main()  # Restart the game
 
         # AI Move Finder
-        if not gameOver and not humanTurn and game_mode == PLAYER_VS_AI:
-            # Display thinking text
-            drawGameState(screen, gs, validMoves, squareSelected)
-            thinking_text = "AI thinking..."
-            draw_thinking_text(screen, thinking_text)
-            p.display.flip()
-
-            # Get AI move
-            ai_move = ai.find_best_move(gs, validMoves)
-            if ai_move is None:
-                ai_move = validMoves[0]  # Fallback to first available move
-
-            gs.makeMove(ai_move)
-            moveMade = True
-            animate = True
+        # whose turn it is is checked again, an undo or reset above may have handed the turn back to the human
+        humanTurn = (gs.whiteToMove and playerOne) or (not gs.whiteToMove and playerTwo)
+        if aiSearch is not None and aiSearch.ponder and (not humanTurn or moveMade):
+            aiSearch.cancel()  # the human has moved, stop pondering so the AI can search the real position
+            aiSearch = None
+        if not gameOver and humanTurn and game_mode == PLAYER_VS_AI and not moveMade and PONDER:
+            if aiSearch is None:
+                aiSearch = AISearch(ai, gs, ponder=True)  # think on the human's time
+        if not gameOver and not humanTurn and game_mode == PLAYER_VS_AI and not moveMade:
+            if aiSearch is None:
+                aiSearch = AISearch(ai, gs)  # start thinking in the background
+            elif aiSearch.done():
+                # Get AI move
+                ai_move = aiSearch.bestMove(validMoves)
+                aiSearch = None
+                if ai_move is None:
+                    ai_move = validMoves[0]  # Fallback to first available move
+
+                gs.makeMove(ai_move)
+                moveMade = True
+                animate = True
 
         if moveMade:
             if animate:
@@ -141,6 +216,8 @@ def main():
             animate = False
 
         drawGameState(screen, gs, validMoves, squareSelected)  # draw current state of the game on the screen
+        if aiSearch is not None and not aiSearch.ponder:
+            draw_thinking_text(screen, aiSearch.progressText())  # Display thinking text
 
         if gs.checkMate:
             gameOver = True
@@ -151,6 +228,12 @@ def main():
         elif gs.staleMate:
             gameOver = True
             drawText(screen, 'StaleMate')
+        elif gs.isThreefoldRepetition():
+            gameOver = True
+            drawText(screen, 'Draw by Repetition')
+        elif gs.isFiftyMoveDraw():
+            gameOver = True
+            drawText(screen, 'Draw by Fifty-Move Rule')
 
         if gameOver:
             draw_return_text(screen, "Press 'M' to return to main menu")
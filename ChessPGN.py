@@ -0,0 +1,405 @@
+# This module reads and writes games in Portable Game Notation. Games are read lazily from a memory-mapped file, or
+# line by line from any other file, and yielded one at a time, so a database of any size can be streamed through
+# without holding it in memory. Moves are written in standard algebraic notation (SAN).
+#   for game in read_games('games.pgn', trusted=True):
+#       print(game.headers.get('White'), game.result, game.game_state.to_fen())
+
+import mmap
+import re
+
+from ChessEngine import GameState, Move, START_FEN
+
+RESULTS = ('1-0', '0-1', '1/2-1/2', '*')
+# the seven tag roster, written first and in this order
+STANDARD_TAGS = ('Event', 'Site', 'Date', 'Round', 'White', 'Black', 'Result')
+
+HEADER_PATTERN = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+COMMENT_PATTERN = re.compile(r'\{[^}]*\}|;[^\n]*')
+VARIATION_PATTERN = re.compile(r'\([^()]*\)')
+MOVE_NUMBER_PATTERN = re.compile(r'\d+\.+|\$\d+')
+SAN_PATTERN = re.compile(r'^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?$')
+
+
+class PGNError(ValueError):
+    """
+    Raised when a PGN game or SAN move can't be read.
+    """
+
+
+class PGNGame:
+    """
+    A game read from a PGN file.
+
+    Attributes:
+        headers: Dict of the tag pairs, in file order.
+        sans: The moves in standard algebraic notation.
+        result: '1-0', '0-1', '1/2-1/2' or '*'.
+        game_state: The final position with every move in its moveLog, None if the game was not replayed. For a
+                    game with an error, the position reached before the move that failed.
+        error: Why the game could not be replayed, None if it was read without trouble.
+    """
+
+    __slots__ = ('headers', 'sans', 'result', 'game_state', 'error')
+
+    def __init__(self, headers, sans, result, game_state=None, error=None):
+        self.headers = headers
+        self.sans = sans
+        self.result = result
+        self.game_state = game_state
+        self.error = error
+
+    @property
+    def moves(self):
+        """
+        The moves of the game as Move objects, empty if the game was not replayed.
+        """
+        return self.game_state.moveLog if self.game_state is not None else []
+
+
+def iter_lines(source):
+    """
+    Read the lines of a PGN source one at a time.
+
+    Args:
+        source: A file path, read through a memory map, or an open text or binary file, read line by line.
+
+    Yields:
+        Each line as a string.
+    """
+    if not isinstance(source, str):
+        for line in source:
+            yield line.decode('utf-8', 'replace') if isinstance(line, bytes) else line
+        return
+    with open(source, 'rb') as file:
+        try:
+            mapped = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:  # an empty file can't be mapped
+            return
+        with mapped:
+            readline = mapped.readline
+            line = readline()
+            while line:
+                yield line.decode('utf-8', 'replace')
+                line = readline()
+
+
+def read_games(source, trusted=False, replay=True, state_class=GameState):
+    """
+    Read games from a PGN source lazily.
+
+    Args:
+        source: A file path or an open file, see iter_lines.
+        trusted: Skip checking that each move is legal where the move can be worked out without generating the
+                 legal moves. Only for files known to be correct, an illegal move then gives a wrong game.
+        replay: Play the moves out to build each game's final position. Without it only the headers, SAN moves and
+                result are read, which is much faster.
+        state_class: GameState or BitboardGameState, the class the games are replayed on.
+
+    Yields:
+        A PGNGame for each game in the source. A game with a bad move or FEN is still yielded, with its error set,
+        and reading carries on with the next game.
+    """
+    headers = {}
+    movetext = []
+    comment_depth = 0  # inside a {...} comment spanning lines, where a '[' does not start a tag
+    for line in iter_lines(source):
+        if line.startswith('%'):
+            continue  # escape lines are ignored
+        stripped = line.strip()
+        if comment_depth == 0 and stripped.startswith('['):
+            if movetext:
+                yield build_game(headers, movetext, trusted, replay, state_class)
+                headers = {}
+                movetext = []
+            match = HEADER_PATTERN.match(stripped)
+            if match:
+                headers[match.group(1)] = match.group(2).replace('\\"', '"').replace('\\\\', '\\')
+            continue
+        if stripped:
+            movetext.append(stripped)
+            comment_depth = max(comment_depth + stripped.count('{') - stripped.count('}'), 0)
+        elif movetext and comment_depth == 0 and ends_with_result(movetext[-1]):
+            yield build_game(headers, movetext, trusted, replay, state_class)
+            headers = {}
+            movetext = []
+    if movetext or headers:
+        yield build_game(headers, movetext, trusted, replay, state_class)
+
+
+def ends_with_result(line):
+    """
+    Returns:
+        True if the movetext line ends with a game result.
+    """
+    return line.endswith(RESULTS)
+
+
+def build_game(headers, movetext, trusted, replay, state_class):
+    """
+    Turn the tags and movetext lines of one game into a PGNGame.
+
+    Args:
+        headers: Dict of the game's tag pairs.
+        movetext: The game's movetext lines.
+        trusted: See read_games.
+        replay: See read_games.
+        state_class: See read_games.
+
+    Returns:
+        The PGNGame, with its error set if the game could not be replayed.
+    """
+    sans, result = parse_movetext('\n'.join(movetext))
+    if result is None:
+        result = headers.get('Result', '*')
+    game_state = None
+    if replay:
+        fen = headers.get('FEN') if headers.get('SetUp', '1') == '1' else None
+        try:
+            game_state = state_class.from_fen(fen) if fen else state_class()
+            for san in sans:
+                game_state.makeMove(parse_san(game_state, san, trusted))
+        except ValueError as error:  # a PGNError from a move, or a bad FEN tag
+            return PGNGame(headers, sans, result, game_state, str(error))
+    return PGNGame(headers, sans, result, game_state)
+
+
+def parse_movetext(text):
+    """
+    Split movetext into SAN moves, dropping comments, variations, move numbers and annotation glyphs.
+
+    Args:
+        text: The movetext of one game.
+
+    Returns:
+        (list of SAN moves, result token or None if the movetext has none).
+    """
+    text = COMMENT_PATTERN.sub(' ', text)
+    while '(' in text:
+        text, count = VARIATION_PATTERN.subn(' ', text)  # innermost variations first
+        if not count:
+            break
+    text = MOVE_NUMBER_PATTERN.sub(' ', text)
+    sans = []
+    result = None
+    for token in text.split():
+        if token in RESULTS:
+            result = token
+        else:
+            sans.append(token)
+    return sans, result
+
+
+def parse_san(game_state, san, trusted=False):
+    """
+    Find the move a SAN string stands for in the current position.
+
+    Args:
+        game_state: The position the move is played in.
+        san: The move in standard algebraic notation, check marks and annotations are ignored.
+        trusted: Take the move straight from the board when only one piece can make it, without generating the
+                 legal moves. Pinned pieces are not considered, so the move is not checked to be legal.
+
+    Returns:
+        The Move.
+
+    Raises:
+        PGNError: If no legal move, or more than one, matches.
+    """
+    text = san.rstrip('+#!?')
+    row = 7 if game_state.whiteToMove else 0
+    color = 'w' if game_state.whiteToMove else 'b'
+    if text in ('O-O', '0-0', 'O-O-O', '0-0-0'):
+        endCol = 6 if len(text) == 3 else 2
+        if trusted:
+            return Move((row, 4), (row, endCol), game_state.board, isCastleMove=True)
+        return find_legal_move(game_state, san, lambda move: move.isCastleMove and move.endCol == endCol)
+
+    match = SAN_PATTERN.match(text)
+    if not match:
+        raise PGNError('unreadable move: ' + san)
+    piece, fromFile, fromRank, target, promotion = match.groups()
+    piece = piece or 'P'
+    endRow, endCol = Move.ranksToRows[target[1]], Move.filesToCols[target[0]]
+    fromCol = Move.filesToCols[fromFile] if fromFile else None
+    fromRow = Move.ranksToRows[fromRank] if fromRank else None
+
+    if trusted:
+        move = trusted_move(game_state, color, piece, endRow, endCol, fromRow, fromCol, promotion)
+        if move is not None:
+            return move
+
+    def matches(move):
+        return (move.pieceMoved == color + piece and move.endRow == endRow and move.endCol == endCol and
+                (fromCol is None or move.startCol == fromCol) and (fromRow is None or move.startRow == fromRow) and
+                (not move.isPawnPromotion or move.promotionPiece == (promotion or 'Q')) and not move.isCastleMove)
+    return find_legal_move(game_state, san, matches)
+
+
+def trusted_move(game_state, color, piece, endRow, endCol, fromRow, fromCol, promotion):
+    """
+    Work a SAN move out from the board alone, for trusted files.
+
+    Returns:
+        The Move, or None if it is not clear which piece moves and the legal moves are needed.
+    """
+    board = game_state.board
+    if piece == 'P':
+        forward = -1 if color == 'w' else 1
+        if fromCol is not None and fromCol != endCol:  # capture, the pawn comes from the file given
+            startRow = endRow - forward
+            isEnpassantMove = board[endRow][endCol] == '--'
+        else:
+            startRow = endRow - forward
+            if board[startRow][endCol] != color + 'P':
+                startRow -= forward  # two square advance
+            fromCol = endCol
+            isEnpassantMove = False
+        return Move((startRow, fromCol), (endRow, endCol), board, isEnpassantMove=isEnpassantMove,
+                    promotionPiece=promotion or 'Q')
+    candidates = [square for square in game_state.attackersOf((endRow, endCol), color)
+                  if board[square[0]][square[1]] == color + piece and (fromRow is None or square[0] == fromRow) and
+                  (fromCol is None or square[1] == fromCol)]
+    if len(candidates) != 1:
+        return None  # one of them is pinned, so only the legal moves can tell
+    return Move(candidates[0], (endRow, endCol), board)
+
+
+def find_legal_move(game_state, san, matches):
+    """
+    Returns:
+        The one legal move for which matches(move) is true.
+
+    Raises:
+        PGNError: If there is no such move, or more than one.
+    """
+    found = [move for move in game_state.getValidMoves() if matches(move)]
+    if len(found) != 1:
+        raise PGNError(('illegal' if not found else 'ambiguous') + ' move ' + san + ' in ' + game_state.to_fen())
+    return found[0]
+
+
+def move_to_san(game_state, move, valid_moves=None):
+    """
+    Write a move in standard algebraic notation.
+
+    Args:
+        game_state: The position the move is played in, left as it was.
+        move: The move.
+        valid_moves: The legal moves of the position, generated if not given. Used to add the start file or rank
+                     when another piece of the same kind could also reach the square.
+
+    Returns:
+        The SAN string, with '+' for check and '#' for checkmate.
+    """
+    if move.isCastleMove:
+        san = 'O-O' if move.endCol > move.startCol else 'O-O-O'
+    else:
+        piece = move.pieceMoved[1]
+        target = move.getRankFile(move.endRow, move.endCol)
+        capture = move.pieceCaptured != '--'
+        if piece == 'P':
+            san = (Move.colsToFiles[move.startCol] + 'x' if capture else '') + target
+            if move.isPawnPromotion:
+                san += '=' + move.promotionPiece
+        else:
+            if valid_moves is None:
+                valid_moves = game_state.getValidMoves()
+            others = [other for other in valid_moves if other.pieceMoved == move.pieceMoved and
+                      other.endRow == move.endRow and other.endCol == move.endCol and
+                      (other.startRow, other.startCol) != (move.startRow, move.startCol)]
+            disambiguation = ''
+            if others:
+                if all(other.startCol != move.startCol for other in others):
+                    disambiguation = Move.colsToFiles[move.startCol]
+                elif all(other.startRow != move.startRow for other in others):
+                    disambiguation = Move.rowstoRanks[move.startRow]
+                else:
+                    disambiguation = move.getRankFile(move.startRow, move.startCol)
+            san = piece + disambiguation + ('x' if capture else '') + target
+    # generating the moves after the move sets the mate flags, which have to be put back for the position it is in
+    checkMate, staleMate = game_state.checkMate, game_state.staleMate
+    game_state.makeMove(move)
+    if game_state.inCheck():
+        san += '#' if not game_state.getValidMoves() else '+'
+    game_state.undoMove()
+    game_state.checkMate, game_state.staleMate = checkMate, staleMate
+    return san
+
+
+def game_result(game_state):
+    """
+    Returns:
+        The PGN result of the position: a win if the side to move is checkmated, a draw on stalemate, threefold
+        repetition or the fifty-move rule, otherwise '*'.
+    """
+    if not game_state.getValidMoves():
+        if game_state.inCheck():
+            return '0-1' if game_state.whiteToMove else '1-0'
+        return '1/2-1/2'
+    if game_state.isThreefoldRepetition() or game_state.isFiftyMoveDraw():
+        return '1/2-1/2'
+    return '*'
+
+
+def game_to_pgn(game_state, headers=None, result=None):
+    """
+    Write a game as PGN.
+
+    Args:
+        game_state: The game, its moveLog is written from the position it started at.
+        headers: Dict of tag pairs. The seven tag roster is always written, with '?' for missing tags.
+        result: The game result, worked out from the final position if not given.
+
+    Returns:
+        The game as a PGN string, ending with a blank line.
+    """
+    replay = type(game_state).from_fen(game_state.startFen)
+    sans = []
+    for move in game_state.moveLog:
+        sans.append(move_to_san(replay, move))
+        replay.makeMove(move)
+    if result is None:
+        result = headers.get('Result') if headers and headers.get('Result') in RESULTS else game_result(replay)
+
+    tags = dict(headers or {})
+    tags['Result'] = result
+    if game_state.startFen != START_FEN:
+        tags['SetUp'] = '1'
+        tags['FEN'] = game_state.startFen
+    lines = ['[{} "{}"]'.format(tag, tags.get(tag, '?').replace('\\', '\\\\').replace('"', '\\"'))
+             for tag in STANDARD_TAGS]
+    lines += ['[{} "{}"]'.format(tag, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+              for tag, value in tags.items() if tag not in STANDARD_TAGS]
+    lines.append('')
+
+    # movetext lines are kept under 80 characters
+    start = type(game_state).from_fen(game_state.startFen)
+    number = start.fullmoveNumber
+    whiteToMove = start.whiteToMove
+    tokens = []
+    for i, san in enumerate(sans):
+        if whiteToMove:
+            tokens.append(str(number) + '.')
+        elif i == 0:
+            tokens.append(str(number) + '...')
+        tokens.append(san)
+        if not whiteToMove:
+            number += 1
+        whiteToMove = not whiteToMove
+    tokens.append(result)
+    line = ''
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > 79:
+            lines.append(line)
+            line = token
+        else:
+            line = line + ' ' + token if line else token
+    lines.append(line)
+    return '\n'.join(lines) + '\n\n'
+
+
+def write_pgn(file, game_state, headers=None, result=None):
+    """
+    Append a game to an open text file as PGN, see game_to_pgn.
+    """
+    file.write(game_to_pgn(game_state, headers, result))
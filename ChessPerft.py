@@ -0,0 +1,185 @@
+# This module checks and times move generation. It counts the leaf nodes of the legal move tree (perft) for a set of
+# standard positions with known counts, and reports nodes per second, peak memory and the time spent in each phase
+# of the tree walk. Run it from the command line:
+#   python ChessPerft.py --depth 3 --backend bitboard --json
+
+import argparse
+import json
+import platform
+import sys
+import time
+import tracemalloc
+
+from ChessBitboard import BACKENDS, new_game_state
+
+# name, FEN and the known perft counts from depth 1 up, from the Chess Programming Wiki perft results page
+PERFT_POSITIONS = [
+    ('start', 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+     [20, 400, 8902, 197281, 4865609]),
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+     [48, 2039, 97862, 4085603]),
+    ('position3', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+     [14, 191, 2812, 43238, 674624]),
+    ('position4', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+     [6, 264, 9467, 422333]),
+    ('position5', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+     [44, 1486, 62379, 2103487]),
+    ('position6', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+     [46, 2079, 89890, 3894594]),
+]
+
+def timed_perft(game_state, depth, timings):
+    """
+    Count the leaf nodes like GameState.perft, adding the time spent generating, making and undoing moves to
+    timings.
+
+    Args:
+        game_state: The position to count from.
+        depth: Depth to count to.
+        timings: Dict with 'generate', 'make' and 'undo' totals in seconds, updated in place.
+
+    Returns:
+        The number of leaf nodes.
+    """
+    if depth == 0:
+        return 1
+    clock = time.perf_counter
+    start = clock()
+    codes = game_state.getValidMoveCodes()
+    timings['generate'] += clock() - start
+    if depth == 1:
+        return len(codes)
+    nodes = 0
+    for code in codes:
+        start = clock()
+        game_state.makeMoveCode(code)
+        timings['make'] += clock() - start
+        nodes += timed_perft(game_state, depth - 1, timings)
+        start = clock()
+        game_state.undoMove()
+        timings['undo'] += clock() - start
+    return nodes
+
+
+def run_position(name, fen, expected, depth, backend, trace_memory=False):
+    """
+    Run perft on one position and time it.
+
+    Args:
+        name: Name of the position.
+        fen: The position in FEN.
+        expected: Known counts from depth 1 up.
+        depth: Depth to count to.
+        backend: Game state backend, see ChessBitboard.new_game_state.
+        trace_memory: Measure the peak memory allocated during the run with tracemalloc. This slows the run down,
+                      so without it the peak resident size of the whole process is reported instead.
+
+    Returns:
+        Dict with the results for the position.
+    """
+    timings = {'setup': 0.0, 'generate': 0.0, 'make': 0.0, 'undo': 0.0}
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    game_state = new_game_state(backend, fen)
+    timings['setup'] = time.perf_counter() - start
+    start = time.perf_counter()
+    nodes = timed_perft(game_state, depth, timings)
+    seconds = time.perf_counter() - start
+    if trace_memory:
+        peak_kb = tracemalloc.get_traced_memory()[1] // 1024
+        tracemalloc.stop()
+    else:
+        peak_kb = peak_resident_kb()
+    known = expected[depth - 1] if depth <= len(expected) else None
+    return {
+        'name': name,
+        'fen': fen,
+        'depth': depth,
+        'nodes': nodes,
+        'expected': known,
+        'passed': known is None or nodes == known,
+        'seconds': round(seconds, 4),
+        'nps': round(nodes / seconds) if seconds else 0,
+        'phases': {phase: round(total, 4) for phase, total in timings.items()},
+        'peak_memory_kb': peak_kb,
+    }
+
+
+def peak_resident_kb():
+    """
+    Returns:
+        The peak resident memory of this process in kilobytes, None where the platform can't report it.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak // 1024 if sys.platform == 'darwin' else peak  # macOS reports bytes, Linux kilobytes
+
+
+def run_suite(depth=3, backend='bitboard', names=None, trace_memory=False):
+    """
+    Run perft over the standard positions.
+
+    Args:
+        depth: Depth to count to.
+        backend: Game state backend, see ChessBitboard.new_game_state.
+        names: Names of the positions to run, None for all of them.
+        trace_memory: Measure each position's peak memory with tracemalloc.
+
+    Returns:
+        Dict with the settings, the per-position results and the totals.
+    """
+    results = [run_position(name, fen, expected, depth, backend, trace_memory)
+               for name, fen, expected in PERFT_POSITIONS if names is None or name in names]
+    nodes = sum(result['nodes'] for result in results)
+    seconds = sum(result['seconds'] for result in results)
+    return {
+        'backend': backend,
+        'depth': depth,
+        'python': platform.python_version(),
+        'positions': results,
+        'nodes': nodes,
+        'seconds': round(seconds, 4),
+        'nps': round(nodes / seconds) if seconds else 0,
+        'passed': all(result['passed'] for result in results),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Check and time move generation with perft.')
+    parser.add_argument('--depth', type=int, default=3, help='depth to count to (default 3)')
+    parser.add_argument('--backend', choices=BACKENDS, default='bitboard', help='game state backend to run')
+    parser.add_argument('--position', action='append', dest='positions',
+                        choices=[name for name, _, _ in PERFT_POSITIONS], help='position to run, may be repeated')
+    parser.add_argument('--divide', action='store_true',
+                        help='print the count for each root move of the chosen positions instead')
+    parser.add_argument('--trace-memory', action='store_true', help='measure peak memory per position')
+    parser.add_argument('--json', action='store_true', help='print the results as JSON')
+    args = parser.parse_args(argv)
+
+    if args.divide:
+        for name, fen, _ in PERFT_POSITIONS:
+            if args.positions is None or name in args.positions:
+                counts = new_game_state(args.backend, fen).divide(args.depth)
+                print(name)
+                for move, count in sorted(counts.items()):
+                    print('  ' + move + ': ' + str(count))
+                print('  total: ' + str(sum(counts.values())))
+        return 0
+
+    report = run_suite(args.depth, args.backend, args.positions, args.trace_memory)
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for result in report['positions']:
+            print('{name:<10} depth {depth} nodes {nodes:>9} {status:<8} {seconds:>8.3f}s {nps:>8} nps'.format(
+                status='ok' if result['passed'] else 'MISMATCH', **result))
+        print('total      nodes {nodes:>9} {seconds:>8.3f}s {nps:>8} nps'.format(**report))
+    return 0 if report['passed'] else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,713 @@
+# This module generates and probes endgame tablebases: for every position with a given set of pieces it stores
+# whether the side to move wins, draws or loses and how many half moves the mate takes with best play, so simple
+# endings are played perfectly without searching. Tables are generated by retrograde analysis, working backwards
+# from the mates, and each is stored as one byte per position, using the board's symmetries to store each position
+# once. Tables are memory mapped when first probed. Castling and en passant are left out, so positions with either
+# possible are not probed. Three-piece tables take seconds to generate, four-piece tables ten minutes or more each:
+#   python ChessTablebase.py generate --pieces 3 --directory tablebases
+#   python ChessTablebase.py generate KQvKR KRvKP
+#   python ChessTablebase.py probe tablebases "8/8/8/4k3/8/8/8/R3K3 w - - 0 1"
+
+import argparse
+import itertools
+import mmap
+import os
+import sys
+import time
+
+PIECE_ORDER = 'KQRBNP'  # order of the pieces of one side in a table's name and index
+PIECE_RANKS = {(color, piece): i for i, (color, piece) in enumerate(itertools.product('wb', PIECE_ORDER))}
+WIN_SCORE = 5000  # search score of a tablebase win, less the half moves to mate so quicker mates score higher
+
+# squares are numbered row * 8 + col, with row 0 the eighth rank as on GameState.board
+ROOK_DIRECTIONS = ((-1, 0), (1, 0), (0, -1), (0, 1))
+BISHOP_DIRECTIONS = ((-1, -1), (-1, 1), (1, -1), (1, 1))
+KNIGHT_STEPS = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+
+
+def on_board(row, col):
+    return 0 <= row < 8 and 0 <= col < 8
+
+
+def rays(square, directions):
+    row, col = divmod(square, 8)
+    result = []
+    for dr, dc in directions:
+        ray = []
+        r, c = row + dr, col + dc
+        while on_board(r, c):
+            ray.append(r * 8 + c)
+            r, c = r + dr, c + dc
+        result.append(tuple(ray))
+    return tuple(result)
+
+
+def steps(square, offsets):
+    row, col = divmod(square, 8)
+    return tuple((row + dr) * 8 + col + dc for dr, dc in offsets if on_board(row + dr, col + dc))
+
+
+KING_TARGETS = [steps(sq, ROOK_DIRECTIONS + BISHOP_DIRECTIONS) for sq in range(64)]
+KNIGHT_TARGETS = [steps(sq, KNIGHT_STEPS) for sq in range(64)]
+SLIDER_RAYS = {'R': [rays(sq, ROOK_DIRECTIONS) for sq in range(64)],
+               'B': [rays(sq, BISHOP_DIRECTIONS) for sq in range(64)],
+               'Q': [rays(sq, ROOK_DIRECTIONS + BISHOP_DIRECTIONS) for sq in range(64)]}
+# squares attacked by a pawn, by colour: white pawns move towards row 0
+PAWN_ATTACKS = {'w': [steps(sq, ((-1, -1), (-1, 1))) for sq in range(64)],
+                'b': [steps(sq, ((1, -1), (1, 1))) for sq in range(64)]}
+
+
+def line_between(a, b):
+    """
+    Returns:
+        The squares strictly between a and b and whether the line is straight ('R') or diagonal ('B'), or None if
+        the squares don't share a line.
+    """
+    (ra, ca), (rb, cb) = divmod(a, 8), divmod(b, 8)
+    dr, dc = rb - ra, cb - ca
+    if a == b or not (dr == 0 or dc == 0 or abs(dr) == abs(dc)):
+        return None
+    step_r, step_c = (dr > 0) - (dr < 0), (dc > 0) - (dc < 0)
+    between = tuple((ra + step_r * i) * 8 + ca + step_c * i for i in range(1, max(abs(dr), abs(dc))))
+    return between, 'R' if dr == 0 or dc == 0 else 'B'
+
+
+LINES = [[line_between(a, b) for b in range(64)] for a in range(64)]
+
+# The eight symmetries of the board, as square maps. A table without pawns stores only positions with the white
+# king in the a1-d1-d4 triangle, a table with pawns (which can't be turned) only those with it on files a to d
+SYMMETRIES = []
+for transpose, flip_rows, flip_cols in itertools.product((False, True), repeat=3):
+    mapping = []
+    for sq in range(64):
+        r, c = divmod(sq, 8)
+        if transpose:
+            r, c = c, r
+        if flip_rows:
+            r = 7 - r
+        if flip_cols:
+            c = 7 - c
+        mapping.append(r * 8 + c)
+    SYMMETRIES.append(tuple(mapping))
+TRIANGLE = (56, 57, 58, 59, 49, 50, 51, 42, 43, 35)  # a1 b1 c1 d1 b2 c2 d2 c3 d3 d4
+QUEENSIDE = tuple(row * 8 + col for row in range(8) for col in range(4))
+# for each white king square, the symmetries that take it into the stored region
+PAWNLESS_SYMMETRIES = [[mapping for mapping in SYMMETRIES if mapping[sq] in TRIANGLE] for sq in range(64)]
+PAWN_SYMMETRIES = [[SYMMETRIES[0] if sq % 8 < 4 else SYMMETRIES[1]] for sq in range(64)]
+PAWNLESS_KING_SLOTS = {sq: slot for slot, sq in enumerate(TRIANGLE)}
+PAWN_KING_SLOTS = {sq: slot for slot, sq in enumerate(QUEENSIDE)}
+
+
+def side_name(types):
+    """
+    Returns:
+        The name of one side's pieces in a table name, e.g. 'KRP'.
+    """
+    return ''.join(sorted(types, key=PIECE_ORDER.index))
+
+
+def strength(name):
+    return -len(name), [PIECE_ORDER.index(piece) for piece in name]
+
+
+def canonical_name(white, black):
+    """
+    Returns:
+        The table name for the given sides, with the stronger side as white, and whether the colours were swapped.
+    """
+    white, black = side_name(white), side_name(black)
+    if strength(white) <= strength(black):
+        return white + 'v' + black, False
+    return black + 'v' + white, True
+
+
+def is_trivial_draw(white, black):
+    """
+    Returns:
+        True if neither side can mate: bare kings, or a single knight or bishop against a bare king.
+    """
+    pieces = [piece for piece in white + black if piece != 'K']
+    return not pieces or (len(pieces) == 1 and pieces[0] in 'BN')
+
+
+def decode(value):
+    """
+    Turn a stored byte into a result.
+
+    Returns:
+        (1 for a win, 0 for a draw or -1 for a loss for the side to move, half moves to mate or None for a draw).
+    """
+    if value == 0:
+        return 0, None
+    plies = value - 1
+    return (1 if plies % 2 else -1), plies
+
+
+def score(result):
+    """
+    Returns:
+        The search score for a probe result, from the side to move's point of view.
+    """
+    wdl, plies = result
+    return 0 if wdl == 0 else wdl * (WIN_SCORE - plies)
+
+
+class TableLayout:
+    """
+    How the positions of one table are numbered. Pieces are listed white king first, then white's other pieces in
+    PIECE_ORDER, then black's king and other pieces. The index is the side to move, then the white king's slot in
+    the stored region, then the square of each other piece.
+    """
+
+    def __init__(self, name):
+        white, black = name.split('v')
+        self.name = name
+        self.colors = ['w'] * len(white) + ['b'] * len(black)
+        self.types = list(white) + list(black)
+        self.pieces = len(self.types)
+        self.has_pawns = 'P' in name
+        self.symmetries = PAWN_SYMMETRIES if self.has_pawns else PAWNLESS_SYMMETRIES
+        self.king_slots = PAWN_KING_SLOTS if self.has_pawns else PAWNLESS_KING_SLOTS
+        self.side_size = len(self.king_slots) * 64 ** (self.pieces - 1)
+        self.size = 2 * self.side_size
+
+    def canonical(self, squares):
+        """
+        Returns:
+            The squares of the position's stored form. Where two symmetries put the white king in the stored
+            region, the one giving the smaller list of squares is used, so each position is stored once.
+        """
+        candidates = self.symmetries[squares[0]]
+        if len(candidates) == 1:
+            mapping = candidates[0]
+            return [mapping[sq] for sq in squares]
+        return min([mapping[sq] for sq in squares] for mapping in candidates)
+
+    def index(self, squares, black_to_move):
+        """
+        Returns:
+            The index of the position with the pieces on squares, in the table's piece order.
+        """
+        candidates = self.symmetries[squares[0]]
+        if len(candidates) == 1:
+            mapping = candidates[0]
+            index = self.king_slots[mapping[squares[0]]]
+            for sq in squares[1:]:
+                index = index * 64 + mapping[sq]
+        else:
+            squares = self.canonical(squares)
+            index = self.king_slots[squares[0]]
+            for sq in squares[1:]:
+                index = index * 64 + sq
+        return index + self.side_size if black_to_move else index
+
+
+class Tablebase:
+    """
+    A directory of tablebase files, each memory mapped the first time it is probed.
+    """
+
+    def __init__(self, directory):
+        """
+        Args:
+            directory: Directory holding the '<name>.tbl' files.
+        """
+        self.directory = directory
+        self.tables = {}  # name -> mapped table, None if there is no file
+        self.layouts = {}
+        self.max_pieces = 0
+        if os.path.isdir(directory):
+            for file_name in os.listdir(directory):
+                if file_name.endswith('.tbl'):
+                    self.max_pieces = max(self.max_pieces, len(file_name) - len('v.tbl'))
+
+    def table(self, name):
+        """
+        Returns:
+            The named table, None if it hasn't been generated.
+        """
+        if name not in self.tables:
+            self.tables[name] = None
+            try:
+                with open(os.path.join(self.directory, name + '.tbl'), 'rb') as file:
+                    self.tables[name] = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                pass
+        return self.tables[name]
+
+    def layout(self, name):
+        if name not in self.layouts:
+            self.layouts[name] = TableLayout(name)
+        return self.layouts[name]
+
+    def lookup(self, pieces, white_to_move):
+        """
+        Look a position up.
+
+        Args:
+            pieces: List of (colour, piece type, square) for every piece on the board.
+            white_to_move: Whether white is to move.
+
+        Returns:
+            The stored byte for the position, see decode, None if its table hasn't been generated.
+        """
+        white = [piece for color, piece, _ in pieces if color == 'w']
+        black = [piece for color, piece, _ in pieces if color == 'b']
+        if is_trivial_draw(white, black):
+            return 0
+        name, swapped = canonical_name(white, black)
+        table = self.table(name)
+        if table is None:
+            return None
+        # with the colours swapped the board is turned round too, so the pawns still move the right way
+        if swapped:
+            pieces = [('w' if color == 'b' else 'b', piece, sq ^ 56) for color, piece, sq in pieces]
+            white_to_move = not white_to_move
+        squares = [sq for color, piece, sq in sorted(pieces, key=lambda p: PIECE_RANKS[p[0], p[1]])]
+        return table[self.layout(name).index(squares, not white_to_move)]
+
+    def probe(self, game_state):
+        """
+        Look the current position up.
+
+        Args:
+            game_state: The position.
+
+        Returns:
+            The result (1 win, 0 draw or -1 loss for the side to move, half moves to mate or None), None if the
+            position isn't covered: too many pieces, no table, or castling or en passant possible.
+        """
+        if game_state.pieceCount > self.max_pieces:
+            return None
+        rights = game_state.currentCastlingRights
+        if rights.wks or rights.wqs or rights.bks or rights.bqs:
+            return None
+        if game_state.enpassantPossible:
+            # the square is set after every double pawn push, it only matters if a pawn can take en passant
+            row, col = game_state.enpassantPossible
+            pawn = 'wP' if game_state.whiteToMove else 'bP'
+            pawn_row = row + 1 if game_state.whiteToMove else row - 1
+            if any(0 <= c < 8 and game_state.board[pawn_row][c] == pawn for c in (col - 1, col + 1)):
+                return None
+        pieces = [(square[0], square[1], r * 8 + c) for r, row in enumerate(game_state.board)
+                  for c, square in enumerate(row) if square != '--']
+        value = self.lookup(pieces, game_state.whiteToMove)
+        return decode(value) if value is not None else None
+
+    def best_move(self, game_state, valid_moves):
+        """
+        Pick the move with the best result, winning as quickly as possible or losing as slowly as possible.
+
+        Args:
+            game_state: The position.
+            valid_moves: List of valid moves for the side to move.
+
+        Returns:
+            (move, result of the position, see probe), None if the position or a move's result isn't covered.
+        """
+        if self.probe(game_state) is None:
+            return None
+        best = None
+        for move in valid_moves:
+            game_state.makeMove(move)
+            result = self.probe(game_state)
+            game_state.undoMove()
+            if result is None:
+                return None
+            wdl, plies = result
+            # from the mover's side: a win ranks above a draw above a loss, then the quickest win or slowest loss
+            rank = (1, -plies) if wdl < 0 else (0, 0) if wdl == 0 else (-1, plies)
+            if best is None or rank > best[0]:
+                best = (rank, move, (-wdl, plies + 1 if plies is not None else None))
+        return (best[1], best[2]) if best is not None else None
+
+
+class TablebaseGenerator:
+    """
+    Generates tables by retrograde analysis. The positions where the side to move is mated are found first. Then,
+    one half move further from the mate at a time, every position that can move into a lost position is won, and
+    a position whose moves all lead to won positions is lost. Whatever is left when nothing changes is a draw.
+    Captures and promotions leave the table, and their results are looked up in the smaller tables, which are
+    generated first.
+    """
+
+    def __init__(self, directory, log=None):
+        """
+        Args:
+            directory: Directory the tables are read from and written to.
+            log: Function called with a progress message, None for none.
+        """
+        self.tablebase = Tablebase(directory)
+        self.log = log or (lambda message: None)
+
+    def generate(self, name):
+        """
+        Generate a table and the tables it depends on, skipping any already on disk.
+
+        Args:
+            name: The table's name, e.g. 'KRvK'.
+        """
+        white, black = name.split('v')
+        name, _ = canonical_name(white, black)
+        if is_trivial_draw(white, black) or self.tablebase.table(name) is not None:
+            return
+        for dependency in self.dependencies(name):
+            self.generate(dependency)
+        start = time.perf_counter()
+        table = self.solve(name)
+        os.makedirs(self.tablebase.directory, exist_ok=True)
+        path = os.path.join(self.tablebase.directory, name + '.tbl')
+        with open(path + '.tmp', 'wb') as file:
+            file.write(table)
+        os.replace(path + '.tmp', path)
+        self.tablebase.tables[name] = table
+        self.tablebase.max_pieces = max(self.tablebase.max_pieces, len(name) - 1)
+        self.log('{}: {} positions in {:.1f}s'.format(name, len(table), time.perf_counter() - start))
+
+    def dependencies(self, name):
+        """
+        Returns:
+            The tables that captures and promotions lead to from the named table.
+        """
+        white, black = name.split('v')
+        result = set()
+        for side, other, swap in ((white, black, False), (black, white, True)):
+            for i, piece in enumerate(side):
+                if piece == 'K':
+                    continue
+                rest = side[:i] + side[i + 1:]
+                names = [rest] + ([rest + promoted for promoted in 'QRBN'] if piece == 'P' else [])
+                for changed in names:
+                    if changed != rest:
+                        # a promotion: the pawn becomes another piece
+                        pair = (other, changed) if swap else (changed, other)
+                    else:
+                        # a capture by the other side
+                        pair = (other, rest) if swap else (rest, other)
+                    if not is_trivial_draw(*pair):
+                        result.add(canonical_name(*pair)[0])
+        result.discard(name)
+        return result
+
+    def solve(self, name):
+        """
+        Work out every position of a table.
+
+        Returns:
+            The table as a bytearray.
+        """
+        layout = self.tablebase.layout(name)
+        self.layout = layout
+        values = bytearray(layout.size)
+        legal = bytearray(layout.size)
+        self.values = values
+        self.legal = legal
+        # from captures and promotions: half moves -> positions won by moving out of the table, and half moves ->
+        # positions to check for a loss once the won positions that far from mate are known
+        exit_wins = {}
+        exit_checks = {}
+        current = []  # positions found at the half move count being worked on
+
+        # first pass: find the legal positions, the mates and the results of moves that leave the table
+        index = 0
+        king_squares = sorted(layout.king_slots, key=layout.king_slots.get)
+        for black_to_move in (False, True):
+            for king in king_squares:
+                symmetric = len(layout.symmetries[king]) > 1  # a king on the diagonal, see TableLayout.canonical
+                for others in itertools.product(range(64), repeat=layout.pieces - 1):
+                    squares = [king]
+                    squares.extend(others)
+                    position = index
+                    index += 1
+                    if symmetric and layout.canonical(squares) != squares:
+                        continue
+                    if not self.is_legal(squares, black_to_move):
+                        continue
+                    legal[position] = 1
+                    moves = 0
+                    for child, exit_value in self.moves(squares, black_to_move, indexed=False):
+                        moves += 1
+                        if exit_value is None or exit_value == 0:
+                            continue
+                        wdl, plies = decode(exit_value)
+                        if wdl < 0:
+                            exit_wins.setdefault(plies + 1, []).append(position)
+                        else:
+                            exit_checks.setdefault(plies, []).append(position)
+                    if moves == 0 and self.in_check(squares, black_to_move):
+                        values[position] = 1  # mated, no half moves to go
+                        current.append(position)
+
+        plies = 0
+        while current or exit_wins or exit_checks:
+            found = []
+            if plies % 2 == 0:
+                # lost positions: every position that can move into one is won a half move further out
+                for position in current:
+                    for predecessor in self.predecessors(position):
+                        if values[predecessor] == 0:
+                            values[predecessor] = plies + 2
+                            found.append(predecessor)
+                for position in exit_wins.pop(plies + 1, ()):
+                    if values[position] == 0:
+                        values[position] = plies + 2
+                        found.append(position)
+            else:
+                # won positions: a position that can move into one may now have only losing moves
+                candidates = set()
+                for position in current:
+                    candidates.update(self.predecessors(position))
+                candidates.update(exit_checks.pop(plies, ()))
+                for position in candidates:
+                    if values[position] == 0:
+                        lost = self.lost_in(position)
+                        if lost is not None:
+                            values[position] = lost + 1
+                            found.append(position)
+            current = found
+            plies += 1
+        return values
+
+    def decode_index(self, index):
+        layout = self.layout
+        black_to_move = index >= layout.side_size
+        index %= layout.side_size
+        squares = []
+        for _ in range(layout.pieces - 1):
+            index, sq = divmod(index, 64)
+            squares.append(sq)
+        squares.append(sorted(layout.king_slots, key=layout.king_slots.get)[index])
+        squares.reverse()
+        return squares, black_to_move
+
+    def attacked(self, target, squares, color, skip=None):
+        """
+        Returns:
+            True if a piece of the given colour attacks target, leaving out the piece at index skip.
+        """
+        layout = self.layout
+        for i, sq in enumerate(squares):
+            if i == skip or layout.colors[i] != color:
+                continue
+            piece = layout.types[i]
+            if piece == 'K':
+                if target in KING_TARGETS[sq]:
+                    return True
+            elif piece == 'N':
+                if target in KNIGHT_TARGETS[sq]:
+                    return True
+            elif piece == 'P':
+                if target in PAWN_ATTACKS[color][sq]:
+                    return True
+            else:
+                line = LINES[sq][target]
+                if line is not None and (piece == 'Q' or piece == line[1]):
+                    between = line[0]
+                    if not any(other in between for j, other in enumerate(squares) if j != skip):
+                        return True
+        return False
+
+    def king_index(self, color):
+        return 0 if color == 'w' else self.layout.colors.index('b')
+
+    def in_check(self, squares, black_to_move):
+        mover = 'b' if black_to_move else 'w'
+        return self.attacked(squares[self.king_index(mover)], squares, 'w' if black_to_move else 'b')
+
+    def is_legal(self, squares, black_to_move):
+        """
+        Returns:
+            True if the position can come up: no two pieces on a square, no pawn on the first or last rank and the
+            side that just moved not in check.
+        """
+        if len(set(squares)) != len(squares):
+            return False
+        layout = self.layout
+        for i, sq in enumerate(squares):
+            if layout.types[i] == 'P' and not 8 <= sq < 56:
+                return False
+        waiting = 'w' if black_to_move else 'b'
+        return not self.attacked(squares[self.king_index(waiting)], squares, 'b' if black_to_move else 'w')
+
+    def moves(self, squares, black_to_move, indexed=True):
+        """
+        Generate the legal moves of a position.
+
+        Args:
+            squares: The squares of the pieces, in the table's order.
+            black_to_move: Whether black is to move.
+            indexed: Work out the index of the position each move stays in the table for. Without it the index is
+                     given as -1, which is quicker when only the moves that leave the table matter.
+
+        Yields:
+            (index of the position reached, None) for a move that stays in the table, or (None, stored byte of the
+            position reached) for a capture or promotion.
+        """
+        layout = self.layout
+        mover = 'b' if black_to_move else 'w'
+        opponent = 'w' if black_to_move else 'b'
+        occupant = {sq: i for i, sq in enumerate(squares)}
+        king = self.king_index(mover)
+        for i, sq in enumerate(squares):
+            if layout.colors[i] != mover:
+                continue
+            piece = layout.types[i]
+            for target, promotions in self.piece_targets(piece, mover, sq, occupant):
+                captured = occupant.get(target)
+                if captured is not None and layout.colors[captured] == mover:
+                    continue
+                after = list(squares)
+                after[i] = target
+                # the mover's king can't be left attacked, by any piece but the one just captured
+                if self.attacked(after[king], after, opponent, skip=captured):
+                    continue
+                if captured is None and promotions is None:
+                    yield (layout.index(after, not black_to_move) if indexed else -1), None
+                    continue
+                for promoted in promotions or (piece,):
+                    pieces = [(layout.colors[j], promoted if j == i else layout.types[j], after[j])
+                              for j in range(len(after)) if j != captured]
+                    yield None, self.tablebase.lookup(pieces, black_to_move)
+
+    def piece_targets(self, piece, color, sq, occupant):
+        """
+        Yields:
+            (target square, promotion pieces or None) for each square the piece can move to, ignoring what is on
+            it, except that pawns only capture diagonally and only push to empty squares.
+        """
+        if piece == 'K':
+            for target in KING_TARGETS[sq]:
+                yield target, None
+        elif piece == 'N':
+            for target in KNIGHT_TARGETS[sq]:
+                yield target, None
+        elif piece == 'P':
+            step = -8 if color == 'w' else 8
+            last_row = 0 if color == 'w' else 7
+            start_row = 6 if color == 'w' else 1
+            promotions = 'QRBN'
+            one = sq + step
+            if one not in occupant:
+                yield one, promotions if one // 8 == last_row else None
+                if sq // 8 == start_row and one + step not in occupant:
+                    yield one + step, None
+            for target in PAWN_ATTACKS[color][sq]:
+                captured = occupant.get(target)
+                if captured is not None and self.layout.colors[captured] != color:
+                    yield target, promotions if target // 8 == last_row else None
+        else:
+            for ray in SLIDER_RAYS[piece][sq]:
+                for target in ray:
+                    yield target, None
+                    if target in occupant:
+                        break
+
+    def predecessors(self, position):
+        """
+        Yields:
+            The index of every position that reaches this one with a move that stays in the table.
+        """
+        layout = self.layout
+        squares, black_to_move = self.decode_index(position)
+        mover = 'w' if black_to_move else 'b'  # the side that just moved
+        occupant = set(squares)
+        for i, sq in enumerate(squares):
+            if layout.colors[i] != mover:
+                continue
+            piece = layout.types[i]
+            if piece == 'P':
+                step = 8 if mover == 'w' else -8  # back the way the pawn came
+                origins = []
+                one = sq + step
+                if 8 <= one < 56 and one not in occupant:
+                    origins.append(one)
+                    start_row = 6 if mover == 'w' else 1
+                    if (one + step) // 8 == start_row and one + step not in occupant:
+                        origins.append(one + step)
+            elif piece in 'KN':
+                origins = [origin for origin in (KING_TARGETS if piece == 'K' else KNIGHT_TARGETS)[sq]
+                           if origin not in occupant]
+            else:
+                origins = []
+                for ray in SLIDER_RAYS[piece][sq]:
+                    for origin in ray:
+                        if origin in occupant:
+                            break
+                        origins.append(origin)
+            for origin in origins:
+                before = list(squares)
+                before[i] = origin
+                predecessor = layout.index(before, not black_to_move)
+                if self.legal[predecessor]:
+                    yield predecessor
+
+    def lost_in(self, position):
+        """
+        Returns:
+            The half moves to mate if every move of the position leads to a won position for the opponent, None if
+            a move draws, wins or isn't worked out yet.
+        """
+        squares, black_to_move = self.decode_index(position)
+        longest = None
+        for child, exit_value in self.moves(squares, black_to_move):
+            value = self.values[child] if child is not None else exit_value
+            if not value:
+                return None
+            wdl, plies = decode(value)
+            if wdl < 0:
+                return None
+            longest = plies if longest is None else max(longest, plies)
+        return longest + 1 if longest is not None else None
+
+
+def all_names(pieces):
+    """
+    Returns:
+        The names of every table with up to the given number of pieces that isn't a trivial draw.
+    """
+    names = set()
+    for count in range(3, pieces + 1):
+        for white_count in range(1, count):
+            for white in itertools.combinations_with_replacement(PIECE_ORDER[1:], white_count - 1):
+                for black in itertools.combinations_with_replacement(PIECE_ORDER[1:], count - white_count - 1):
+                    if not is_trivial_draw(white, black):
+                        names.add(canonical_name('K' + ''.join(white), 'K' + ''.join(black))[0])
+    return sorted(names, key=lambda name: (len(name), name))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate or probe endgame tablebases.')
+    commands = parser.add_subparsers(dest='command', required=True)
+    generate = commands.add_parser('generate', help='generate tables')
+    generate.add_argument('names', nargs='*', help='tables to generate, e.g. KRvK')
+    generate.add_argument('--pieces', type=int, choices=[3, 4], help='generate every table with up to this many pieces')
+    generate.add_argument('--directory', default='tablebases', help='directory of the tables (default tablebases)')
+    probe = commands.add_parser('probe', help='look a position up')
+    probe.add_argument('directory', help='directory of the tables')
+    probe.add_argument('fen', help='the position in FEN')
+    args = parser.parse_args(argv)
+
+    if args.command == 'generate':
+        names = list(args.names) + (all_names(args.pieces) if args.pieces else [])
+        if not names:
+            parser.error('give table names or --pieces')
+        generator = TablebaseGenerator(args.directory, log=print)
+        for name in names:
+            generator.generate(name)
+        return 0
+
+    from ChessEngine import GameState
+    game_state = GameState.from_fen(args.fen)
+    tablebase = Tablebase(args.directory)
+    found = tablebase.best_move(game_state, game_state.getValidMoves())
+    if found is None:
+        print('not in the tablebase')
+        return 1
+    move, (wdl, plies) = found
+    print(('win', 'draw', 'loss')[1 - wdl] + (' in {} half moves'.format(plies) if wdl else ''))
+    print('best move ' + move.getChessNotation())
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,457 @@
+# This module plays two AI configurations against each other to measure the strength difference between them, e.g.
+# a new search feature against the current version. Games are played in pairs from the same opening with colours
+# swapped, many at once across a pool of worker processes. Openings come from a bundled book (or a PGN file), games
+# are adjudicated once the result is clear, every game is written as PGN, and the Elo difference is reported. An
+# SPRT (sequential probability ratio test) can stop the match as soon as the result is statistically clear:
+#   python ChessTournament.py --engine depth=3 --engine depth=2 --games 200 --workers 8 --pgn games.pgn
+#   python ChessTournament.py --engine node_limit=4000 --engine node_limit=4000,mobility_weight=0 --sprt 0 20
+
+import argparse
+import ast
+import math
+import random
+import sys
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import ChessPGN
+from ChessAI import ChessAI
+from ChessBitboard import BACKENDS, new_game_state
+
+# Short, balanced openings in SAN, played out before the engines take over
+OPENINGS = [
+    'e4 e5 Nf3 Nc6 Bb5 a6',  # Ruy Lopez
+    'e4 e5 Nf3 Nc6 Bc4 Bc5',  # Italian Game
+    'e4 e5 Nf3 Nc6 d4 exd4',  # Scotch Game
+    'e4 e5 Nf3 Nf6 Nxe5 d6',  # Petrov Defence
+    'e4 e5 Nc3 Nf6 f4 d5',  # Vienna Gambit
+    'e4 c5 Nf3 d6 d4 cxd4 Nxd4 Nf6',  # Sicilian Defence
+    'e4 c5 Nf3 Nc6 d4 cxd4 Nxd4 g6',  # Accelerated Dragon
+    'e4 c5 c3 Nf6 e5 Nd5',  # Alapin Sicilian
+    'e4 e6 d4 d5 Nc3 Bb4',  # French Winawer
+    'e4 e6 d4 d5 e5 c5',  # French Advance
+    'e4 c6 d4 d5 Nc3 dxe4 Nxe4 Bf5',  # Caro-Kann
+    'e4 d6 d4 Nf6 Nc3 g6',  # Pirc Defence
+    'e4 d5 exd5 Qxd5 Nc3 Qa5',  # Scandinavian Defence
+    'e4 Nf6 e5 Nd5 d4 d6',  # Alekhine Defence
+    'd4 d5 c4 e6 Nc3 Nf6',  # Queen's Gambit Declined
+    'd4 d5 c4 dxc4 Nf3 Nf6',  # Queen's Gambit Accepted
+    'd4 d5 c4 c6 Nf3 Nf6',  # Slav Defence
+    'd4 Nf6 c4 g6 Nc3 Bg7 e4 d6',  # King's Indian Defence
+    'd4 Nf6 c4 e6 Nc3 Bb4',  # Nimzo-Indian Defence
+    'd4 Nf6 c4 e6 Nf3 b6',  # Queen's Indian Defence
+    'd4 Nf6 c4 g6 Nc3 d5',  # Grunfeld Defence
+    'd4 Nf6 c4 c5 d5 b5',  # Benko Gambit
+    'd4 f5 g3 Nf6 Bg2 g6',  # Dutch Defence
+    'd4 d5 Bf4 Nf6 e3 c5',  # London System
+    'c4 e5 Nc3 Nf6 g3 d5',  # English, reversed Sicilian
+    'c4 c5 Nf3 Nc6 Nc3 g6',  # Symmetrical English
+    'Nf3 d5 g3 Nf6 Bg2 c6',  # Reti Opening
+    'Nf3 Nf6 c4 b6 g3 Bb7',  # Reti, Queen's Indian set up
+    'f4 d5 Nf3 g6 e3 Bg7',  # Bird's Opening
+    'b3 e5 Bb2 Nc6 e3 d5',  # Nimzo-Larsen Attack
+]
+
+ADJUDICATION = dict(
+    max_plies=300,  # the game is a draw if it gets this long
+    resign_score=60,  # a side resigns when both engines agree it is this far behind (a pawn is 10)...
+    resign_moves=3,  # ...for this many moves each
+    draw_score=2,  # the game is a draw when both engines see it within this of level...
+    draw_moves=8,  # ...for this many moves each...
+    draw_after=40,  # ...from this move on
+)
+
+# State of a tournament worker process, set up by init_worker
+worker_engines = None
+worker_adjudication = None
+worker_backend = 'legal'
+
+
+def parse_engine(text):
+    """
+    Read an engine configuration from the command line.
+
+    Args:
+        text: Comma separated ChessAI keyword arguments, e.g. 'depth=3,mobility_weight=0'.
+
+    Returns:
+        Dict of keyword arguments for ChessAI.
+
+    Raises:
+        argparse.ArgumentTypeError: If a setting isn't of the form name=value.
+    """
+    settings = {}
+    for item in text.split(','):
+        if not item.strip():
+            continue
+        name, separator, value = item.partition('=')
+        if not separator:
+            raise argparse.ArgumentTypeError('engine settings are name=value, not ' + repr(item))
+        try:
+            settings[name.strip()] = ast.literal_eval(value.strip())
+        except (ValueError, SyntaxError):
+            settings[name.strip()] = value.strip()  # a bare word, e.g. mobility_pieces=NBRQ
+    return settings
+
+
+def engine_name(settings):
+    """
+    Returns:
+        A name for an engine configuration, for the PGN and the report.
+    """
+    return ','.join('{}={}'.format(name, value) for name, value in sorted(settings.items())) or 'default'
+
+
+def load_book(path, plies):
+    """
+    Read openings from a PGN file, taking the first moves of each game.
+
+    Args:
+        path: The PGN file.
+        plies: Number of half moves to take from each game.
+
+    Returns:
+        List of openings as space separated SAN moves.
+    """
+    openings = []
+    for game in ChessPGN.read_games(path, replay=False):
+        if game.headers.get('SetUp', '0') != '1' and len(game.sans) >= plies:
+            openings.append(' '.join(game.sans[:plies]))
+    return openings
+
+
+def init_worker(engines, adjudication, backend='legal'):
+    """
+    Set up a tournament worker process.
+
+    Args:
+        engines: The two engines' ChessAI keyword arguments.
+        adjudication: Adjudication settings, see ADJUDICATION.
+        backend: Game state backend the games are played on, see ChessBitboard.new_game_state.
+    """
+    global worker_engines, worker_adjudication, worker_backend
+    worker_engines = engines
+    worker_adjudication = adjudication
+    worker_backend = backend
+
+
+def insufficient_material(game_state):
+    """
+    Returns:
+        True if neither side has enough material left to mate: bare kings, or a single knight or bishop.
+    """
+    pieces = [square[1] for row in game_state.board for square in row if square != '--' and square[1] != 'K']
+    return not pieces or (len(pieces) == 1 and pieces[0] in 'NB')
+
+
+def draw_reason(game_state):
+    """
+    Returns:
+        Why the position is a draw by rule, None if it isn't.
+    """
+    if game_state.isFiftyMoveDraw():
+        return 'fifty-move rule'
+    if game_state.isThreefoldRepetition():
+        return 'threefold repetition'
+    if insufficient_material(game_state):
+        return 'insufficient material'
+    return None
+
+
+def play_game(index, opening, white, seed):
+    """
+    Play one game between the two engines of the worker.
+
+    Args:
+        index: Number of the game in the match.
+        opening: The opening to start from, as space separated SAN moves.
+        white: Index of the engine playing white, 0 or 1.
+        seed: Seed for the engines' move shuffles.
+
+    Returns:
+        Dict with the game's index, the index of the white engine, the result, the reason it ended and the game as
+        PGN.
+    """
+    adjudication = worker_adjudication
+    game_state = new_game_state(worker_backend)
+    for san in opening.split():
+        game_state.makeMove(ChessPGN.parse_san(game_state, san))
+    # both engines use a single search process, the pool already keeps every core busy
+    settings = [dict(worker_engines[0], workers=1, seed=seed), dict(worker_engines[1], workers=1, seed=seed + 1)]
+    ais = [ChessAI(**settings[0]), ChessAI(**settings[1])]
+    scores = []  # each search's score from white's side
+    result = None
+    reason = None
+    while result is None:
+        valid_moves = game_state.getValidMoves()
+        if not valid_moves:
+            if game_state.inCheck():
+                result, reason = ('0-1' if game_state.whiteToMove else '1-0'), 'checkmate'
+            else:
+                result, reason = '1/2-1/2', 'stalemate'
+            break
+        reason = draw_reason(game_state)
+        if reason is None and len(game_state.moveLog) >= adjudication['max_plies']:
+            reason = 'move limit'
+        if reason is not None:
+            result = '1/2-1/2'
+            break
+
+        ai = ais[white if game_state.whiteToMove else 1 - white]
+        move = ai.find_best_move(game_state, valid_moves)
+        if move is None:
+            move = valid_moves[0]  # a search that gives no move must not end the whole match
+        scores.append(ai.best_score if game_state.whiteToMove else -ai.best_score)
+        game_state.makeMove(move)
+
+        # both engines have to agree over their last few moves before a game is adjudicated
+        resign_window = scores[-2 * adjudication['resign_moves']:]
+        draw_window = scores[-2 * adjudication['draw_moves']:]
+        if len(resign_window) == 2 * adjudication['resign_moves']:
+            if all(score >= adjudication['resign_score'] for score in resign_window):
+                result, reason = '1-0', 'black resigns'
+            elif all(score <= -adjudication['resign_score'] for score in resign_window):
+                result, reason = '0-1', 'white resigns'
+        if (result is None and len(draw_window) == 2 * adjudication['draw_moves'] and
+                game_state.fullmoveNumber > adjudication['draw_after'] and
+                all(abs(score) <= adjudication['draw_score'] for score in draw_window)):
+            result, reason = '1/2-1/2', 'draw adjudication'
+    for ai in ais:
+        ai.close()
+
+    names = [engine_name(worker_engines[0]), engine_name(worker_engines[1])]
+    headers = {
+        'Event': 'Self-play match',
+        'Round': str(index + 1),
+        'White': names[white],
+        'Black': names[1 - white],
+        'Opening': opening,
+        'Termination': reason,
+        'PlyCount': str(len(game_state.moveLog)),
+    }
+    return {
+        'index': index,
+        'white': white,
+        'result': result,
+        'reason': reason,
+        'pgn': ChessPGN.game_to_pgn(game_state, headers, result),
+    }
+
+
+def elo_difference(wins, draws, losses):
+    """
+    Work out the Elo difference from a match result, with a 95% confidence margin.
+
+    Args:
+        wins: Games won by the first engine.
+        draws: Games drawn.
+        losses: Games lost by the first engine.
+
+    Returns:
+        (Elo difference, margin), None for each where the result doesn't give a finite number.
+    """
+    games = wins + draws + losses
+    if games == 0:
+        return None, None
+    score = (wins + draws / 2) / games
+    if score <= 0 or score >= 1:
+        return None, None
+    elo = -400 * math.log10(1 / score - 1)
+    deviation = math.sqrt((wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games)
+    low = min(max(score - 1.96 * deviation / math.sqrt(games), 1e-9), 1 - 1e-9)
+    high = min(max(score + 1.96 * deviation / math.sqrt(games), 1e-9), 1 - 1e-9)
+    margin = (400 * math.log10(1 / low - 1) - 400 * math.log10(1 / high - 1)) / 2
+    return elo, margin
+
+
+def sprt_llr(wins, draws, losses, elo0, elo1):
+    """
+    Work out the log-likelihood ratio of the hypothesis that the first engine is elo1 stronger against the
+    hypothesis that it is elo0 stronger, using the normal approximation to the trinomial (win/draw/loss) model.
+
+    Args:
+        wins: Games won by the first engine.
+        draws: Games drawn.
+        losses: Games lost by the first engine.
+        elo0: Elo difference of the null hypothesis.
+        elo1: Elo difference of the alternative hypothesis.
+
+    Returns:
+        The log-likelihood ratio, 0 while there is too little data.
+    """
+    games = wins + draws + losses
+    if games == 0 or wins + losses == 0:
+        return 0.0
+    score = (wins + draws / 2) / games
+    variance = (wins * (1 - score) ** 2 + draws * (0.5 - score) ** 2 + losses * score ** 2) / games
+    if variance <= 0:
+        return 0.0
+    score0 = 1 / (1 + 10 ** (-elo0 / 400))
+    score1 = 1 / (1 + 10 ** (-elo1 / 400))
+    return (score1 - score0) * (2 * score - score0 - score1) / (2 * variance / games)
+
+
+def sprt_bounds(alpha, beta):
+    """
+    Returns:
+        (lower, upper) log-likelihood ratio bounds for false positive rate alpha and false negative rate beta. The
+        test accepts the null hypothesis below the lower bound and the alternative above the upper one.
+    """
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+
+def schedule(openings, games, seed):
+    """
+    Plan the games of a match: the openings are shuffled and each is played twice with colours swapped, so neither
+    engine gets the better side of an opening.
+
+    Args:
+        openings: The openings to choose from.
+        games: Number of games to play.
+        seed: Seed for the opening order and the engines' move shuffles.
+
+    Yields:
+        (index, opening, index of the white engine, seed) for each game.
+    """
+    rng = random.Random(seed)
+    order = []
+    for index in range(games):
+        if index % 2 == 0:
+            if not order:
+                order = list(openings)
+                rng.shuffle(order)
+            opening = order.pop()
+        yield index, opening, index % 2, rng.randrange(2 ** 31)
+
+
+def run_match(engines, openings, games=100, workers=1, seed=0, sprt=None, adjudication=None, backend='legal'):
+    """
+    Play a match between two engines, several games at a time in worker processes.
+
+    Args:
+        engines: The two engines' ChessAI keyword arguments.
+        openings: The openings to start from, as space separated SAN moves.
+        games: Most games to play.
+        workers: Number of games played at once.
+        seed: Seed for the opening order and the engines' move shuffles.
+        sprt: (elo0, elo1, alpha, beta) to stop as soon as the SPRT is decided, None to play every game.
+        adjudication: Adjudication settings, see ADJUDICATION.
+        backend: Game state backend the games are played on, see ChessBitboard.new_game_state.
+
+    Yields:
+        (game result dict from play_game, (wins, draws, losses) of the first engine so far, log-likelihood ratio
+        or None) for each game as it finishes.
+    """
+    adjudication = dict(ADJUDICATION, **(adjudication or {}))
+    bounds = sprt_bounds(sprt[2], sprt[3]) if sprt is not None else None
+    record = [0, 0, 0]
+    jobs = schedule(openings, games, seed)
+    with ProcessPoolExecutor(workers, initializer=init_worker, initargs=(engines, adjudication, backend)) as executor:
+        pending = set()
+        exhausted = False
+        decided = False
+        while pending or not (exhausted or decided):
+            while not (exhausted or decided) and len(pending) < workers * 2:
+                job = next(jobs, None)
+                if job is None:
+                    exhausted = True
+                    break
+                pending.add(executor.submit(play_game, *job))
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                game = future.result()
+                if game['result'] == '1/2-1/2':
+                    record[1] += 1
+                elif (game['result'] == '1-0') == (game['white'] == 0):
+                    record[0] += 1
+                else:
+                    record[2] += 1
+                llr = None
+                if sprt is not None:
+                    llr = sprt_llr(*record, sprt[0], sprt[1])
+                    decided = decided or not bounds[0] < llr < bounds[1]
+                yield game, tuple(record), llr
+            if decided:
+                # games already started are finished and counted, but no new ones are started
+                for future in pending:
+                    future.cancel()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Play two AI configurations against each other.')
+    parser.add_argument('--engine', action='append', type=parse_engine, default=[],
+                        help='ChessAI settings as name=value pairs separated by commas; give it twice, first the '
+                             'engine under test and then the one it is measured against')
+    parser.add_argument('--games', type=int, default=100, help='most games to play (default 100)')
+    parser.add_argument('--workers', type=int, default=1, help='games played at once (default 1)')
+    parser.add_argument('--time', type=float, help='seconds per move, for engines that set no limit of their own')
+    parser.add_argument('--nodes', type=int, help='nodes per move, for engines that set no limit of their own')
+    parser.add_argument('--book', help='PGN file to take openings from instead of the bundled book')
+    parser.add_argument('--book-plies', type=int, default=8, help='half moves taken from each book game')
+    parser.add_argument('--seed', type=int, default=0, help='seed for the openings and move shuffles (default 0)')
+    parser.add_argument('--sprt', nargs=2, type=float, metavar=('ELO0', 'ELO1'),
+                        help='stop once an SPRT of elo0 against elo1 is decided')
+    parser.add_argument('--alpha', type=float, default=0.05, help='SPRT false positive rate (default 0.05)')
+    parser.add_argument('--beta', type=float, default=0.05, help='SPRT false negative rate (default 0.05)')
+    parser.add_argument('--max-plies', type=int, default=ADJUDICATION['max_plies'],
+                        help='half moves after which a game is a draw')
+    parser.add_argument('--resign-score', type=float, default=ADJUDICATION['resign_score'],
+                        help='score both engines must agree on for a resignation, a pawn is 10')
+    parser.add_argument('--pgn', help='file to append the games to')
+    parser.add_argument('--backend', choices=BACKENDS, default='legal', help='game state backend to play on')
+    args = parser.parse_args(argv)
+
+    if len(args.engine) != 2:
+        parser.error('give --engine exactly twice')
+    engines = []
+    for settings in args.engine:
+        if 'time_limit' not in settings and 'node_limit' not in settings:
+            settings = dict(settings, time_limit=args.time, node_limit=args.nodes)
+        engines.append({name: value for name, value in settings.items() if value is not None})
+    openings = load_book(args.book, args.book_plies) if args.book else OPENINGS
+    if not openings:
+        parser.error('no openings in ' + args.book)
+    sprt = (args.sprt[0], args.sprt[1], args.alpha, args.beta) if args.sprt else None
+    adjudication = dict(max_plies=args.max_plies, resign_score=args.resign_score)
+
+    names = [engine_name(settings) for settings in engines]
+    print('{} vs {}'.format(*names))
+    pgn_file = open(args.pgn, 'a') if args.pgn else None
+    record = (0, 0, 0)
+    llr = None
+    try:
+        for game, record, llr in run_match(engines, openings, args.games, args.workers, args.seed, sprt,
+                                           adjudication, args.backend):
+            if pgn_file is not None:
+                pgn_file.write(game['pgn'])
+                pgn_file.flush()
+            elo, margin = elo_difference(*record)
+            line = 'game {:>4}: {:<7} {:<22} +{} ={} -{}'.format(game['index'] + 1, game['result'], game['reason'],
+                                                                 record[0], record[1], record[2])
+            if elo is not None:
+                line += '  elo {:+.1f} +/- {:.1f}'.format(elo, margin)
+            if llr is not None:
+                line += '  llr {:.2f}'.format(llr)
+            print(line, flush=True)
+    finally:
+        if pgn_file is not None:
+            pgn_file.close()
+
+    wins, draws, losses = record
+    games = wins + draws + losses
+    elo, margin = elo_difference(*record)
+    print('{} games: {} wins, {} draws, {} losses for {}'.format(games, wins, draws, losses, names[0]))
+    if elo is not None:
+        print('Elo difference: {:+.1f} +/- {:.1f}'.format(elo, margin))
+    if sprt is not None:
+        lower, upper = sprt_bounds(args.alpha, args.beta)
+        verdict = 'H1 accepted' if llr is not None and llr >= upper else \
+            'H0 accepted' if llr is not None and llr <= lower else 'inconclusive'
+        print('SPRT elo0={:g} elo1={:g}: llr {:.2f} ({:.2f}, {:.2f}), {}'.format(
+            sprt[0], sprt[1], llr or 0.0, lower, upper, verdict))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,106 @@
+from array import array
+
+# bound types stored with each score
+EXACT = 0  # the score is the exact value of the position
+LOWER_BOUND = 1  # the search failed high, the position is worth at least the score
+UPPER_BOUND = 2  # the search failed low, the position is worth at most the score
+
+
+class TranspositionTable:
+    """
+    A fixed-size transposition table keyed by the position's zobrist key.
+    Entries live in parallel typed arrays rather than a dict of tuples, so the table is allocated once and its
+    memory stays flat however long the analysis runs.
+    """
+
+    # bytes per entry: key (8), score (8), move (4), depth (1), bound (1), age (1), taken from the array item sizes
+    # so the memory budget holds whatever size the platform gives each type code
+    ENTRY_BYTES = sum(array(typecode).itemsize for typecode in 'QdIbBB')
+
+    def __init__(self, size_mb=16):
+        """
+        Initialize the transposition table.
+
+        Args:
+            size_mb (float): Memory budget in megabytes. The entry count is rounded down to a power of two so a key
+                             maps to its slot with a mask.
+        """
+        entries = 1
+        while entries * 2 * self.ENTRY_BYTES <= size_mb * 1024 * 1024:
+            entries *= 2
+        self.size = entries
+        self.mask = entries - 1
+        self.keys = array('Q', bytes(8 * entries))
+        self.scores = array('d', bytes(8 * entries))
+        self.moves = array('I', bytes(array('I').itemsize * entries))
+        self.depths = array('b', bytes(entries))
+        self.bounds = array('B', bytes(entries))
+        self.ages = array('B', bytes(entries))
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+
+    def new_search(self):
+        """
+        Start a new search. Entries written by earlier searches become stale and are replaced first.
+        """
+        self.generation = (self.generation + 1) & 0xFF
+        self.probes = 0
+        self.hits = 0
+
+    def clear(self):
+        """
+        Remove every entry from the table.
+        """
+        self.__init__(self.size * self.ENTRY_BYTES / (1024 * 1024))
+
+    def probe(self, key):
+        """
+        Look up a position.
+
+        Args:
+            key: Zobrist key of the position.
+
+        Returns:
+            (depth, score, bound, move) for the stored entry, or None if the position is not in the table.
+            move is the packed move ID of the best move found, 0 if there was none.
+        """
+        self.probes += 1
+        index = key & self.mask
+        if self.keys[index] != key:
+            return None
+        self.hits += 1
+        return self.depths[index], self.scores[index], self.bounds[index], self.moves[index]
+
+    def store(self, key, depth, score, bound, move):
+        """
+        Store the result of searching a position.
+        A slot holding a different position is only overwritten if that entry is from an earlier search or was
+        searched no deeper (depth-preferred replacement with aging).
+
+        Args:
+            key: Zobrist key of the position.
+            depth: Remaining depth the position was searched to.
+            score: Score from the perspective of the side to move.
+            bound: EXACT, LOWER_BOUND or UPPER_BOUND.
+            move: Packed move ID of the best move, 0 if none.
+        """
+        index = key & self.mask
+        if self.keys[index] == key:
+            if not move:
+                move = self.moves[index]  # keep the old best move for ordering
+        elif self.ages[index] == self.generation and self.depths[index] > depth:
+            return
+        self.keys[index] = key
+        self.scores[index] = score
+        self.moves[index] = move
+        self.depths[index] = depth
+        self.bounds[index] = bound
+        self.ages[index] = self.generation
+
+    def hit_rate(self):
+        """
+        Returns:
+            The fraction of probes in the current search that found their position.
+        """
+        return self.hits / self.probes if self.probes else 0.0
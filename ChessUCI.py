@@ -0,0 +1,392 @@
+# This module lets the engine be driven over the Universal Chess Interface, so it can play in chess GUIs and
+# tournament managers. Commands are read from stdin and answers written to stdout. The search runs on its own thread,
+# so 'stop' and 'ponderhit' are acted on while it thinks:
+#   python ChessUCI.py
+
+import multiprocessing
+import sys
+import threading
+import time
+
+from ChessAI import ChessAI, mate_moves, position_snapshot, restore_position
+from ChessBook import OpeningBook
+from ChessTablebase import Tablebase
+from ChessEngine import GameState, START_FEN
+from ChessBitboard import BACKENDS, new_game_state
+from ChessTranspositionTable import TranspositionTable
+
+ENGINE_NAME = 'Chess-Game'
+ENGINE_AUTHOR = 'Torii Barnard'
+DEFAULT_HASH_MB = 16
+MAX_HASH_MB = 1024
+MAX_THREADS = 64
+MOVES_TO_GO = 30  # moves the remaining time is shared over when the GUI doesn't say
+TIME_SAFETY = 0.05  # seconds kept back for talking to the GUI
+
+
+class UCIEngine:
+    """
+    A UCI front end for GameState and ChessAI.
+    """
+
+    def __init__(self, output=sys.stdout):
+        """
+        Initialize the engine.
+
+        Args:
+            output: Text stream the engine's answers are written to.
+        """
+        self.output = output
+        self.output_lock = threading.Lock()  # the search and monitor threads write too
+        self.ai = ChessAI(hash_size_mb=DEFAULT_HASH_MB)
+        self.default_depth = self.ai.depth
+        self.game_state = GameState()
+        self.search_thread = None
+        self.stop_event = None
+        self.ponderhit_event = None
+        self.search_params = {}
+        self.own_book = False
+        self.book_file = 'book.bin'
+        self.backend = 'legal'
+
+    def send(self, line):
+        """
+        Write one line to the GUI.
+        """
+        with self.output_lock:
+            self.output.write(line + '\n')
+            self.output.flush()
+
+    def run(self, input_stream=sys.stdin):
+        """
+        Read and carry out commands until 'quit' or the end of the input.
+
+        Args:
+            input_stream: Text stream the GUI's commands are read from.
+        """
+        for line in input_stream:
+            if not self.handle(line):
+                break
+        self.stop()
+        self.ai.close()
+
+    def handle(self, line):
+        """
+        Carry out one command. Unknown commands are ignored, as UCI asks.
+
+        Args:
+            line: The command line.
+
+        Returns:
+            False once 'quit' has been received, otherwise True.
+        """
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        if command == 'uci':
+            self.send('id name ' + ENGINE_NAME)
+            self.send('id author ' + ENGINE_AUTHOR)
+            self.send('option name Hash type spin default {} min 1 max {}'.format(DEFAULT_HASH_MB, MAX_HASH_MB))
+            self.send('option name Threads type spin default 1 min 1 max {}'.format(MAX_THREADS))
+            self.send('option name Ponder type check default false')
+            self.send('option name OwnBook type check default false')
+            self.send('option name BookFile type string default book.bin')
+            self.send('option name TablebasePath type string default <empty>')
+            self.send('option name Backend type combo default legal' + ''.join(' var ' + name for name in BACKENDS))
+            self.send('uciok')
+        elif command == 'isready':
+            self.send('readyok')
+        elif command == 'ucinewgame':
+            self.stop()
+            self.ai.close()  # the search processes keep their own tables and history, so they are started again
+            if self.ai.tt is not None:
+                self.ai.tt.clear()
+            self.ai.history = [0] * 4096
+        elif command == 'setoption':
+            self.set_option(args)
+        elif command == 'position':
+            self.stop()
+            self.set_position(args)
+        elif command == 'go':
+            self.stop()
+            self.go(args)
+        elif command == 'stop':
+            self.stop()
+        elif command == 'ponderhit':
+            self.ponderhit()
+        elif command == 'quit':
+            return False
+        return True
+
+    def set_option(self, args):
+        """
+        Handle 'setoption name <name> value <value>'. Hash sets the transposition table size in MB, Threads the
+        number of search processes, OwnBook whether to play from the opening book in BookFile, TablebasePath the
+        directory of the endgame tablebase files and Backend the game state backend (see ChessBitboard.new_game_state)
+        positions are set up on from the next 'position' command.
+        """
+        if 'name' not in args:
+            return
+        value_at = args.index('value') if 'value' in args else len(args)
+        name = ' '.join(args[args.index('name') + 1:value_at]).lower()
+        value = ' '.join(args[value_at + 1:])
+        self.stop()
+        try:
+            if name == 'hash':
+                size_mb = min(max(int(value), 1), MAX_HASH_MB)
+                self.ai.close()  # the search processes are started again with tables of the new size
+                self.ai.tt = TranspositionTable(size_mb)
+            elif name == 'threads':
+                self.ai.close()  # the pool is started again with the new size by the next search
+                self.ai.workers = min(max(int(value), 1), MAX_THREADS)
+            elif name == 'ownbook':
+                self.own_book = value.lower() == 'true'
+            elif name == 'bookfile':
+                self.book_file = value
+            elif name == 'backend':
+                if value not in BACKENDS:
+                    raise ValueError(value)
+                self.backend = value
+            elif name == 'tablebasepath':
+                self.ai.close()  # the search processes are started again with the new tables
+                self.ai.tablebase = Tablebase(value) if value and value != '<empty>' else None
+            if name in ('ownbook', 'bookfile'):
+                if self.ai.book is not None:
+                    self.ai.book.close()
+                self.ai.book = OpeningBook(self.book_file) if self.own_book else None
+        except ValueError:
+            self.send('info string bad value for option ' + name + ': ' + value)
+
+    def set_position(self, args):
+        """
+        Handle 'position startpos|fen <fen> [moves <move> ...]'. Moves are in long algebraic notation, e.g. e2e4 or
+        e7e8q.
+        """
+        moves_at = args.index('moves') if 'moves' in args else len(args)
+        try:
+            if args and args[0] == 'fen':
+                game_state = new_game_state(self.backend, ' '.join(args[1:moves_at]))
+            else:
+                game_state = new_game_state(self.backend, START_FEN)
+        except ValueError as error:
+            self.send('info string ' + str(error))
+            return
+        for text in args[moves_at + 1:]:
+            for move in game_state.getValidMoves():
+                if move.getChessNotation() == text:
+                    game_state.makeMove(move)
+                    break
+            else:
+                self.send('info string illegal move ' + text)
+                break
+        self.game_state = game_state
+
+    def go(self, args):
+        """
+        Handle 'go' with any of depth, nodes, movetime, wtime, btime, winc, binc, movestogo, infinite and ponder.
+        The search starts on its own thread and 'bestmove' is sent when it ends.
+        """
+        params = {}
+        flags = set()
+        i = 0
+        while i < len(args):
+            if args[i] in ('infinite', 'ponder'):
+                flags.add(args[i])
+                i += 1
+            elif i + 1 < len(args):
+                try:
+                    params[args[i]] = int(args[i + 1])
+                except ValueError:
+                    pass
+                i += 2
+            else:
+                i += 1
+        self.search_params = params
+        infinite = 'infinite' in flags or 'ponder' in flags
+        time_limit = None if infinite else self.allocate_time(params)
+        node_limit = params.get('nodes')
+        # the depth is what the search stops at when there is no time or node limit
+        self.ai.depth = params.get('depth', self.default_depth)
+
+        self.stop_event = threading.Event()
+        self.ponderhit_event = threading.Event()
+        self.search_thread = threading.Thread(target=self.search, daemon=True,
+                                              args=(position_snapshot(self.game_state), time_limit, node_limit,
+                                                    infinite, 'ponder' in flags, self.stop_event,
+                                                    self.ponderhit_event))
+        self.search_thread.start()
+
+    def allocate_time(self, params):
+        """
+        Work out how long to think from the go parameters.
+
+        Returns:
+            Seconds for this move, None if no time was given.
+        """
+        if 'movetime' in params:
+            return max(params['movetime'] / 1000 - TIME_SAFETY, 0.001)
+        white = self.game_state.whiteToMove
+        remaining = params.get('wtime' if white else 'btime')
+        if remaining is None:
+            return None
+        increment = params.get('winc' if white else 'binc', 0)
+        moves_to_go = max(params.get('movestogo', MOVES_TO_GO), 1)
+        budget = remaining / moves_to_go + increment * 0.75
+        return max(min(budget, remaining * 0.5) / 1000 - TIME_SAFETY, 0.001)
+
+    def search(self, position, time_limit, node_limit, infinite, pondering, stop_event, ponderhit_event):
+        """
+        Run the search and send 'bestmove'. Runs on the search thread.
+
+        Args:
+            position: Snapshot of the position to search.
+            time_limit: Seconds to think, None for none.
+            node_limit: Nodes to search, None for none.
+            infinite: Search until stopped ('go infinite' or 'go ponder').
+            pondering: The search is on the opponent's time. After a 'ponderhit' it gets a normal time limit.
+            stop_event: Set by 'stop'.
+            ponderhit_event: Set by 'ponderhit'.
+        """
+        game_state = restore_position(position)
+        valid_moves = game_state.getValidMoves()
+        if not valid_moves:
+            self.send('bestmove 0000')
+            return
+        search_done = threading.Event()
+        monitor_thread = threading.Thread(target=self.monitor, args=(position, search_done), daemon=True)
+        monitor_thread.start()
+        move = self.ai.find_best_move(game_state, valid_moves, time_limit=time_limit, node_limit=node_limit,
+                                      stop_event=stop_event, infinite=infinite)
+        search_done.set()
+        monitor_thread.join()  # the last info line goes out before the best move
+        if infinite:
+            # UCI doesn't allow the answer before 'stop' (or 'ponderhit' when pondering), even if the search ended
+            while not stop_event.is_set() and not (pondering and ponderhit_event.is_set()):
+                stop_event.wait(0.05)
+        if move is None:
+            move = self.ai.best_move or valid_moves[0]
+        answer = 'bestmove ' + move.getChessNotation()
+        ponder_move = self.expected_reply(game_state, move)
+        if ponder_move is not None:
+            answer += ' ponder ' + ponder_move.getChessNotation()
+        self.send(answer)
+
+    def ponderhit(self):
+        """
+        Handle 'ponderhit': the move pondered on was played, so the search carries on with a normal time limit.
+        """
+        if self.search_thread is None or not self.search_thread.is_alive():
+            return
+        time_limit = self.allocate_time(self.search_params)
+        if time_limit is not None:
+            self.ai.deadline = time.perf_counter() + time_limit
+        elif 'nodes' not in self.search_params:
+            self.stop_event.set()  # nothing to limit the search any more, answer with what has been found
+        self.ponderhit_event.set()
+
+    def stop(self):
+        """
+        Stop a running search and wait for its 'bestmove' to be sent.
+        """
+        if self.search_thread is not None:
+            self.stop_event.set()
+            self.search_thread.join()
+            self.search_thread = None
+
+    def monitor(self, position, search_done):
+        """
+        Send 'info' lines while the search runs: a full line each time an iteration finishes and the node count and
+        speed every second. Runs on its own thread.
+
+        Args:
+            position: Snapshot of the position being searched, for working out the principal variation.
+            search_done: Set by the search thread when the search has ended.
+        """
+        start = time.perf_counter()
+        reported_depth = 0
+        last_report = start
+        finished = False
+        while not finished:
+            finished = search_done.wait(0.05)
+            elapsed = time.perf_counter() - start
+            nodes = self.ai.counter
+            nps = int(nodes / elapsed) if elapsed else 0
+            depth = self.ai.completed_depth
+            if depth > reported_depth and self.ai.best_move is not None:
+                reported_depth = depth
+                last_report = time.perf_counter()
+                pv = self.principal_variation(restore_position(position), self.ai.best_move, depth)
+                self.send('info depth {} score {} nodes {} nps {} time {} pv {}'.format(
+                    depth, self.format_score(self.ai.best_score, depth), nodes, nps, int(elapsed * 1000),
+                    ' '.join(move.getChessNotation() for move in pv)))
+            elif time.perf_counter() - last_report >= 1:
+                last_report = time.perf_counter()
+                self.send('info nodes {} nps {} time {}'.format(nodes, nps, int(elapsed * 1000)))
+
+    def format_score(self, score, depth):
+        """
+        Returns:
+            The score for an info line: 'cp' in centipawns, or 'mate' for a forced mate. The search does not track
+            the distance to mate, so the number of moves is the most it can be at the depth searched, unless the
+            mate was found in the tablebase.
+        """
+        moves = mate_moves(score, depth)
+        if moves is not None:
+            return 'mate ' + str(moves)
+        return 'cp ' + str(int(round(score * 10)))  # a pawn is worth 10 in the evaluation
+
+    def principal_variation(self, game_state, best_move, depth):
+        """
+        Follow the transposition table's best moves from the root to get the expected line of play.
+
+        Args:
+            game_state: A copy of the root position, played forward.
+            best_move: The root move.
+            depth: Longest line to return.
+
+        Returns:
+            The moves of the line, starting with best_move.
+        """
+        pv = []
+        move = best_move
+        while move is not None and len(pv) < depth:
+            pv.append(move)
+            game_state.makeMove(move)
+            move = self.expected_reply(game_state, None)
+        return pv
+
+    def expected_reply(self, game_state, move):
+        """
+        Find the transposition table's best move in the position after move.
+
+        Args:
+            game_state: The position.
+            move: Move to play first, None to look at the position itself. It is taken back afterwards.
+
+        Returns:
+            The legal move stored for the position, None if there is none.
+        """
+        if move is not None:
+            game_state.makeMove(move)
+        reply = None
+        hash_move = self.ai.probe_hash_move(game_state)
+        if hash_move:
+            for candidate in game_state.getValidMoves():
+                if candidate.moveID == hash_move:
+                    reply = candidate
+                    break
+        if move is not None:
+            game_state.undoMove()
+        return reply
+
+
+def main():
+    # A forked search worker closes its copy of stdin on start up, which blocks while this process is waiting for the
+    # next command on it. Spawned workers start from scratch instead
+    multiprocessing.set_start_method('spawn')
+    UCIEngine().run()
+
+
+if __name__ == '__main__':
+    main()